@@ -0,0 +1,325 @@
+###########################
+# benchmarks of the analysis and rendering hot paths
+###########################
+"""Benchmarks of the analysis and rendering stages on synthetic stock data
+
+Every stage is timed for daily histories of 1 to 50 years, the computation of
+a whole universe for 10 to 1000 symbols. The results are compared against the
+baseline stored in `benchmarks/baseline.json`, a stage fails if its time or
+its peak memory grew by more than the threshold.
+
+    python benchmarks/run_benchmarks.py             # full run, compare to baseline
+    python benchmarks/run_benchmarks.py --quick     # small sizes only
+    python benchmarks/run_benchmarks.py --update    # store the results as baseline
+
+Timings depend on the machine, update the baseline when switching machines.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+from stock_analysis.analysis import render_stock_analysis  # noqa: E402
+from stock_analysis.backtest import (  # noqa: E402
+    backtest_fair_value,
+    fair_value_matrix,
+)
+from stock_analysis.compute import (  # noqa: E402
+    _compute_stock_analysis,
+    _mean_annual_growth,
+    _piecewise_annual_growth,
+)
+from stock_analysis.DataProvider import SyntheticProvider  # noqa: E402
+from stock_analysis.indicators import (  # noqa: E402
+    rainbow_ema,
+    rolling_growth,
+    rolling_growth_frame,
+)
+from stock_analysis.PlotManager import PlotManager  # noqa: E402
+from stock_analysis.StockData import StockData  # noqa: E402
+from stock_analysis.StockSnapshot import StockSnapshot  # noqa: E402
+from stock_analysis.valuation import (  # noqa: E402
+    compute_valuations,
+    interpolate_fair_value,
+    live_multiples,
+    windowed_fair_values,
+)
+
+BASELINE = Path(__file__).parent / "baseline.json"
+
+HISTORY_YEARS = [1, 5, 20, 50]
+SYMBOL_COUNTS = [10, 100, 1000]
+QUICK_HISTORY_YEARS = [1, 20]
+QUICK_SYMBOL_COUNTS = [10]
+BACKTEST_ENTRIES = [-0.3, -0.2, -0.1, 0.0]
+BACKTEST_EXITS = [0.1, 0.2, 0.3]
+BACKTEST_MAX_HOLDS = [None, 252]
+
+# a stage regresses if it is slower (or needs more memory) than baseline * threshold
+DEFAULT_THRESHOLD = 2.0
+# differences below these are noise, e.g. of the timer or the allocator
+MIN_SECONDS = 0.005
+MIN_BYTES = 1024**2
+
+
+@dataclass
+class BenchmarkResult:
+    stage: str
+    size: str  # e.g. "20y" or "100 symbols"
+    items: int  # processed items, e.g. daily bars or symbols
+    unit: str
+    seconds: float  # best of the repeats
+    peak_bytes: int  # peak of the python (and numpy) allocations
+
+    @property
+    def key(self) -> str:
+        return f"{self.stage}[{self.size}]"
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else float("inf")
+
+
+def measure(fn: Callable[[], object], repeat: int) -> tuple[float, int]:
+    """Best time of `repeat` runs and the peak memory of a separate run
+
+    Memory is traced in its own run, as tracing slows down the allocations.
+    """
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def synthetic_stock(symbol: str, years: int) -> StockSnapshot:
+    """Snapshot of StockData with a synthetic daily history of `years` years"""
+    # silence the progress output of StockData
+    with contextlib.redirect_stdout(io.StringIO()):
+        return StockData(
+            symbol, provider=SyntheticProvider(years=years, end="2025-06-30")
+        ).snapshot()
+
+
+def benchmark_history(years: int, repeat: int, output_dir: Path):
+    """Benchmark all stages of a single analysis with a history of `years` years"""
+    stock = synthetic_stock("BENCH", years)
+    history = stock.history_20y.dropna()
+    eps = stock.fundamentals[["eps"]].dropna()
+    bars = len(history)
+    kgv = live_multiples(history, eps).clip(lower=0)
+    fair_value = windowed_fair_values(kgv, eps)["eps"]
+    result = _compute_stock_analysis(stock)
+    size = f"{years}y"
+
+    stages: list[tuple[str, int, str, Callable[[], object]]] = [
+        ("mean_annual_growth", bars, "bars", lambda: _mean_annual_growth(history)),
+        (
+            "piecewise_annual_growth",
+            bars,
+            "bars",
+            lambda: _piecewise_annual_growth(history, 252 * 5),
+        ),
+        ("rolling_growth", bars, "bars", lambda: rolling_growth_frame(history)),
+        ("rainbow_ema", bars, "bars", lambda: rainbow_ema(history)),
+        ("live_kgv", bars, "bars", lambda: live_multiples(history, eps)),
+        ("fair_value", bars, "bars", lambda: windowed_fair_values(kgv, eps)),
+        (
+            "interpolate_fair_value",
+            len(fair_value),
+            "points",
+            lambda: interpolate_fair_value(fair_value),
+        ),
+        (
+            "valuations",
+            bars,
+            "bars",
+            lambda: compute_valuations(history, stock.fundamentals),
+        ),
+        ("compute", bars, "bars", lambda: _compute_stock_analysis(stock)),
+    ]
+    for stage, items, unit, fn in stages:
+        seconds, peak = measure(fn, repeat)
+        yield BenchmarkResult(stage, size, items, unit, seconds, peak)
+
+    # rendering: drawing into the axes, then layout and pdf export
+    def plot() -> PlotManager:
+        plot_manager = PlotManager(2, 2)
+        render_stock_analysis(result, plot_manager)
+        return plot_manager
+
+    def plot_and_close():
+        plot()
+        plt.close("all")
+
+    def export() -> float:
+        plot_manager = plot()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            plot_manager.finalize(show=False, filename=output_dir / f"{size}.pdf")
+        return time.perf_counter() - start
+
+    seconds, peak = measure(plot_and_close, max(1, repeat // 2))
+    yield BenchmarkResult("plot", size, bars, "bars", seconds, peak)
+    # layout and export are timed without the plotting before them
+    _, peak = measure(export, 0)
+    seconds = min(export() for _ in range(max(1, repeat // 2)))
+    yield BenchmarkResult("finalize_pdf", size, bars, "bars", seconds, peak)
+
+
+def benchmark_universe(count: int, repeat: int):
+    """Benchmark the computation of `count` symbols with 20 year histories"""
+    stocks = [synthetic_stock(f"S{i:04d}", 20) for i in range(count)]
+
+    def compute_all():
+        return [_compute_stock_analysis(stock) for stock in stocks]
+
+    seconds, peak = measure(compute_all, repeat)
+    yield BenchmarkResult(
+        "compute_universe", f"{count} symbols", count, "symbols", seconds, peak
+    )
+
+    # fair value bands of all symbols, 24 threshold combinations at once
+    closes, fair_values = fair_value_matrix(compute_all())
+    seconds, peak = measure(
+        lambda: backtest_fair_value(
+            closes, fair_values, BACKTEST_ENTRIES, BACKTEST_EXITS, BACKTEST_MAX_HOLDS
+        ),
+        repeat,
+    )
+    yield BenchmarkResult(
+        "backtest_universe", f"{count} symbols", count, "symbols", seconds, peak
+    )
+
+    # rolling growth of all symbols at once, on a (bars, symbols) array
+    closes = pd.concat([stock.history_20y for stock in stocks], axis=1).to_numpy()
+    seconds, peak = measure(lambda: rolling_growth(closes, [252, 756, 1260]), repeat)
+    yield BenchmarkResult(
+        "rolling_growth_universe", f"{count} symbols", count, "symbols", seconds, peak
+    )
+
+
+def compare(
+    results: list[BenchmarkResult], baseline: dict, threshold: float
+) -> list[str]:
+    """Stages which regressed against the baseline, as messages"""
+    regressions = []
+    for result in results:
+        base = baseline.get("results", {}).get(result.key)
+        if base is None:
+            continue
+        if (
+            result.seconds > base["seconds"] * threshold
+            and result.seconds - base["seconds"] > MIN_SECONDS
+        ):
+            regressions.append(
+                f"{result.key}: {result.seconds * 1e3:.1f} ms, "
+                f"baseline {base['seconds'] * 1e3:.1f} ms"
+            )
+        if (
+            result.peak_bytes > base["peak_bytes"] * threshold
+            and result.peak_bytes - base["peak_bytes"] > MIN_BYTES
+        ):
+            regressions.append(
+                f"{result.key}: {result.peak_bytes / 1024**2:.1f} MiB peak memory, "
+                f"baseline {base['peak_bytes'] / 1024**2:.1f} MiB"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small sizes only")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed ratio to the baseline (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=BASELINE, help="baseline json file"
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="store the results as new baseline"
+    )
+    parser.add_argument("--output", type=Path, help="also write the results to json")
+    args = parser.parse_args(argv)
+
+    years = QUICK_HISTORY_YEARS if args.quick else HISTORY_YEARS
+    counts = QUICK_SYMBOL_COUNTS if args.quick else SYMBOL_COUNTS
+
+    results: list[BenchmarkResult] = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for n_years in years:
+            results += benchmark_history(n_years, args.repeat, Path(output_dir))
+        for count in counts:
+            results += benchmark_universe(count, max(1, args.repeat // 5))
+
+    print(f"{'stage':<40} {'time':>10} {'throughput':>22} {'peak memory':>12}")
+    for result in results:
+        print(
+            f"{result.key:<40} {result.seconds * 1e3:8.1f}ms "
+            f"{result.throughput:>14,.0f} {result.unit + '/s':<9}"
+            f"{result.peak_bytes / 1024**2:>10.1f}MiB"
+        )
+
+    data = {
+        "machine": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": sys.version.split()[0],
+        "results": {result.key: asdict(result) for result in results},
+    }
+    if args.output:
+        args.output.write_text(json.dumps(data, indent=2) + "\n")
+
+    if args.update:
+        # keep the baselines of sizes which were not run, e.g. with --quick
+        if args.baseline.exists():
+            old = json.loads(args.baseline.read_text())
+            data["results"] = {**old.get("results", {}), **data["results"]}
+        args.baseline.write_text(json.dumps(data, indent=2) + "\n")
+        print(f"Saved baseline to '{args.baseline}'")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline '{args.baseline}', run with --update to create it")
+        return 0
+    regressions = compare(
+        results, json.loads(args.baseline.read_text()), args.threshold
+    )
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold}x baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold}x baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,492 @@
+###########################
+# long running http service of the analyses, with warm caches
+###########################
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Hashable, TypeVar
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .compute import AnalysisResult, compute_stock_analysis
+from .DataCache import DataCache
+from .DataProvider import DataProvider, LiveProvider
+from .export import init_render_worker
+from .ResultCache import ResultCache
+from .StockData import StockData, StockDataFetchError
+from .StockSnapshot import StockSnapshot
+from .timing import span
+
+T = TypeVar("T")
+
+# analyses kept in memory, the least recently used one is dropped first
+MAX_ANALYSES = 64
+# seconds an analysis is served from memory before its data is fetched again
+# (through the on-disk cache, which has its own time to live)
+MAX_AGE = 15 * 60
+# rendered pdfs and pngs kept in memory
+MAX_RENDERS = 256
+RENDER_WORKERS = 2
+# plotted points per time series, as in batch runs
+SERVICE_MAX_POINTS = 2000
+PNG_DPI = 100
+
+ROUTES = [
+    ("analysis", re.compile(r"/analysis/(?P<symbol>[^/]+)")),
+    ("pdf", re.compile(r"/analysis/(?P<symbol>[^/]+)/report\.pdf")),
+    ("png", re.compile(r"/analysis/(?P<symbol>[^/]+)/charts/(?P<chart>\d+)\.png")),
+    ("stats", re.compile(r"/stats")),
+]
+
+
+class LRUCache:
+    """
+    Thread safe in-memory cache of at most `max_entries` values, which expire
+    `max_age` seconds after they were stored.
+    """
+
+    def __init__(self, max_entries: int, max_age: float | None = None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Value of the key, None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored, value = entry
+            if self.max_age is not None and time.monotonic() - stored > self.max_age:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, dropping the least recently used ones above the limit"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@dataclass
+class ServiceStats:
+    """Counters of an `AnalysisService`"""
+
+    requests: int = 0
+    analyses: int = 0  # computed analyses
+    analysis_hits: int = 0  # analyses served from memory
+    renders: int = 0  # rendered pdfs and pngs
+    render_hits: int = 0  # pdfs and pngs served from memory
+    coalesced: int = 0  # calls which waited for an identical call in flight
+    errors: int = 0
+
+
+def _render_pdf(result: AnalysisResult, max_points: int | None) -> bytes:
+    """Render process: the report pdf of an analysis"""
+    from .export import render_report_pdf
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename = Path(folder) / f"{result.symbol}.pdf"
+        render_report_pdf(result, filename, max_points)
+        return filename.read_bytes()
+
+
+def _render_png(result: AnalysisResult, chart: int, max_points: int | None) -> bytes:
+    """Render process: one chart of the report as full size png"""
+    from .export import render_chart
+
+    return render_chart(result, chart, ["png"], max_points, PNG_DPI)["png"]
+
+
+def _json_value(value: Any) -> Any:
+    """NaN and infinite floats as null, json has no literal for them"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class AnalysisService:
+    """
+    Serves stock analyses from a long running process.
+
+    Snapshots of the fetched stock data and the computed analyses are kept in an
+    in-memory LRU cache in front of the on-disk `DataCache` (and an optional
+    `ResultCache`), the rendered pdfs and pngs in a second one. Concurrent calls for the same
+    analysis or rendering wait for the one in flight instead of repeating it.
+    Rendering runs on a pool of worker processes, so it neither blocks the
+    other requests nor needs matplotlib to be thread safe.
+
+    `make_server` wraps the service in a threaded http server, see `serve`.
+    """
+
+    def __init__(
+        self,
+        cache: DataCache | None = None,
+        provider: DataProvider | None = None,
+        result_cache: ResultCache | None = None,
+        peers: int = 0,
+        max_points: int | None = SERVICE_MAX_POINTS,
+        max_analyses: int = MAX_ANALYSES,
+        max_age: float | None = MAX_AGE,
+        max_renders: int = MAX_RENDERS,
+        render_workers: int = RENDER_WORKERS,
+    ):
+        """
+        Args:
+            cache (DataCache | None): cache for the stock data, None uses the
+                default cache
+            provider (DataProvider | None): source of the stock data, None
+                fetches live data
+            result_cache (ResultCache | None): stored analysis stages, see
+                `compute_stock_analysis`
+            peers (int): compare every analysis with up to this many peers
+            max_points (int | None): decimate the plotted time series to about
+                this many points, None draws all points
+            max_analyses (int): analyses kept in memory
+            max_age (float | None): seconds an analysis is kept in memory, None
+                keeps it until it is the least recently used one
+            max_renders (int): rendered pdfs and pngs kept in memory
+            render_workers (int): number of render processes
+        """
+        self.cache = cache if cache is not None else DataCache()
+        self.provider = provider if provider is not None else LiveProvider()
+        self.result_cache = result_cache
+        self.peers = peers
+        self.max_points = max_points
+        self._analyses = LRUCache(max_analyses, max_age)
+        # renders are keyed by the input hash of their analysis and its peers,
+        # so they never outlive them
+        self._renders = LRUCache(max_renders)
+        self._stats = ServiceStats()
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.render_workers = render_workers
+        self._renderer = self._start_renderer()
+
+    def snapshot(self, symbol: str, refresh: bool = False) -> StockSnapshot:
+        """Fetched stock data of the symbol, see `analysis`"""
+        return self._analysis(symbol, refresh)[0]
+
+    def analysis(self, symbol: str, refresh: bool = False) -> AnalysisResult:
+        """Computed analysis of the symbol, from memory if it is recent enough
+
+        Args:
+            symbol (str): stock symbol
+            refresh (bool): compute it again, with the data in the on-disk cache
+
+        Returns:
+            AnalysisResult: computed analysis
+        """
+        return self._analysis(symbol, refresh)[1]
+
+    def metrics(self, symbol: str, refresh: bool = False) -> dict[str, Any]:
+        """Key figures and chart titles of the analysis, as json data"""
+        from .analysis import _charts
+
+        result = self.analysis(symbol, refresh)
+        return {
+            "symbol": result.symbol,
+            "date": result.history.index[-1].date().isoformat(),
+            "inputs_hash": result.inputs_hash,
+            "metrics": {
+                name: _json_value(float(value))
+                for name, value in result.metrics().items()
+            },
+            "charts": [title for title, _, _ in _charts(result)],
+        }
+
+    def pdf(self, symbol: str, refresh: bool = False) -> bytes:
+        """Report pdf of the symbol"""
+        result = self.analysis(symbol, refresh)
+        return self._render(
+            (self._render_hash(result), result.symbol, "pdf"),
+            _render_pdf,
+            result,
+            self.max_points,
+        )
+
+    def png(self, symbol: str, chart: int, refresh: bool = False) -> bytes:
+        """One chart of the report as png
+
+        Args:
+            symbol (str): stock symbol
+            chart (int): index of the chart, see the "charts" of `metrics`
+            refresh (bool): compute the analysis again
+
+        Returns:
+            bytes: png image
+        """
+        from .analysis import _charts
+
+        result = self.analysis(symbol, refresh)
+        if not 0 <= chart < len(_charts(result)):
+            raise IndexError(f"{symbol} has no chart {chart}")
+        return self._render(
+            (self._render_hash(result), result.symbol, "png", chart),
+            _render_png,
+            result,
+            chart,
+            self.max_points,
+        )
+
+    def stats(self) -> dict[str, int]:
+        """Request, cache and coalescing counters"""
+        with self._lock:
+            stats = dict(vars(self._stats))
+        stats["cached_analyses"] = len(self._analyses)
+        stats["cached_renders"] = len(self._renders)
+        return stats
+
+    def count(self, name: str) -> None:
+        """Increase one of the counters of `stats`"""
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
+
+    def close(self) -> None:
+        """Stop the render processes"""
+        self._renderer.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> AnalysisService:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _start_renderer(self) -> ProcessPoolExecutor:
+        """Pool of render processes, with the workers already started"""
+        # spawned workers, forking a process with server threads is not safe
+        renderer = ProcessPoolExecutor(
+            max_workers=self.render_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_render_worker,
+        )
+        # start the workers now instead of on the first request
+        for _ in range(self.render_workers):
+            renderer.submit(time.sleep, 0)
+        return renderer
+
+    def _render_hash(self, result: AnalysisResult) -> str:
+        """Hash of everything a rendering of the analysis shows, with the peers"""
+        from .analysis import report_input_hash
+
+        return report_input_hash(result, self.max_points)
+
+    def _analysis(
+        self, symbol: str, refresh: bool
+    ) -> tuple[StockSnapshot, AnalysisResult]:
+        if not refresh:
+            entry = self._analyses.get(symbol)
+            if entry is not None:
+                self.count("analysis_hits")
+                return entry
+        return self._coalesced(("analysis", symbol), lambda: self._compute(symbol))
+
+    def _compute(self, symbol: str) -> tuple[StockSnapshot, AnalysisResult]:
+        with span("service.analysis", symbol=symbol):
+            # only the compact snapshot of the stock data is kept in memory
+            stock = StockData(symbol, cache=self.cache, provider=self.provider)
+            snapshot = stock.snapshot()
+            result = compute_stock_analysis(
+                snapshot,
+                cache=self.cache,
+                provider=self.provider,
+                peers=self.peers,
+                result_cache=self.result_cache,
+            )
+        entry = (snapshot, result)
+        self._analyses.put(symbol, entry)
+        self.count("analyses")
+        return entry
+
+    def _render(self, key: tuple, fn: Callable[..., bytes], *args: Any) -> bytes:
+        data = self._renders.get(key)
+        if data is not None:
+            self.count("render_hits")
+            return data
+
+        def render() -> bytes:
+            with span(f"service.render.{key[2]}", symbol=key[1]):
+                renderer = self._renderer
+                try:
+                    data = renderer.submit(fn, *args).result()
+                except BrokenProcessPool:
+                    # a render process died, e.g. killed for its memory
+                    self._restart_renderer(renderer)
+                    data = self._renderer.submit(fn, *args).result()
+            self._renders.put(key, data)
+            self.count("renders")
+            return data
+
+        return self._coalesced(("render", key), render)
+
+    def _restart_renderer(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a broken render pool, once for all requests which used it"""
+        with self._lock:
+            if self._renderer is not broken:
+                return
+            self._renderer = self._start_renderer()
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("Restarted the render processes after a crashed one")
+
+    def _coalesced(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Run fn, or wait for the result of the call with the same key in flight"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self._stats.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_GET(self):
+        service = self.server.service
+        service.count("requests")
+        url = urlsplit(self.path)
+        refresh = parse_qs(url.query).get("refresh", ["0"])[0] not in ("", "0")
+        for name, pattern in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match is not None:
+                break
+        else:
+            return self._error(404, f"Unknown path {url.path}")
+
+        symbol = unquote(match.groupdict().get("symbol", ""))
+        try:
+            if name == "analysis":
+                body = json.dumps(service.metrics(symbol, refresh)).encode()
+                content_type = "application/json"
+            elif name == "pdf":
+                body = service.pdf(symbol, refresh)
+                content_type = "application/pdf"
+            elif name == "png":
+                body = service.png(symbol, int(match["chart"]), refresh)
+                content_type = "image/png"
+            else:
+                body = json.dumps(service.stats()).encode()
+                content_type = "application/json"
+        except IndexError as e:
+            return self._error(404, str(e))
+        except StockDataFetchError as e:
+            return self._error(502, str(e))
+        except Exception as e:
+            return self._error(500, repr(e))
+        self._send(200, body, content_type)
+
+    def _error(self, status: int, message: str) -> None:
+        self.server.service.count("errors")
+        body = json.dumps({"error": message}).encode()
+        self._send(status, body, "application/json")
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], service: AnalysisService, verbose: bool
+    ):
+        super().__init__(address, _Handler)
+        self.service = service
+        self.verbose = verbose
+
+
+def make_server(
+    service: AnalysisService,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    verbose: bool = True,
+) -> ThreadingHTTPServer:
+    """Threaded http server of the service
+
+    Endpoints:
+    - /analysis/<symbol>: key figures and chart titles as json
+    - /analysis/<symbol>/report.pdf: the report pdf
+    - /analysis/<symbol>/charts/<i>.png: chart i of the report
+    - /stats: counters of the service
+    "?refresh=1" computes the analysis again.
+
+    Args:
+        service (AnalysisService): the service answering the requests
+        host (str): address to listen on
+        port (int): port to listen on, 0 picks a free one
+        verbose (bool): log every request
+
+    Returns:
+        ThreadingHTTPServer: the server, run it with `serve_forever`
+    """
+    return _Server((host, port), service, verbose)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    symbols: list[str] | None = None,
+    **kwargs,
+) -> None:
+    """Run the analysis service until interrupted
+
+    Args:
+        host (str): address to listen on
+        port (int): port to listen on
+        symbols (list[str] | None): analyses computed before the first request
+        **kwargs: options of `AnalysisService`
+    """
+    with AnalysisService(**kwargs) as service:
+        for symbol in symbols or []:
+            try:
+                service.analysis(symbol)
+            except Exception as e:
+                print(f"Warming up {symbol} failed: {e!r}")
+        server = make_server(service, host, port)
+        print(f"Serving stock analyses on http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,234 @@
+###########################
+# persistent cache for raw source data
+###########################
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "stock_analysis"
+
+# time to live per data kind
+DEFAULT_TTL: dict[str, pd.Timedelta] = {
+    "prices": pd.Timedelta(days=1),
+    "estimates": pd.Timedelta(days=1),
+    "fundamentals": pd.Timedelta(days=7),
+}
+
+DEFAULT_MAX_BYTES = 512 * 1024**2
+
+
+class DataCache:
+    """
+    Persistent on-disk cache for the raw frames fetched from finqual and yahoo.
+
+    Every entry is keyed by symbol, source and request window. DataFrames are
+    stored as Parquet files, plain json data (e.g. the yahoo earnings trend) as
+    json files. An entry expires after the TTL of its data kind, and the least
+    recently used entries are evicted once the cache exceeds `max_bytes`.
+
+    The size of the cache is scanned once and then counted along with the
+    stores of this instance, entries of other processes are counted from the
+    next scan on, which happens whenever the counted size exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_CACHE_DIR,
+        ttl: dict[str, pd.Timedelta] | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.ttl = dict(DEFAULT_TTL)
+        if ttl is not None:
+            self.ttl.update(ttl)
+        self.max_bytes = max_bytes
+        self._size: int | None = None  # counted size, None until scanned
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # sent to worker processes, which count their own stores
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def fetch(
+        self,
+        symbol: str,
+        source: str,
+        window: str,
+        kind: str,
+        fetch_fn: Callable[[], Any],
+        refresh: bool = False,
+    ) -> Any:
+        """Return the cached entry, or call `fetch_fn` and store its result.
+
+        Args:
+            symbol (str): stock symbol
+            source (str): name of the data source, e.g. "income_stmt_period"
+            window (str): requested window, e.g. "1995-2025" or "20y-1d"
+            kind (str): data kind selecting the TTL, e.g. "prices"
+            fetch_fn (Callable[[], Any]): fetches the data if it is not cached
+            refresh (bool): ignore a cached entry and fetch again
+
+        Returns:
+            Any: DataFrame or json data
+        """
+        if not refresh:
+            data = self.load(symbol, source, window, kind)
+            if data is not None:
+                return data
+
+        data = fetch_fn()
+        self.store(symbol, source, window, data)
+        return data
+
+    def load(
+        self, symbol: str, source: str, window: str, kind: str | None = None
+    ) -> Any | None:
+        """Load an entry, returns None if it is missing or expired.
+
+        Args:
+            symbol (str): stock symbol
+            source (str): name of the data source
+            window (str): requested window
+            kind (str | None): data kind selecting the TTL, None never expires
+        """
+        path = self._existing_path(symbol, source, window)
+        if path is None:
+            return None
+        try:
+            fetched = path.stat().st_mtime
+            age = pd.Timedelta(seconds=time.time() - fetched)
+            if kind is not None and age > self.ttl[kind]:
+                return None
+
+            # mark as recently used, the modification time stays the fetch time
+            os.utime(path, (time.time(), fetched))
+
+            if path.suffix == ".parquet":
+                return pd.read_parquet(path)
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:  # evicted by a concurrent store
+            return None
+
+    def store(self, symbol: str, source: str, window: str, data: Any) -> None:
+        """Store an entry and evict old entries if the cache got too large."""
+        path = self._path(symbol, source, window, isinstance(data, pd.DataFrame))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write to a temporary file first, so readers never see half written files,
+        # one per process and thread, as concurrent writers may store the same entry
+        tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        if isinstance(data, pd.DataFrame):
+            data.to_parquet(tmp_path)
+        else:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+        added = tmp_path.stat().st_size - _file_size(path)
+        os.replace(tmp_path, path)
+
+        # remove a stale entry of the other format
+        other = self._path(symbol, source, window, not isinstance(data, pd.DataFrame))
+        added -= _file_size(other)
+        other.unlink(missing_ok=True)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            if self._size is None or self._size > self.max_bytes:
+                self._evict()
+
+    def age(self, symbol: str, source: str, window: str) -> pd.Timedelta:
+        """Time since the entry was fetched, infinite if it does not exist."""
+        path = self._existing_path(symbol, source, window)
+        if path is None:
+            return pd.Timedelta.max
+        try:
+            fetched = path.stat().st_mtime
+        except FileNotFoundError:  # evicted by a concurrent store
+            return pd.Timedelta.max
+        return pd.Timedelta(seconds=time.time() - fetched)
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        for path in self._entries():
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._size = 0
+
+    def size(self) -> int:
+        """Total size of all cached entries in bytes."""
+        return sum(_file_size(path) for path in self._entries())
+
+    def _path(self, symbol: str, source: str, window: str, frame: bool) -> Path:
+        suffix = ".parquet" if frame else ".json"
+        name = _safe_name(f"{source}_{window}") + suffix
+        return self.directory / _safe_name(symbol) / name
+
+    def _existing_path(self, symbol: str, source: str, window: str) -> Path | None:
+        for frame in (True, False):
+            path = self._path(symbol, source, window, frame)
+            if path.exists():
+                return path
+        return None
+
+    def _entries(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        return [
+            path
+            for path in self.directory.glob("*/*")
+            if path.suffix in (".parquet", ".json")
+        ]
+
+    def _evict(self) -> None:
+        """Scan the cache and delete least recently used entries until it fits into
+        max_bytes, called with the lock held."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # removed by a concurrent process
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _safe_name(name: str) -> str:
+    """Make a string usable as file name.
+
+    Replaced characters are followed by a short hash of the raw name, so e.g.
+    "BRK/B" and "BRK_B" get different names. Safe names stay as they are.
+    """
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+    if safe == name:
+        return name
+    return f"{safe}-{hashlib.sha1(name.encode()).hexdigest()[:8]}"
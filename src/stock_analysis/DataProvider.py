@@ -0,0 +1,538 @@
+###########################
+# sources of the raw stock data
+###########################
+"""Sources of the raw stock data, all returning the layout of the live data
+
+- `LiveProvider`: finqual and yahoo, through the rate limited `FetchScheduler`
+- `RecordedProvider`: replays recordings of `record_stock_data`, offline. The
+  tests run against the recordings in "tests/recordings".
+- `SyntheticProvider`: deterministic random data of any length
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import pandas as pd
+
+from .DataCache import DataCache, _safe_name
+from .FetchScheduler import FetchScheduler, default_scheduler
+
+if TYPE_CHECKING:
+    import finqual as fq
+    from yahooquery import Ticker
+
+# finqual statements used by StockData, with the line items it reads
+STATEMENTS = {
+    "balance_sheet_period": ["Shares Outstanding", "Total Assets"],
+    "income_stmt_period": ["Total Revenue", "Net Income"],
+    "cash_flow_period": ["Operating Cash Flow"],
+}
+
+# yahooquery messages of data which does not exist, all others are retried
+NOT_FOUND_MESSAGES = ("not found", "no data", "unavailable", "delisted", "invalid")
+
+
+class YahooError(RuntimeError):
+    """
+    Error which yahooquery returned as message instead of raising it.
+
+    The HTTP status is lost in the message, so `code` is guessed from it: the
+    `FetchScheduler` retries throttling and server errors by their status.
+    yahooquery reports every response which is not json, like the error page
+    of a 429 or 503, as "HTTP 404 Not Found.  Please try again", which is
+    retried as well.
+    """
+
+    def __init__(self, symbol: str, message: str):
+        super().__init__(f"Yahoo request for {symbol} failed: {message}")
+        self.symbol = symbol
+        self.code = yahoo_status(message)
+
+
+class DataProvider(ABC):
+    """
+    Source of the raw data of `StockData`.
+
+    The data is returned in the layout of finqual and yahooquery, so that all
+    providers can be used interchangeably:
+    - statements: one row per line item (first column named by the symbol), one
+      column per year in descending order
+    - income statement: yahoo annual income statement with "asOfDate" and "BasicEPS"
+    - earnings trend: list of yahoo estimate periods ("0y", "+1y", ...)
+    - history: frame with a "close" column and a tz-naive DatetimeIndex
+    - peers: list of symbols of comparable companies
+
+    A provider has to implement all methods, it can not be created otherwise.
+    """
+
+    # whether StockData keeps the data in its DataCache
+    cached = True
+
+    @abstractmethod
+    def statement(
+        self, symbol: str, method_name: str, start_year: int, end_year: int
+    ) -> pd.DataFrame:
+        """finqual statement, e.g. method_name="income_stmt_period" """
+        raise NotImplementedError
+
+    @abstractmethod
+    def income_statement(self, symbol: str) -> pd.DataFrame:
+        """Annual yahoo income statement"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def earnings_trend(self, symbol: str) -> list[dict]:
+        """Yahoo earnings estimates"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def history(
+        self, symbol: str, start: pd.Timestamp | None = None, years: int = 20
+    ) -> pd.DataFrame:
+        """Daily closing prices, of the last `years` years or since `start`"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def peers(self, symbol: str, n: int = 10) -> list[str]:
+        """Up to n comparable companies of the same sector, without the symbol"""
+        raise NotImplementedError
+
+
+class LiveProvider(DataProvider):
+    """Fetches the data from finqual and yahoo
+
+    All requests go through a `FetchScheduler`, which limits their rate and
+    retries transient errors.
+    """
+
+    def __init__(self, scheduler: FetchScheduler | None = None):
+        """
+        Args:
+            scheduler (FetchScheduler | None): scheduler of the requests, None
+                uses the default scheduler of the process
+        """
+        self._scheduler = scheduler
+        self._tickers: dict[str, Ticker] = {}
+        self._finquals: dict[str, fq.Finqual] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the network clients and the scheduler are created again in other processes
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    @property
+    def scheduler(self) -> FetchScheduler:
+        return self._scheduler if self._scheduler is not None else default_scheduler()
+
+    def ticker(self, symbol: str) -> Ticker:
+        """yahooquery Ticker, only created when yahoo data has to be fetched"""
+        with self._lock:
+            if symbol not in self._tickers:
+                from yahooquery import Ticker
+
+                self._tickers[symbol] = Ticker(symbol)
+            return self._tickers[symbol]
+
+    def finqual(self, symbol: str) -> fq.Finqual:
+        """Finqual object, only created when finqual data has to be fetched"""
+        with self._lock:
+            if symbol not in self._finquals:
+                import finqual as fq
+
+                self._finquals[symbol] = fq.Finqual(symbol)
+            return self._finquals[symbol]
+
+    def statement(
+        self, symbol: str, method_name: str, start_year: int, end_year: int
+    ) -> pd.DataFrame:
+        return self.scheduler.call(
+            "finqual",
+            lambda: getattr(self.finqual(symbol), method_name)(
+                start_year, end_year
+            ).to_pandas(),
+            key=(symbol, method_name, start_year, end_year),
+        )
+
+    # the yahoo responses are validated inside the scheduled calls, so that
+    # the error messages which yahooquery returns are retried like errors
+
+    def income_statement(self, symbol: str) -> pd.DataFrame:
+        return self.scheduler.call(
+            "yahoo",
+            lambda: yahoo_data(
+                self.ticker(symbol).income_statement(trailing=False), symbol
+            ),
+            key=(symbol, "income_statement"),
+        )
+
+    def earnings_trend(self, symbol: str) -> list[dict]:
+        return self.scheduler.call(
+            "yahoo",
+            lambda: yahoo_data(self.ticker(symbol).earnings_trend, symbol, "trend"),
+            key=(symbol, "earnings_trend"),
+        )
+
+    def history(
+        self, symbol: str, start: pd.Timestamp | None = None, years: int = 20
+    ) -> pd.DataFrame:
+        if start is None:
+            request = dict(period=f"{years}y")
+        else:
+            request = dict(start=start.strftime("%Y-%m-%d"))
+
+        def fetch() -> pd.DataFrame:
+            try:
+                hist = self.ticker(symbol).history(
+                    **request, interval="1d", adj_timezone=False
+                )
+            except KeyError:
+                # yahooquery indexes the {"error": ...} of a failed request by symbol
+                raise YahooError(symbol, "HTTP error, please try again") from None
+            hist = yahoo_data(hist, symbol)
+            if "close" not in hist or symbol not in hist.index.get_level_values(0):
+                # the error message of the symbol is dropped from the frame
+                raise YahooError(symbol, "no price history, please try again")
+            return close_history(hist, symbol)
+
+        return self.scheduler.call(
+            "yahoo", fetch, key=(symbol, "history", *request.values())
+        )
+
+    def peers(self, symbol: str, n: int = 10) -> list[str]:
+        import finqual as fq
+
+        # the comparables are a window around the symbol, which is part of it
+        peers = self.scheduler.call(
+            "finqual", lambda: fq.CCA(symbol).get_c(n + 1), key=(symbol, "peers", n)
+        )
+        return [peer for peer in peers or () if peer != symbol][:n]
+
+
+class RecordedProvider(DataProvider):
+    """
+    Replays data recorded with `record_stock_data`, without any network access.
+
+    The recordings are stored like DataCache entries ("<symbol>/<source>_recorded.*")
+    and never expire. The requested statement years are ignored, the statements
+    are replayed as recorded.
+    """
+
+    cached = False
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self._store = DataCache(self.directory, max_bytes=sys.maxsize)
+
+    def symbols(self) -> list[str]:
+        """Symbols with a recorded history"""
+        symbols = []
+        for path in self.directory.glob("*/history_recorded.parquet"):
+            # the folder name is the symbol, unless it had to be made file safe
+            symbol_path = path.with_name("symbol_recorded.json")
+            if symbol_path.exists():
+                symbols.append(json.loads(symbol_path.read_text()))
+            else:
+                symbols.append(path.parent.name)
+        return sorted(symbols)
+
+    def _load(self, symbol: str, source: str):
+        data = self._store.load(symbol, source, "recorded")
+        if data is None:
+            raise FileNotFoundError(
+                f"No recording of {source} for {symbol} in '{self.directory}'"
+            )
+        return data
+
+    def statement(
+        self, symbol: str, method_name: str, start_year: int, end_year: int
+    ) -> pd.DataFrame:
+        return self._load(symbol, method_name)
+
+    def income_statement(self, symbol: str) -> pd.DataFrame:
+        return self._load(symbol, "income_statement")
+
+    def earnings_trend(self, symbol: str) -> list[dict]:
+        return self._load(symbol, "earnings_trend")
+
+    def history(
+        self, symbol: str, start: pd.Timestamp | None = None, years: int = 20
+    ) -> pd.DataFrame:
+        history = self._load(symbol, "history")
+        if start is not None:
+            return history[history.index >= start]
+        return history.truncate(before=history.index[-1] - pd.DateOffset(years=years))
+
+    def peers(self, symbol: str, n: int = 10) -> list[str]:
+        return self._load(symbol, "peers")[:n]
+
+
+def record_stock_data(
+    symbol: str,
+    directory: str | Path,
+    provider: DataProvider | None = None,
+    years: int = 20,
+) -> None:
+    """Record the raw data of a symbol, to be replayed by `RecordedProvider`
+
+    Args:
+        symbol (str): stock symbol
+        directory (str | Path): folder of the recordings
+        provider (DataProvider | None): source of the data, None fetches live data
+        years (int): years of price history to record
+    """
+    provider = provider if provider is not None else LiveProvider()
+    store = DataCache(directory, max_bytes=sys.maxsize)
+    current_year = pd.Timestamp.today().year
+    for method_name in STATEMENTS:
+        store.store(
+            symbol,
+            method_name,
+            "recorded",
+            provider.statement(symbol, method_name, current_year - 30, current_year),
+        )
+    store.store(
+        symbol, "income_statement", "recorded", provider.income_statement(symbol)
+    )
+    store.store(symbol, "earnings_trend", "recorded", provider.earnings_trend(symbol))
+    store.store(symbol, "history", "recorded", provider.history(symbol, years=years))
+    if _safe_name(symbol) != symbol:
+        store.store(symbol, "symbol", "recorded", symbol)
+    try:
+        peers = provider.peers(symbol)
+    except Exception as e:
+        # e.g. companies which are not covered by finqual
+        print(f"Recording the peers of {symbol} failed: {e!r}")
+    else:
+        store.store(symbol, "peers", "recorded", peers)
+
+
+class SyntheticProvider(DataProvider):
+    """
+    Generates realistic random data, e.g. for tests and stress runs with long
+    histories. The data of a symbol is deterministic for a given seed.
+
+    Revenue grows in phases of a few years, net income and operating cash flow
+    follow with noisy margins, and the price follows the earnings times a mean
+    reverting KGV with daily noise.
+    """
+
+    cached = False
+
+    def __init__(
+        self,
+        years: int | None = None,
+        fundamental_years: int = 15,
+        end: str | pd.Timestamp | None = None,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            years (int | None): years of price history, None uses the requested years
+            fundamental_years (int): number of annual statements
+            end (str | pd.Timestamp | None): last day of the price history, None is today
+            seed (int): random seed, combined with the symbol
+        """
+        self.years = years
+        self.fundamental_years = fundamental_years
+        self.end = pd.Timestamp(end if end is not None else pd.Timestamp.today())
+        self.end = self.end.normalize()
+        self.seed = seed
+
+    def _rng(self, symbol: str, part: str) -> np.random.Generator:
+        return np.random.default_rng(
+            [self.seed, zlib.crc32(symbol.encode()), zlib.crc32(part.encode())]
+        )
+
+    def _fiscal_year_ends(self, symbol: str) -> pd.DatetimeIndex:
+        """Descending fiscal year ends: two estimate years, then the reported years"""
+        month, day = [(3, 31), (6, 30), (9, 28), (12, 31)][
+            self._rng(symbol, "fiscal").integers(4)
+        ]
+        last = pd.Timestamp(self.end.year, month, day)
+        if last > self.end:
+            last = last - pd.DateOffset(years=1)
+        return pd.DatetimeIndex(
+            [
+                last + pd.DateOffset(years=2 - i)
+                for i in range(self.fundamental_years + 2)
+            ]
+        )
+
+    def _fundamentals(self, symbol: str) -> pd.DataFrame:
+        """Annual line items, one row per fiscal year in descending order,
+        including the two estimate years"""
+        rng = self._rng(symbol, "fundamentals")
+        n = self.fundamental_years + 2
+
+        # revenue growth in phases of 3 to 6 years, oldest year first
+        growth = np.empty(n)
+        i = 0
+        while i < n:
+            length = rng.integers(3, 7)
+            growth[i : i + length] = rng.normal(0.08, 0.06)
+            i += length
+        growth += rng.normal(0, 0.03, n)
+        revenue = rng.uniform(1e9, 1e11) * np.exp(np.cumsum(np.log1p(growth)))
+        margin = np.clip(rng.uniform(0.08, 0.25) + rng.normal(0, 0.02, n), 0.01, None)
+        net_income = revenue * margin
+        cash_flow = net_income * rng.uniform(1.0, 1.5) * (1 + rng.normal(0, 0.08, n))
+        # shares decline slowly by buybacks
+        shares = rng.uniform(2e8, 5e9) * np.cumprod(1 - rng.uniform(0, 0.03, n))
+        return pd.DataFrame(
+            {
+                "Total Revenue": revenue,
+                "Net Income": net_income,
+                "Operating Cash Flow": cash_flow,
+                "Shares Outstanding": shares,
+                "Total Assets": revenue * rng.uniform(0.8, 2.0),
+            },
+            self._fiscal_year_ends(symbol)[::-1],
+        ).iloc[::-1]
+
+    def statement(
+        self, symbol: str, method_name: str, start_year: int, end_year: int
+    ) -> pd.DataFrame:
+        reported = self._fundamentals(symbol).iloc[2:]
+        years = reported.index.year
+        reported = reported[(years >= start_year) & (years <= end_year)]
+        items = STATEMENTS[method_name]
+        data = {symbol: items}
+        for date, row in reported.iterrows():
+            data[str(date.year)] = row[items].to_list()
+        return pd.DataFrame(data)
+
+    def income_statement(self, symbol: str) -> pd.DataFrame:
+        reported = self._fundamentals(symbol).iloc[2:6].iloc[::-1]
+        return pd.DataFrame(
+            {
+                "asOfDate": reported.index,
+                "BasicEPS": (
+                    reported["Net Income"] / reported["Shares Outstanding"]
+                ).to_numpy(),
+            },
+            pd.Index([symbol] * len(reported), name="symbol"),
+        )
+
+    def earnings_trend(self, symbol: str) -> list[dict]:
+        fundamentals = self._fundamentals(symbol)
+        eps = fundamentals["Net Income"] / fundamentals["Shares Outstanding"]
+        # yahoo eps differ a bit from the finqual eps
+        deviation = 1 + self._rng(symbol, "estimates").normal(0, 0.03, 2)
+        return [
+            {
+                "period": period,
+                "endDate": eps.index[i].strftime("%Y-%m-%d"),
+                "earningsEstimate": {
+                    "avg": float(eps.iloc[i]),
+                    "yearAgoEps": float(eps.iloc[i + 1] * deviation[i]),
+                },
+            }
+            for period, i in [("0y", 1), ("+1y", 0)]
+        ]
+
+    def history(
+        self, symbol: str, start: pd.Timestamp | None = None, years: int = 20
+    ) -> pd.DataFrame:
+        years = self.years if self.years is not None else years
+        dates = pd.bdate_range(
+            self.end - pd.DateOffset(years=years), self.end, name=None
+        )
+        rng = self._rng(symbol, "history")
+
+        # log eps between the fiscal year ends, extrapolated into the past
+        fundamentals = self._fundamentals(symbol).iloc[::-1]
+        x = fundamentals.index.asi8.astype(float)
+        log_eps = np.log(
+            fundamentals["Net Income"] / fundamentals["Shares Outstanding"]
+        ).to_numpy()
+        slope, intercept = np.polyfit(x, log_eps, 1)
+        t = dates.asi8.astype(float)
+        log_eps_daily = np.where(
+            t < x[0], intercept + slope * t, np.interp(t, x, log_eps)
+        )
+
+        # mean reverting log KGV (discrete Ornstein-Uhlenbeck), with daily noise:
+        # d[i] = (1 - theta) * d[i - 1] + noise[i] for the deviation from the mean
+        from scipy.signal import lfilter
+
+        mean_kgv = np.log(rng.uniform(12, 35))
+        noise = rng.normal(0, 0.015, len(dates))
+        noise[0] = 0.0
+        log_kgv = mean_kgv + lfilter([1.0], [1.0, -(1 - 0.004)], noise)
+        history = pd.DataFrame({"close": np.exp(log_eps_daily + log_kgv)}, dates)
+        if start is not None:
+            history = history[history.index >= start]
+        return history
+
+    def peers(self, symbol: str, n: int = 10) -> list[str]:
+        return [f"{symbol}.P{i}" for i in range(1, n + 1)]
+
+
+def yahoo_status(message: str) -> int:
+    """HTTP status of a yahooquery error message, see `YahooError`"""
+    message = message.lower()
+    if "too many requests" in message or "rate limit" in message:
+        return 429
+    if "try again" not in message and any(
+        hint in message for hint in NOT_FOUND_MESSAGES
+    ):
+        return 404
+    return 503
+
+
+def yahoo_data(payload: Any, symbol: str, field: str | None = None) -> Any:
+    """Data of a yahooquery response, raising the error message it may be instead
+
+    Args:
+        payload (Any): return value of a yahooquery Ticker, a frame or a dict by symbol
+        symbol (str): stock symbol
+        field (str | None): key of the data in the dict of the symbol, None
+            expects a frame
+
+    Raises:
+        YahooError: the payload is an error message, e.g. {"error": "..."} of a
+            failed request or {symbol: "No data found"}
+
+    Returns:
+        Any: the frame, or the field of the symbol
+    """
+    if field is None and isinstance(payload, pd.DataFrame):
+        return payload
+    data = payload.get(symbol) if isinstance(payload, dict) else None
+    if field is not None and isinstance(data, dict) and field in data:
+        return data[field]
+    message = payload
+    for key in [symbol, "error", "description"]:
+        if isinstance(message, dict) and key in message:
+            message = message[key]
+    raise YahooError(symbol, str(message))
+
+
+def close_history(hist: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    """Extract the daily closes of one symbol from a yahooquery history frame
+
+    Args:
+        hist (pd.DataFrame): history frame indexed by (symbol, date)
+        symbol (str): stock symbol
+
+    Returns:
+        pd.DataFrame: frame with a "close" column and a DatetimeIndex
+    """
+    hist = hist["close"][symbol]
+
+    # omit latest value, as this is datetime not date
+    return pd.DataFrame(
+        {"close": hist.values[:-1]},
+        pd.DatetimeIndex(hist.index[:-1]).tz_localize(None),
+    )
@@ -0,0 +1,341 @@
+###########################
+# rate limited, retrying scheduler of the network requests
+###########################
+from __future__ import annotations
+
+import copy
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Hashable, TypeVar
+
+import pandas as pd
+
+from .timing import span
+
+T = TypeVar("T")
+
+# sustained requests per second and host, a host is a data source like "yahoo"
+DEFAULT_RATES = {"yahoo": 2.0, "finqual": 4.0}
+DEFAULT_RATE = 2.0
+# requests per host which may be sent at once after an idle time
+DEFAULT_BURST = 5
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 4
+# seconds before the first retry, doubled with every further retry
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+# names of transient network errors, also of the requests and http.client ones
+RETRYABLE_ERRORS = frozenset(
+    {
+        "ConnectionError",
+        "TimeoutError",
+        "Timeout",
+        "ChunkedEncodingError",
+        "RemoteDisconnected",
+        "IncompleteRead",
+    }
+)
+
+# columns of `FetchScheduler.stats`
+FETCH_STATS_COLUMNS = [
+    "requests",
+    "completed",
+    "failed",
+    "retries",
+    "deduplicated",
+    "throttled",
+    "throughput",
+    "last_error",
+]
+
+
+def status_code(error: BaseException) -> int | None:
+    """HTTP status of an urllib or requests error, None for other errors"""
+    status = getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for throttling (429), server errors (5xx) and connection problems"""
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Seconds to wait from the Retry-After header of a response, if any"""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average and bursts of `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, waiting until one is available
+
+        Returns:
+            float: seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+@dataclass
+class FetchStats:
+    """Counters of the requests to one host"""
+
+    requests: int = 0  # calls, including the deduplicated ones
+    completed: int = 0
+    failed: int = 0
+    retries: int = 0
+    deduplicated: int = 0  # calls which waited for an identical call in flight
+    throttled: float = 0.0  # seconds waited for the rate limit
+    first: float | None = None  # time.monotonic() of the first call
+    last: float | None = None  # time.monotonic() of the last finished call
+    last_error: str | None = None  # repr of the last retried or failed error
+
+    @property
+    def throughput(self) -> float:
+        """Completed requests per second, from the first call to the last result"""
+        if self.first is None or self.last is None or self.last <= self.first:
+            return float("nan")
+        return self.completed / (self.last - self.first)
+
+
+class FetchScheduler:
+    """
+    Runs the requests of all data providers with per host rate limits.
+
+    Every call takes a token of the bucket of its host, at most `max_concurrency`
+    calls run at once, and calls failing with a retryable error (429, 5xx,
+    connection problems) are retried with exponential backoff and jitter, or
+    after the Retry-After time of the response. Identical calls (same host and
+    key) which are in flight at the same time are only run once.
+
+    The scheduler is thread safe. Worker processes use their own default
+    scheduler, see `set_default_scheduler`.
+    """
+
+    def __init__(
+        self,
+        rates: dict[str, float] | None = None,
+        default_rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        retryable: Callable[[BaseException], bool] = is_retryable,
+        share: int = 1,
+    ):
+        """
+        Args:
+            rates (dict[str, float] | None): requests per second by host, None
+                uses `DEFAULT_RATES`
+            default_rate (float): requests per second of other hosts
+            burst (int): requests per host which may be sent at once
+            max_concurrency (int): calls running at the same time, of all hosts
+            max_retries (int): retries of a failing call before its error is raised
+            backoff (float): seconds before the first retry, doubled with every
+                retry up to `max_backoff`. The actual delay is drawn between the
+                half and the full backoff.
+            max_backoff (float): maximum seconds between two retries
+            retryable (Callable[[BaseException], bool]): errors to retry
+            share (int): number of processes sharing the rate limits, e.g. the
+                workers of a batch run. Each gets this fraction of the rates,
+                burst and concurrency.
+        """
+        rates = dict(DEFAULT_RATES if rates is None else rates)
+        self.rates = {host: rate / share for host, rate in rates.items()}
+        self.default_rate = default_rate / share
+        self.burst = max(1, burst // share)
+        self.max_concurrency = max(1, max_concurrency // share)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retryable = retryable
+
+        self._buckets: dict[str, TokenBucket] = {}
+        self._stats: dict[str, FetchStats] = {}
+        self._in_flight: dict[tuple[str, Hashable], Future] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def call(self, host: str, fn: Callable[[], T], key: Hashable | None = None) -> T:
+        """Run a request under the limits of its host
+
+        Args:
+            host (str): host or data source of the request, e.g. "yahoo"
+            fn (Callable[[], T]): the request, called again for retries
+            key (Hashable | None): identity of the request, calls with the same
+                host and key wait for the one in flight and get a copy of its
+                result. None never deduplicates.
+
+        Returns:
+            T: result of `fn`
+        """
+        with self._lock:
+            stats = self._host_stats(host)
+            stats.requests += 1
+            if stats.first is None:
+                stats.first = time.monotonic()
+            future = self._in_flight.get((host, key)) if key is not None else None
+            leader = future is None
+            if future is not None:
+                stats.deduplicated += 1
+            elif key is not None:
+                future = self._in_flight[(host, key)] = Future()
+
+        if not leader:
+            return copy.copy(future.result())
+        try:
+            result = self._run(host, fn)
+        except BaseException as e:
+            if future is not None:
+                future.set_exception(e)
+            raise
+        finally:
+            if future is not None:
+                with self._lock:
+                    del self._in_flight[(host, key)]
+        if future is not None:
+            future.set_result(result)
+        return result
+
+    def stats(self) -> pd.DataFrame:
+        """Counters and throughput (requests per second) per host"""
+        with self._lock:
+            rows = {
+                host: {
+                    "requests": stats.requests,
+                    "completed": stats.completed,
+                    "failed": stats.failed,
+                    "retries": stats.retries,
+                    "deduplicated": stats.deduplicated,
+                    "throttled": stats.throttled,
+                    "throughput": stats.throughput,
+                    "last_error": stats.last_error,
+                }
+                for host, stats in self._stats.items()
+            }
+        stats = pd.DataFrame.from_dict(
+            rows, orient="index", columns=FETCH_STATS_COLUMNS
+        )
+        stats.index.name = "host"
+        return stats
+
+    def counters(self) -> dict[str, int]:
+        """Request, retry, deduplication and failure counts summed over all hosts"""
+        with self._lock:
+            return {
+                name: sum(getattr(stats, name) for stats in self._stats.values())
+                for name in ["requests", "retries", "deduplicated", "failed"]
+            }
+
+    def _host_stats(self, host: str) -> FetchStats:
+        if host not in self._stats:
+            self._stats[host] = FetchStats()
+            self._buckets[host] = TokenBucket(
+                self.rates.get(host, self.default_rate), self.burst
+            )
+        return self._stats[host]
+
+    def _run(self, host: str, fn: Callable[[], T]) -> T:
+        """Call fn with rate limit, concurrency limit and retries"""
+        bucket = self._buckets[host]
+        stats = self._stats[host]
+        attempt = 0
+        while True:
+            with span(f"fetch.throttle.{host}"):
+                waited = bucket.acquire()
+            with self._slots:
+                try:
+                    result = fn()
+                    error = None
+                except Exception as e:
+                    error = e
+            with self._lock:
+                stats.throttled += waited
+                stats.last = time.monotonic()
+                if error is None:
+                    stats.completed += 1
+                    return result
+                stats.last_error = repr(error)
+                if attempt >= self.max_retries or not self.retryable(error):
+                    stats.failed += 1
+                    raise error
+                stats.retries += 1
+            delay = min(self.max_backoff, self.backoff * 2**attempt)
+            delay = random.uniform(delay / 2, delay)
+            delay = max(delay, retry_after(error) or 0.0)
+            # retries are counted in the stats, the waits recorded as spans
+            with span(f"fetch.backoff.{host}"):
+                time.sleep(delay)
+            attempt += 1
+
+
+_default_scheduler: FetchScheduler | None = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> FetchScheduler:
+    """Scheduler of the live data providers of this process"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = FetchScheduler()
+        return _default_scheduler
+
+
+def set_default_scheduler(scheduler: FetchScheduler | None) -> None:
+    """Replace the scheduler of this process, None creates a new default one"""
+    global _default_scheduler
+    with _default_lock:
+        _default_scheduler = scheduler
+
+
+def share_default_scheduler(processes: int) -> None:
+    """Worker process initializer: use a share of the default rate limits"""
+    set_default_scheduler(FetchScheduler(share=processes))
@@ -3,29 +3,74 @@
 ###########################
 import matplotlib
 import itertools
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
 from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from matplotlib.backends.backend_pdf import PdfPages
 from pathlib import Path
+import numpy as np
+import pandas as pd
+from .decimation import decimate_frame, decimate_series
+from .timing import span
 
 
 class PlotManager:
-    def __init__(self, rows=2, cols=2):
+    def __init__(
+        self,
+        rows=2,
+        cols=2,
+        filename: str | Path | None = None,
+        max_points: int | None = None,
+        window_offset: int = 0,
+    ):
+        """
+        Args:
+            rows (int): rows of the grid windows
+            cols (int): columns of the grid windows
+            filename (str | Path | None): stream the figures to this pdf. Every
+                figure is written and closed as soon as it is complete, so only
+                the figures still being drawn on are kept in memory.
+            max_points (int | None): default number of points series are
+                decimated to by `plot_series`, None draws all points
+            window_offset (int): number of windows before the first one, for
+                the titles of pages which are rendered separately
+        """
+        self.max_points = max_points
         self._rows = rows
         self._cols = cols
         self._plots_per_window = rows * cols
         self._fig = None
         self._axes = None
         self._plot_count = 0
-        self._window_count = 0
-        self._all_figs: list[Figure] = []
+        self._window_count = window_offset
+        self._full_fig = None  # latest full-size figure, still being drawn on
+        self._all_figs: list[Figure] = []  # figures which are not yet written
+        self._saved_count = 0
+
+        self._pdf = None
+        self._pdf_path = None
+        if filename is not None:
+            self._pdf_path = _pdf_path(filename)
+            self._pdf = PdfPages(self._pdf_path)
+
+    @property
+    def streaming(self) -> bool:
+        """True if the figures are written to the pdf while plotting"""
+        return self._pdf is not None
 
     def next_axis(self, title: str | None = None, full: bool = False) -> Axes:
         """
         Get the next subplot axis in the current window.
         If full=True, create a new full-size figure instead of using the grid.
         """
+        # the previously returned axis is complete now
+        self._full_fig = None
+        if self.streaming:
+            self._write_complete_figures()
+
         if full:
             # create a new full-size figure
             self._window_count += 1
@@ -35,6 +80,7 @@ class PlotManager:
                 ax.set_title(title)
             ax.grid(True)
             self._all_figs.append(fig)
+            self._full_fig = fig
             return ax
 
         # grid-based small plot
@@ -60,26 +106,87 @@ class PlotManager:
         ax.grid(True)
         return ax
 
+    def plot_series(
+        self,
+        ax: Axes,
+        series: pd.Series,
+        *args,
+        max_points: int | None = None,
+        **kwargs,
+    ) -> list[Line2D]:
+        """Plot a time series as line, decimated to max_points (LTTB)
+
+        Args:
+            ax (Axes): axes to plot on
+            series (pd.Series): series with ascending DatetimeIndex
+            *args: format string passed to `ax.plot`
+            max_points (int | None): number of points to keep, None uses the
+                default of the PlotManager
+            **kwargs: passed to `ax.plot`
+        """
+        if max_points is None:
+            max_points = self.max_points
+        if max_points is not None:
+            series = decimate_series(series, max_points)
+        return ax.plot(series.index, series.array, *args, **kwargs)
+
+    def plot_lines(
+        self,
+        ax: Axes,
+        frame: pd.DataFrame,
+        cmap: str = "rainbow",
+        max_points: int | None = None,
+        **kwargs,
+    ) -> LineCollection:
+        """Plot the columns of a frame as one LineCollection, colored along a colormap
+
+        A single artist instead of one line per column keeps drawing fast and the
+        pdf small, every column is decimated like in `plot_series`.
+
+        Args:
+            ax (Axes): axes to plot on
+            frame (pd.DataFrame): series with ascending DatetimeIndex as columns
+            cmap (str): matplotlib colormap, from the first to the last column
+            max_points (int | None): number of points to keep per column, None
+                uses the default of the PlotManager
+            **kwargs: passed to `LineCollection`, e.g. linewidth or label
+        """
+        if max_points is None:
+            max_points = self.max_points
+        if max_points is not None:
+            columns = decimate_frame(frame, max_points)
+        else:
+            columns = [series for _, series in frame.items()]
+        segments = []
+        for series in columns:
+            series = series.dropna()
+            segments.append(
+                np.column_stack([mdates.date2num(series.index), series.to_numpy()])
+            )
+        colors = matplotlib.colormaps[cmap](np.linspace(0, 1, len(segments)))
+        lines = LineCollection(segments, colors=colors, **kwargs)
+        ax.add_collection(lines)
+        ax.xaxis_date()
+        ax.autoscale_view()
+        return lines
+
     def finalize(self, show=True, filename: str | Path | None = None):
-        """Hide unused axes, add legends, (optionally) show all figures,(optionally) save to pdf."""
+        """Hide unused axes, add legends, (optionally) show all figures,(optionally) save to pdf.
+
+        In streaming mode the remaining figures are written and the pdf is closed,
+        `filename` is ignored and the figures can not be shown anymore.
+        """
+        if self.streaming:
+            self._write_complete_figures(all_figures=True)
+            self._pdf.close()
+            self._pdf = None
+            print(f"Saved {self._saved_count} figure(s) to '{self._pdf_path}'")
+            if show:
+                print("Figures were streamed to the pdf and can not be shown.")
+            return
+
         for fig in self._all_figs:
-            axes = fig.get_axes()
-            for ax in axes:
-                handles, labels = ax.get_legend_handles_labels()
-                if handles:  # only add legend if there are labeled items
-                    ax.legend()
-            # Hide unused subplots in last window (for grid figures only)
-            if (
-                fig is self._all_figs[-1]
-                and fig is self._fig
-                and self._plot_count < self._plots_per_window
-            ):
-                for i in range(self._plot_count, self._plots_per_window):
-                    try:
-                        fig.delaxes(axes[i])
-                    except IndexError:
-                        pass
-            fig.tight_layout()
+            self._finalize_figure(fig)
 
         # optionally save to pdf
         if filename is not None:
@@ -87,7 +194,58 @@ class PlotManager:
 
         if show:
             matplotlib.use("TkAgg")  # or 'Qt5Agg'
-            plt.show()
+            with span("render.show"):
+                plt.show()
+
+        # free the figures, e.g. when creating many reports in one process
+        for fig in self._all_figs:
+            plt.close(fig)
+        self._all_figs = []
+
+    def discard(self):
+        """Close all figures and the pdf without writing them, e.g. after a chart
+        failed. A partly streamed pdf is deleted."""
+        for fig in self._all_figs:
+            plt.close(fig)
+        self._all_figs = []
+        self._fig = self._axes = self._full_fig = None
+        if self.streaming:
+            self._pdf.close()
+            self._pdf = None
+            self._pdf_path.unlink(missing_ok=True)
+
+    def _finalize_figure(self, fig: Figure):
+        """Add legends and hide unused axes of a figure which is complete"""
+        axes = fig.get_axes()
+        for ax in axes:
+            handles, labels = ax.get_legend_handles_labels()
+            if handles:  # only add legend if there are labeled items
+                ax.legend()
+        # Hide unused subplots in last window (for grid figures only)
+        if fig is self._fig and self._plot_count < self._plots_per_window:
+            for i in range(self._plot_count, self._plots_per_window):
+                try:
+                    fig.delaxes(axes[i])
+                except IndexError:
+                    pass
+        with span("render.layout"):
+            fig.tight_layout()
+
+    def _is_open(self, fig: Figure) -> bool:
+        """True if further plots can still be drawn into the figure"""
+        return fig is self._full_fig or (
+            fig is self._fig and self._plot_count < self._plots_per_window
+        )
+
+    def _write_complete_figures(self, all_figures: bool = False):
+        """Write complete (or all) figures to the pdf in page order and close them"""
+        while self._all_figs and (all_figures or not self._is_open(self._all_figs[0])):
+            fig = self._all_figs[0]
+            self._finalize_figure(fig)
+            with span("render.pdf"):
+                self._pdf.savefig(fig)
+            plt.close(self._all_figs.pop(0))
+            self._saved_count += 1
 
     def _save_pdf(self, filename: str | Path):
         """Save all stored figures to a single multi-page PDF."""
@@ -95,15 +253,19 @@ class PlotManager:
             print("No figures to save.")
             return
 
-        # ensure folder exists
-        path = Path(filename)
-        path.parent.mkdir(parents=True, exist_ok=True)
-
-        # Ensure file ends with .pdf
-        path = path.with_suffix(".pdf")
-
-        with PdfPages(path) as pdf:
+        path = _pdf_path(filename)
+        with span("render.pdf"), PdfPages(path) as pdf:
             for fig in self._all_figs:
                 pdf.savefig(fig)
 
         print(f"Saved {len(self._all_figs)} figure(s) to '{path}'")
+
+
+def _pdf_path(filename: str | Path) -> Path:
+    """Pdf path with .pdf suffix, the folder is created if needed"""
+    # ensure folder exists
+    path = Path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Ensure file ends with .pdf
+    return path.with_suffix(".pdf")
@@ -0,0 +1,347 @@
+###########################
+# memory mapped close prices of a whole universe
+###########################
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .DataCache import DataCache
+    from .DataProvider import DataProvider
+
+DEFAULT_PRICE_STORE_DIR = Path.home() / ".cache" / "stock_analysis_prices"
+
+META_FILE = "meta.json"
+# spare rows and columns allocated with a new matrix, relative to the used ones
+GROWTH_FACTOR = 1.5
+MIN_DATE_CAPACITY = 512
+MIN_SYMBOL_CAPACITY = 16
+
+
+class PriceStore:
+    """
+    Daily closes of many symbols in one memory mapped dates x symbols matrix.
+
+    The matrix is a raw row major file with spare rows and columns, so new days
+    and symbols are written in place. Only if it is full, or if days are
+    inserted before the last stored day, it is copied into a new, larger file.
+    The shared date index is a second memory mapped file, the symbols and their
+    update times are kept in a small json file. Reading returns views into the
+    read-only memory maps, the closes are neither copied nor parsed.
+
+    Symbols without a close on a day of the shared index (e.g. before their
+    listing, or on holidays of their exchange) are NaN there.
+
+    The store supports a single writer and many readers, e.g. worker processes
+    started after the store was updated.
+    """
+
+    def __init__(
+        self, directory: str | Path = DEFAULT_PRICE_STORE_DIR, dtype="float64"
+    ):
+        """
+        Args:
+            directory (str | Path): folder of the store files
+            dtype: dtype of the closes of a new store, e.g. "float32" to halve
+                its size. An existing store keeps its dtype.
+        """
+        self.directory = Path(directory)
+        self.dtype = np.dtype(dtype)
+        self._meta: dict | None = None
+        self._meta_version: tuple | None = None  # identity of the parsed meta file
+        self._closes: np.ndarray | None = None
+        self._dates: np.ndarray | None = None
+        # derived from the meta data, built again when it changes
+        self._index = pd.DatetimeIndex([])
+        self._positions: dict[str, int] = {}
+
+    def __getstate__(self) -> dict:
+        # memory maps are not pickled, worker processes map the files themselves
+        return {"directory": self.directory, "dtype": self.dtype}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["directory"], state["dtype"])
+
+    def __len__(self) -> int:
+        return len(self._refresh()["symbols"])
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._refresh()["updated"]
+
+    @property
+    def symbols(self) -> list[str]:
+        return list(self._refresh()["symbols"])
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        self._refresh()
+        return self._index
+
+    @property
+    def values(self) -> np.ndarray:
+        """All closes as read-only dates x symbols view"""
+        return self._values(self._refresh())
+
+    def age(self, symbol: str) -> pd.Timedelta:
+        """Time since the closes of a symbol were written, infinite if it is missing"""
+        updated = self._refresh()["updated"].get(symbol)
+        if updated is None:
+            return pd.Timedelta.max
+        return pd.Timedelta(seconds=time.time() - updated)
+
+    def frame(
+        self,
+        symbols: list[str] | None = None,
+        start: pd.Timestamp | str | None = None,
+        end: pd.Timestamp | str | None = None,
+    ) -> pd.DataFrame:
+        """Closes of many symbols, dates x symbols
+
+        Args:
+            symbols (list[str] | None): symbols in the order of the columns, None
+                takes all symbols. The closes are a view if the symbols are
+                stored next to each other in this order, e.g. all symbols.
+            start, end: first and last date, None for all dates
+
+        Returns:
+            pd.DataFrame: closes on the shared date index
+        """
+        meta = self._refresh()
+        values, dates = self._values(meta), self._index
+        rows = self._rows(dates, start, end)
+        if symbols is None:
+            return pd.DataFrame(values[rows], dates[rows], meta["symbols"], copy=False)
+        columns = self._columns(symbols)
+        if len(columns) and np.array_equal(
+            columns, np.arange(columns[0], columns[0] + len(columns))
+        ):
+            columns = slice(columns[0], columns[0] + len(columns))
+        return pd.DataFrame(
+            values[rows, columns], dates[rows], list(symbols), copy=False
+        )
+
+    def series(
+        self,
+        symbol: str,
+        start: pd.Timestamp | str | None = None,
+        end: pd.Timestamp | str | None = None,
+    ) -> pd.Series:
+        """Closes of one symbol as view, see `frame`"""
+        values, dates = self._values(self._refresh()), self._index
+        rows = self._rows(dates, start, end)
+        column = self._columns([symbol])[0]
+        return pd.Series(values[rows, column], dates[rows], name=symbol, copy=False)
+
+    def write(self, closes: pd.DataFrame) -> None:
+        """Store the closes of symbols, replacing their previously stored closes
+
+        New days are added to the shared date index, new symbols as columns.
+
+        Args:
+            closes (pd.DataFrame): daily closes, one column per symbol
+        """
+        meta = self._refresh()
+        closes = closes.sort_index()
+        old_dates = self.dates
+        old_symbols = list(meta["symbols"])
+        symbols = old_symbols + [c for c in closes.columns if c not in old_symbols]
+        dates = old_dates.union(closes.index)
+        appended = dates[: len(old_dates)].equals(old_dates)
+
+        capacity = meta["capacity"]
+        if not appended or len(dates) > capacity[0] or len(symbols) > capacity[1]:
+            # copy into a new matrix, with the old rows at their new positions
+            capacity = [
+                max(MIN_DATE_CAPACITY, int(len(dates) * GROWTH_FACTOR)),
+                max(MIN_SYMBOL_CAPACITY, int(len(symbols) * GROWTH_FACTOR)),
+            ]
+            generation = meta["generation"] + 1
+            closes_map, dates_map = self._allocate(generation, capacity)
+            if len(old_dates):
+                rows = dates.get_indexer(old_dates)
+                closes_map[rows, : len(old_symbols)] = self.values
+        else:
+            generation = meta["generation"]
+            closes_map, dates_map = self._map(generation, capacity, "r+")
+        dates_map[: len(dates)] = dates.as_unit("us").asi8
+
+        columns = [symbols.index(symbol) for symbol in closes.columns]
+        closes_map[: len(dates), columns] = np.nan
+        rows = dates.get_indexer(closes.index)
+        closes_map[rows[:, None], columns] = closes.to_numpy(dtype=self.dtype)
+        closes_map.flush()
+        dates_map.flush()
+        del closes_map, dates_map
+
+        now = time.time()
+        updated = dict(meta["updated"])
+        updated.update({symbol: now for symbol in closes.columns})
+        self._write_meta(
+            {
+                "generation": generation,
+                "dtype": self.dtype.str,
+                "capacity": capacity,
+                "dates": len(dates),
+                "symbols": symbols,
+                "updated": updated,
+            }
+        )
+        if generation != meta["generation"]:
+            # readers which mapped the old files keep them until they unmap them
+            for path in self._paths(meta["generation"]):
+                path.unlink(missing_ok=True)
+
+    def update(
+        self,
+        symbols: list[str],
+        cache: DataCache | None = None,
+        provider: DataProvider | None = None,
+        refresh: bool = False,
+    ) -> list[str]:
+        """Fetch the closes of symbols which are missing or older than the price TTL
+
+        With live data the yahoo histories are prefetched with batched requests
+        first, all new closes are written at once.
+
+        Args:
+            symbols (list[str]): stock symbols
+            cache (DataCache | None): cache of the histories, None uses the
+                default cache
+            provider (DataProvider | None): source of the histories, None fetches
+                live data
+            refresh (bool): fetch the closes of all symbols again
+
+        Returns:
+            list[str]: the updated symbols, symbols whose closes can not be
+                fetched are printed and skipped
+        """
+        from .batch import prefetch_stock_data
+        from .DataCache import DataCache
+        from .DataProvider import LiveProvider
+        from .StockData import update_history
+
+        cache = cache if cache is not None else DataCache()
+        provider = provider if provider is not None else LiveProvider()
+        symbols = [
+            symbol
+            for symbol in dict.fromkeys(symbols)
+            if refresh or self.age(symbol) > cache.ttl["prices"]
+        ]
+        if not symbols:
+            return []
+        prefetch_stock_data(symbols, cache, refresh, provider)
+        closes = {}
+        for symbol in symbols:
+            print(f"Storing closes of {symbol} ...")
+            try:
+                history = update_history(symbol, cache, provider, refresh)
+            except Exception as e:
+                print(f"Storing closes of {symbol} failed: {e!r}")
+                continue
+            closes[symbol] = history["close"]
+        if closes:
+            self.write(pd.DataFrame(closes))
+        return list(closes)
+
+    def _refresh(self) -> dict:
+        """Read the meta data if it changed, and map the files again if they were
+        replaced
+
+        The parsed meta data is kept as long as the meta file is the same (it is
+        replaced by every write), so reading costs one stat of the file.
+        """
+        path = self.directory / META_FILE
+        try:
+            stat = path.stat()
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            version = None
+        if self._meta is not None and version == self._meta_version:
+            return self._meta
+        try:
+            meta = json.loads(path.read_text())
+        except FileNotFoundError:
+            meta = {
+                "generation": 0,
+                "dtype": self.dtype.str,
+                "capacity": [0, 0],
+                "dates": 0,
+                "symbols": [],
+                "updated": {},
+            }
+        self.dtype = np.dtype(meta["dtype"])
+        if (
+            self._meta is None
+            or meta["generation"] != self._meta["generation"]
+            or meta["capacity"] != self._meta["capacity"]
+        ):
+            self._closes, self._dates = self._map(
+                meta["generation"], meta["capacity"], "r"
+            )
+        self._index = pd.DatetimeIndex(self._dates[: meta["dates"]].view("M8[us]"))
+        self._positions = {symbol: i for i, symbol in enumerate(meta["symbols"])}
+        self._meta = meta
+        self._meta_version = version
+        return meta
+
+    def _values(self, meta: dict) -> np.ndarray:
+        return self._closes[: meta["dates"], : len(meta["symbols"])]
+
+    def _rows(self, dates: pd.DatetimeIndex, start, end) -> slice:
+        first = 0 if start is None else dates.searchsorted(pd.Timestamp(start), "left")
+        last = (
+            len(dates)
+            if end is None
+            else dates.searchsorted(pd.Timestamp(end), "right")
+        )
+        return slice(first, last)
+
+    def _columns(self, symbols: list[str]) -> np.ndarray:
+        positions = self._positions
+        missing = [symbol for symbol in symbols if symbol not in positions]
+        if missing:
+            raise KeyError(f"No closes of {', '.join(missing)} in the price store")
+        return np.array([positions[symbol] for symbol in symbols], dtype=np.intp)
+
+    def _paths(self, generation: int) -> tuple[Path, Path]:
+        return (
+            self.directory / f"closes.{generation}.bin",
+            self.directory / f"dates.{generation}.bin",
+        )
+
+    def _map(
+        self, generation: int, capacity: list[int], mode: str
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Memory map the closes and dates files of a generation"""
+        if capacity[0] == 0:
+            return np.empty((0, 0), self.dtype), np.empty(0, np.int64)
+        closes_path, dates_path = self._paths(generation)
+        return (
+            np.memmap(closes_path, self.dtype, mode, shape=tuple(capacity)),
+            np.memmap(dates_path, np.int64, mode, shape=(capacity[0],)),
+        )
+
+    def _allocate(
+        self, generation: int, capacity: list[int]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Create the files of a new generation, all closes NaN"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        closes_path, dates_path = self._paths(generation)
+        closes = np.memmap(closes_path, self.dtype, "w+", shape=tuple(capacity))
+        closes[:] = np.nan
+        dates = np.memmap(dates_path, np.int64, "w+", shape=(capacity[0],))
+        return closes, dates
+
+    def _write_meta(self, meta: dict) -> None:
+        # write to a temporary file first, so readers never see half written files
+        path = self.directory / META_FILE
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(meta))
+        os.replace(tmp_path, path)
@@ -0,0 +1,209 @@
+###########################
+# content addressed cache of computed analysis stages
+###########################
+"""Hashes of the analysis inputs, so reruns only pay for what changed
+
+Every saved report gets a "<report>.inputs" sidecar with the hash of its
+inputs (price history, aligned fundamentals, eps, estimates, render options
+and the code version), a report whose file exists with the same hash is not
+rendered again. A `ResultCache` additionally stores the computed stages under
+the hash of their inputs, so e.g. the growth phases of the fundamentals are
+reused after a new price bar.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from .DataCache import _safe_name
+
+T = TypeVar("T")
+
+DEFAULT_RESULT_CACHE_DIR = Path.home() / ".cache" / "stock_analysis_results"
+
+# bump to invalidate all stored results, e.g. after a change of their pickled types
+RESULT_CACHE_VERSION = 1
+
+PACKAGE_DIR = Path(__file__).parent
+
+
+@functools.cache
+def code_version() -> str:
+    """Hash of the package sources and the pandas and numpy versions
+
+    Any change of the code invalidates all stored results and report hashes,
+    so a stored stage never outlives the code which computed it.
+    """
+    digest = hashlib.sha256(
+        f"{RESULT_CACHE_VERSION} {pd.__version__} {np.__version__}".encode()
+    )
+    for path in sorted(PACKAGE_DIR.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def input_hash(*inputs: Any) -> str:
+    """Content hash of the inputs of a computation and of the code version
+
+    Args:
+        *inputs: pandas objects, numpy arrays, functions, and (nested) dicts,
+            lists, tuples or scalars of them. Equal values give equal hashes,
+            independent of the identity of the objects.
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256(code_version().encode())
+    for value in inputs:
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def _update(digest: "hashlib._Hash", value: Any) -> None:
+    """Add one value to a hash, tagged with its type"""
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, pd.DataFrame):
+        _update(digest, [str(column) for column in value.columns])
+        _update(digest, [str(dtype) for dtype in value.dtypes])
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        _update(digest, [str(value.name), str(value.dtype)])
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, pd.Index):
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(str(len(value)).encode())
+        for key, item in sorted(value.items(), key=lambda item: str(item[0])):
+            _update(digest, key)
+            _update(digest, item)
+    elif isinstance(value, (list, tuple)):
+        digest.update(str(len(value)).encode())
+        for item in value:
+            _update(digest, item)
+    elif callable(value) and hasattr(value, "__code__"):
+        # e.g. a registered valuation model, changed by editing its code
+        code = value.__code__
+        digest.update(f"{value.__module__}.{value.__qualname__}".encode())
+        digest.update(code.co_code)
+        digest.update(repr(code.co_consts).encode())
+    else:
+        digest.update(json.dumps(value, default=repr).encode())
+
+
+class ResultCache:
+    """
+    On-disk store of computed analysis stages, keyed by the hash of their inputs.
+
+    A stage is stored as "<directory>/<symbol>/<stage>-<key>.pkl", where the key
+    is the `input_hash` of everything the stage reads. An unchanged stage, e.g.
+    the growth phases of the fundamentals after a new price bar, is loaded
+    instead of computed again. Only the latest result of each stage is kept.
+    """
+
+    def __init__(self, directory: str | Path = DEFAULT_RESULT_CACHE_DIR):
+        """
+        Args:
+            directory (str | Path): folder of the stored results
+        """
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # sent to worker processes, which count their own hits
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def path(self, symbol: str, stage: str, key: str) -> Path:
+        """File of a stored stage result"""
+        return self.directory / _safe_name(symbol) / f"{stage}-{key}.pkl"
+
+    def load(self, symbol: str, stage: str, key: str) -> Any | None:
+        """Stored result of a stage, None if there is none or it is unreadable"""
+        try:
+            with open(self.path(symbol, stage, key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # e.g. truncated file or changed classes
+            print(f"Ignoring stored {stage} of {symbol}: {e!r}")
+            return None
+
+    def store(self, symbol: str, stage: str, key: str, value: Any) -> None:
+        """Store the result of a stage, replacing older results of the stage"""
+        path = self.path(symbol, stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for old in path.parent.glob(f"{stage}-*.pkl"):
+            if old != path:
+                old.unlink(missing_ok=True)
+
+    def memoize(self, symbol: str, stage: str, key: str, fn: Callable[[], T]) -> T:
+        """Stored result of a stage, or compute and store it
+
+        Args:
+            symbol (str): stock symbol
+            stage (str): name of the stage, e.g. "price_phases"
+            key (str): `input_hash` of the inputs of the stage
+            fn (Callable[[], T]): computes the stage
+
+        Returns:
+            T: result of the stage
+        """
+        value = self.load(symbol, stage, key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+        value = fn()
+        with self._lock:
+            self.misses += 1
+        self.store(symbol, stage, key, value)
+        return value
+
+    def clear(self) -> None:
+        """Remove all stored results"""
+        for path in self.directory.glob("*/*.pkl"):
+            path.unlink(missing_ok=True)
+
+
+def input_hash_path(output: str | Path) -> Path:
+    """Sidecar file with the input hash of an output file, e.g. "AAPL.pdf.inputs" """
+    output = Path(output)
+    return output.with_name(f"{output.name}.inputs")
+
+
+def is_current(output: str | Path, key: str) -> bool:
+    """True if the output file exists and was created from inputs with this hash"""
+    try:
+        return (
+            Path(output).exists() and input_hash_path(output).read_text().strip() == key
+        )
+    except FileNotFoundError:
+        return False
+
+
+def write_input_hash(output: str | Path, key: str) -> None:
+    """Record the input hash of a written output file, see `is_current`"""
+    input_hash_path(output).write_text(key + "\n")
@@ -1,7 +1,33 @@
-from yahooquery import Ticker
-import finqual as fq
+from __future__ import annotations
+
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from .DataCache import DataCache
+from .DataProvider import DataProvider, LiveProvider, YahooError
+from .PriceStore import PriceStore
+from .StockSnapshot import StockSnapshot
+from .timing import span
+
+HISTORY_YEARS = 20
+HISTORY_WINDOW = f"{HISTORY_YEARS}y-1d"
+# number of already stored bars that are fetched again to detect splits and adjustments
+HISTORY_OVERLAP_BARS = 5
+
+
+class StockDataFetchError(RuntimeError):
+    """
+    Raised when one or more data sources of a symbol could not be fetched.
+    """
+
+    def __init__(self, symbol: str, errors: dict[str, Exception]):
+        self.symbol = symbol
+        self.errors = errors
+        details = "; ".join(
+            f"{source}: {type(e).__name__}: {e}" for source, e in errors.items()
+        )
+        super().__init__(f"Fetching data for {symbol} failed ({details})")
 
 
 class StockData:
@@ -10,59 +36,94 @@ class StockData:
     """
 
     symbol: str
-    ticker: Ticker
     fq_balance_df: pd.DataFrame
     fq_income_df: pd.DataFrame
     fq_cashflow_df: pd.DataFrame
     fq_eps: pd.Series
+    fundamentals: pd.DataFrame
     yh_current_year_estimates: dict
     yh_next_year_estimates: dict
+    price_store: PriceStore | None = None
 
-    def __init__(self, symbol: str):
+    def __init__(
+        self,
+        symbol: str,
+        cache: DataCache | None = None,
+        refresh: bool = False,
+        provider: DataProvider | None = None,
+        price_store: PriceStore | None = None,
+    ):
+        """
+        Args:
+            symbol (str): stock symbol
+            cache (DataCache | None): cache for the raw data, None uses the default cache
+            refresh (bool): ignore cached data and fetch everything again
+            provider (DataProvider | None): source of the raw data, None fetches
+                live data from finqual and yahoo
+            price_store (PriceStore | None): read the closes from this store if
+                it holds closes of the symbol younger than the price TTL
+        """
         self.symbol = symbol
-        self.ticker = Ticker(symbol)
-        self._fetch_all_data()
+        self.cache = cache if cache is not None else DataCache()
+        self.refresh = refresh
+        self.provider = provider if provider is not None else LiveProvider()
+        self.price_store = price_store
+        with span("fetch", symbol=symbol):
+            self._fetch_all_data()
 
     def _fetch_all_data(self):
-        ## get finqual dataframes
-        print("Getting finqual data ...")
-        fq_obj = fq.Finqual(self.symbol)
+        ## fetch all sources concurrently, they are independent until the alignment
+        print("Getting stock data ...")
 
-        # ask a 30 year timeframe
+        # ask a 30 year timeframe for finqual
         current_year = datetime.now().year
         start_year = current_year - 30
-        self.fq_balance_df = (
-            fq_obj.balance_sheet_period(start_year, current_year)
-            .to_pandas()
-            .set_index(self.symbol)
-            .T
-        )
-        self.fq_balance_df.index = pd.to_datetime(
-            self.fq_balance_df.index.astype(str) + "-12-31"
-        )
-        self.fq_income_df = (
-            fq_obj.income_stmt_period(start_year, current_year)
-            .to_pandas()
-            .set_index(self.symbol)
-            .T
-        )
-        self.fq_income_df.index = pd.to_datetime(
-            self.fq_income_df.index.astype(str) + "-12-31"
-        )
-        self.fq_cashflow_df = (
-            fq_obj.cash_flow_period(start_year, current_year)
-            .to_pandas()
-            .set_index(self.symbol)
-            .T
-        )
-        self.fq_cashflow_df.index = pd.to_datetime(
-            self.fq_cashflow_df.index.astype(str) + "-12-31"
-        )
-        print("Getting finqual data ... done")
+        fetches = {
+            "balance_sheet": lambda: self._fetch_fq_statement(
+                "balance_sheet_period", start_year, current_year
+            ),
+            "income_stmt": lambda: self._fetch_fq_statement(
+                "income_stmt_period", start_year, current_year
+            ),
+            "cash_flow": lambda: self._fetch_fq_statement(
+                "cash_flow_period", start_year, current_year
+            ),
+            # Income statement (EPS history)
+            "income_statement": lambda: self._cached(
+                "income_statement",
+                "annual",
+                "fundamentals",
+                lambda: self.provider.income_statement(self.symbol),
+            ),
+            "earnings_trend": lambda: self._cached(
+                "earnings_trend",
+                "current",
+                "estimates",
+                lambda: self.provider.earnings_trend(self.symbol),
+            ),
+            "history": self._load_history,
+        }
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=len(fetches)) as executor:
+            futures = {
+                executor.submit(self._timed_fetch, name, fetch): name
+                for name, fetch in fetches.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+        if errors:
+            raise StockDataFetchError(self.symbol, errors)
+        print("Getting stock data ... done")
 
-        ## get yahoo data
-        # Income statement (EPS history)
-        self.income_statement = self.ticker.income_statement(trailing=False)
+        self.fq_balance_df = results["balance_sheet"]
+        self.fq_income_df = results["income_stmt"]
+        self.fq_cashflow_df = results["cash_flow"]
+        self.income_statement = results["income_statement"]
 
         # get earnings release date from yahoo, and adapt finqual dateindex accordingly
         earnings_date = self.income_statement["asOfDate"].iloc[0]
@@ -91,9 +152,8 @@ class StockData:
         self.fq_eps = fq_net_income[common_idx] / fq_shares[common_idx]
 
         ## get future estimates from yahoo
-        trend = self.ticker.earnings_trend[self.symbol]["trend"]
         self.yh_current_year_estimates, self.yh_next_year_estimates = (
-            self.get_eps_estimates(trend)
+            self.get_eps_estimates(results["earnings_trend"])
         )
 
         # compute correction factor for the estimated eps
@@ -118,20 +178,182 @@ class StockData:
         )
         self.fq_eps = pd.concat([estimated_eps_series, self.fq_eps])
 
-        ## Chart history 20y (omit latest value, as this is datetime not date)
-        hist20 = self.ticker.history(period="20y", interval="1d", adj_timezone=False)[
-            "close"
-        ][self.symbol]
-        self.history_20y = pd.Series(
-            hist20.values[:-1], pd.DatetimeIndex(hist20.index[:-1]).tz_localize(None)
-        )
+        ## Chart history 20y
+        self.history_20y = results["history"]["close"]
+        self.history_20y.name = None
 
-        # Chart history 5y
+        # Chart history 5y, a view of the 20y history
         five_years_ago = self.history_20y.index[-1] - pd.Timedelta(days=365 * 5)
-        self.history_5y = self.history_20y.truncate(before=five_years_ago)
+        self.history_5y = self.history_20y.iloc[
+            self.history_20y.index.searchsorted(five_years_ago) :
+        ]
+
+        ## fundamentals and price aligned on the report dates, for the valuations
+        self.fundamentals = self._align_fundamentals()
+
+    def _align_fundamentals(self) -> pd.DataFrame:
+        """All fundamentals and the price at the report dates, in one frame
+
+        One row per report date in ascending order, including the dates of the
+        eps estimates. The columns are "revenue", "net_income",
+        "operating_cash_flow", "shares", "total_assets", "eps" and "close", the
+        last close at or before the date (NaN for future dates). Missing values
+        are NaN. If an estimate falls on a reported date, the reported eps wins.
+        """
+        eps = self.fq_eps[~self.fq_eps.index.duplicated(keep="last")]
+        fundamentals = pd.concat(
+            {
+                "revenue": self.fq_income_df["Total Revenue"],
+                "net_income": self.fq_income_df["Net Income"],
+                "operating_cash_flow": self.fq_cashflow_df["Operating Cash Flow"],
+                "shares": self.fq_balance_df["Shares Outstanding"],
+                "total_assets": self.fq_balance_df["Total Assets"],
+                "eps": eps,
+            },
+            axis=1,
+            sort=True,
+        )
+        fundamentals = fundamentals.astype(float)
+        close = self.history_20y.dropna()
+        fundamentals["close"] = close.asof(fundamentals.index).where(
+            fundamentals.index <= close.index[-1]
+        )
+        return fundamentals
+
+    def _timed_fetch(self, name: str, fetch):
+        """Run one fetch of `_fetch_all_data` in a timing span, in a worker thread"""
+        with span(f"fetch.{name}", symbol=self.symbol):
+            return fetch()
+
+    def _cached(self, source: str, window: str, kind: str, fetch_fn):
+        """Get raw data through the cache, if the provider is cached"""
+        if not self.provider.cached:
+            return fetch_fn()
+        return self.cache.fetch(
+            self.symbol, source, window, kind, fetch_fn, refresh=self.refresh
+        )
+
+    def _fetch_fq_statement(
+        self, method_name: str, start_year: int, end_year: int
+    ) -> pd.DataFrame:
+        """Get a finqual statement with one row per year and one column per line item"""
+        raw = self._cached(
+            method_name,
+            f"{start_year}-{end_year}",
+            "fundamentals",
+            lambda: self.provider.statement(
+                self.symbol, method_name, start_year, end_year
+            ),
+        )
+        df = raw.set_index(self.symbol).T
+        df.index = pd.to_datetime(df.index.astype(str) + "-12-31")
+        return df
+
+    def _update_history(self) -> pd.DataFrame:
+        """Daily closing prices of the last 20 years, see `update_history`"""
+        return update_history(self.symbol, self.cache, self.provider, self.refresh)
+
+    def _load_history(self) -> pd.DataFrame:
+        """Daily closing prices, from the price store if it holds fresh ones"""
+        store = self.price_store
+        if (
+            store is not None
+            and not self.refresh
+            and store.age(self.symbol) <= self.cache.ttl["prices"]
+        ):
+            start = store.dates[-1] - pd.DateOffset(years=HISTORY_YEARS)
+            # the shared index has NaN closes on the trading days of other symbols
+            return store.series(self.symbol, start=start).dropna().to_frame("close")
+        return self._update_history()
+
+    def snapshot(self) -> StockSnapshot:
+        """Compact copy of the data the analysis reads, see `StockSnapshot`"""
+        return StockSnapshot.from_stock_data(self)
 
     def get_eps_estimates(self, earnings_trend: dict):
         """Extract current and next year EPS estimates and yearAgoEps"""
         current = next((p for p in earnings_trend if p["period"] == "0y"), None)
         next_y = next((p for p in earnings_trend if p["period"] == "+1y"), None)
         return current, next_y
+
+
+def update_history(
+    symbol: str,
+    cache: DataCache,
+    provider: DataProvider,
+    refresh: bool = False,
+) -> pd.DataFrame:
+    """Daily closing prices of the last 20 years.
+
+    A stored history older than the price TTL is updated incrementally: only
+    bars after the last stored date (plus a small overlap) are fetched and
+    appended. If the overlapping closes changed, e.g. due to a split, the
+    whole history is fetched again.
+
+    Args:
+        symbol (str): stock symbol
+        cache (DataCache): cache of the history, unused for uncached providers
+        provider (DataProvider): source of the history
+        refresh (bool): ignore the cached history and fetch it again
+
+    Returns:
+        pd.DataFrame: daily closes in the column "close"
+    """
+
+    def fetch(start: pd.Timestamp | None = None) -> pd.DataFrame:
+        return provider.history(symbol, start=start, years=HISTORY_YEARS)
+
+    if not provider.cached:
+        return fetch()
+
+    stored = None
+    if not refresh:
+        stored = cache.load(symbol, "history", HISTORY_WINDOW)
+
+    history = None
+    if stored is not None:
+        if cache.age(symbol, "history", HISTORY_WINDOW) <= cache.ttl["prices"]:
+            return stored
+        # append new bars to the stored history
+        try:
+            recent = fetch(start=history_update_start(stored))
+        except (KeyError, TypeError, YahooError):
+            # no recent bars after the retries, fetch the whole history instead
+            recent = None
+        if recent is not None:
+            history = merge_history(stored, recent)
+
+    if history is None:
+        history = fetch()
+    cache.store(symbol, "history", HISTORY_WINDOW, history)
+    return history
+
+
+def history_update_start(stored: pd.DataFrame) -> pd.Timestamp:
+    """First date to request when updating a stored history incrementally"""
+    return stored.index[-HISTORY_OVERLAP_BARS:][0]
+
+
+def merge_history(stored: pd.DataFrame, recent: pd.DataFrame) -> pd.DataFrame | None:
+    """Append recently fetched bars to a stored history
+
+    Args:
+        stored (pd.DataFrame): stored daily closes
+        recent (pd.DataFrame): daily closes since `history_update_start(stored)`
+
+    Returns:
+        pd.DataFrame | None: merged history, None if the overlapping closes
+        differ (e.g. due to a split) and the full history must be fetched again
+    """
+    overlap = stored.iloc[-HISTORY_OVERLAP_BARS:]
+    common_idx = overlap.index.intersection(recent.index)
+    if len(common_idx) == 0 or not np.allclose(
+        overlap.loc[common_idx, "close"], recent.loc[common_idx, "close"]
+    ):
+        print("Stored price history changed, fetching full history ...")
+        return None
+
+    new_bars = recent[recent.index > stored.index[-1]]
+    history = pd.concat([stored, new_bars])
+    first_date = history.index[-1] - pd.DateOffset(years=HISTORY_YEARS)
+    return history[history.index >= first_date]
@@ -0,0 +1,206 @@
+###########################
+# compact copy of the stock data an analysis reads
+###########################
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .StockData import StockData
+
+# rows of `StockSnapshot.values`, the columns of `StockData.fundamentals`
+FUNDAMENTAL_COLUMNS = [
+    "revenue",
+    "net_income",
+    "operating_cash_flow",
+    "shares",
+    "total_assets",
+    "eps",
+    "close",
+]
+
+FIVE_YEARS = np.timedelta64(365 * 5, "D")
+
+
+class StockSnapshot:
+    """
+    The data of a `StockData` which the analysis reads, in contiguous numpy arrays.
+
+    The raw statements, the yahoo income statement and the data provider are
+    left out, so a snapshot needs a fraction of the memory of its `StockData`
+    and is pickled as a few flat buffers. This is the type to keep in memory
+    for many symbols or to send to worker processes. The pandas properties
+    wrap the arrays without copying them.
+    """
+
+    __slots__ = (
+        "symbol",
+        "dates",
+        "closes",
+        "report_dates",
+        "values",
+        "eps_dates",
+        "eps_values",
+        "yahoo_eps_dates",
+        "yahoo_eps_values",
+        "current_year_estimate",
+        "next_year_estimate",
+        "_five_years",
+    )
+
+    def __init__(
+        self,
+        symbol: str,
+        dates: np.ndarray,
+        closes: np.ndarray,
+        report_dates: np.ndarray,
+        values: np.ndarray,
+        eps_dates: np.ndarray,
+        eps_values: np.ndarray,
+        yahoo_eps_dates: np.ndarray,
+        yahoo_eps_values: np.ndarray,
+        current_year_estimate: dict,
+        next_year_estimate: dict,
+    ):
+        """
+        Args:
+            symbol (str): stock symbol
+            dates (np.ndarray): ascending datetime64 dates of the daily closes
+            closes (np.ndarray): daily closes, without NaN
+            report_dates (np.ndarray): ascending datetime64 report dates
+            values (np.ndarray): fundamentals at the report dates, one row per
+                column of `FUNDAMENTAL_COLUMNS`
+            eps_dates (np.ndarray): dates of the eps, descending, with the
+                estimates first (see `StockData.fq_eps`)
+            eps_values (np.ndarray): eps at the eps dates
+            yahoo_eps_dates (np.ndarray): dates of the eps reported by yahoo
+            yahoo_eps_values (np.ndarray): eps reported by yahoo
+            current_year_estimate (dict): yahoo earnings trend of this year
+            next_year_estimate (dict): yahoo earnings trend of the next year
+        """
+        self.symbol = symbol
+        self.dates = np.asarray(dates)
+        self.closes = np.ascontiguousarray(closes, dtype=float)
+        self.report_dates = np.asarray(report_dates)
+        self.values = np.ascontiguousarray(values, dtype=float)
+        self.eps_dates = np.asarray(eps_dates)
+        self.eps_values = np.ascontiguousarray(eps_values, dtype=float)
+        self.yahoo_eps_dates = np.asarray(yahoo_eps_dates)
+        self.yahoo_eps_values = np.ascontiguousarray(yahoo_eps_values, dtype=float)
+        self.current_year_estimate = current_year_estimate
+        self.next_year_estimate = next_year_estimate
+        self._five_years = int(np.searchsorted(self.dates, self.dates[-1] - FIVE_YEARS))
+
+    @classmethod
+    def from_stock_data(cls, stock: StockData) -> StockSnapshot:
+        """Snapshot of fetched stock data, see `StockData.snapshot`"""
+        history = stock.history_20y.dropna()
+        fundamentals = stock.fundamentals[FUNDAMENTAL_COLUMNS]
+        income = stock.income_statement
+        return cls(
+            stock.symbol,
+            history.index.to_numpy(),
+            history.to_numpy(),
+            fundamentals.index.to_numpy(),
+            fundamentals.to_numpy(dtype=float).T,
+            stock.fq_eps.index.to_numpy(),
+            stock.fq_eps.to_numpy(dtype=float),
+            pd.DatetimeIndex(income["asOfDate"]).to_numpy(),
+            income["BasicEPS"].to_numpy(dtype=float),
+            stock.yh_current_year_estimates,
+            stock.yh_next_year_estimates,
+        )
+
+    def __reduce__(self):
+        # pickled as the constructor arguments, numpy pickles the arrays as
+        # flat buffers (out-of-band with pickle protocol 5)
+        return (
+            StockSnapshot,
+            (
+                self.symbol,
+                self.dates,
+                self.closes,
+                self.report_dates,
+                self.values,
+                self.eps_dates,
+                self.eps_values,
+                self.yahoo_eps_dates,
+                self.yahoo_eps_values,
+                self.current_year_estimate,
+                self.next_year_estimate,
+            ),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the arrays"""
+        return sum(
+            getattr(self, name).nbytes
+            for name in self.__slots__
+            if isinstance(getattr(self, name), np.ndarray)
+        )
+
+    @property
+    def history_20y(self) -> pd.Series:
+        """Daily closes of the last 20 years"""
+        return pd.Series(
+            self.closes, pd.DatetimeIndex(self.dates, copy=False), copy=False
+        )
+
+    @property
+    def history_5y(self) -> pd.Series:
+        """Daily closes of the last 5 years, a view of the 20 year history"""
+        return self.history_20y.iloc[self._five_years :]
+
+    @property
+    def fundamentals(self) -> pd.DataFrame:
+        """Fundamentals and the price at the report dates, see `StockData.fundamentals`"""
+        return pd.DataFrame(
+            self.values.T,
+            pd.DatetimeIndex(self.report_dates, copy=False),
+            FUNDAMENTAL_COLUMNS,
+            copy=False,
+        )
+
+    def _reported(self, column: str) -> pd.Series:
+        """Reported values of a fundamental, descending dates like the statements"""
+        values = self.values[FUNDAMENTAL_COLUMNS.index(column)][::-1]
+        reported = ~np.isnan(values)
+        return pd.Series(
+            values[reported], pd.DatetimeIndex(self.report_dates[::-1][reported])
+        )
+
+    @property
+    def revenue(self) -> pd.Series:
+        return self._reported("revenue")
+
+    @property
+    def net_income(self) -> pd.Series:
+        return self._reported("net_income")
+
+    @property
+    def operating_cash_flow(self) -> pd.Series:
+        return self._reported("operating_cash_flow")
+
+    @property
+    def shares(self) -> pd.Series:
+        return self._reported("shares")
+
+    @property
+    def eps(self) -> pd.Series:
+        """Finqual eps with the corrected estimates, see `StockData.fq_eps`"""
+        return pd.Series(
+            self.eps_values, pd.DatetimeIndex(self.eps_dates, copy=False), copy=False
+        )
+
+    @property
+    def yahoo_eps(self) -> pd.Series:
+        """Eps reported by yahoo"""
+        return pd.Series(
+            self.yahoo_eps_values,
+            pd.DatetimeIndex(self.yahoo_eps_dates, copy=False),
+            copy=False,
+        )
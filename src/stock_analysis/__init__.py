@@ -1,3 +1,33 @@
-from .analysis import make_stock_analysis
+# the submodules are imported on first access, so that e.g. the compute-only
+# api does not import matplotlib
+_EXPORTS = {
+    "make_stock_analysis": ".analysis",
+    "render_stock_analysis": ".analysis",
+    "compute_stock_analysis": ".compute",
+    "AnalysisResult": ".compute",
+    "make_stock_analyses": ".batch",
+    "AnalysisSummary": ".batch",
+    "timing_report": ".batch",
+    "screen_stocks": ".screener",
+    "export_screen": ".screener",
+    "backtest_fair_value": ".backtest",
+    "fair_value_matrix": ".backtest",
+    "compare_relative": ".compare",
+    "relative_performance": ".compare",
+    "export_report": ".export",
+    "compare_peers": ".peers",
+    "PeerComparison": ".peers",
+    "Valuation": ".valuation",
+    "register_valuation_model": ".valuation",
+}
 
-__all__ = ["make_stock_analysis"]
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    module = importlib.import_module(_EXPORTS[name], __name__)
+    return getattr(module, name)
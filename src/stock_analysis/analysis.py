@@ -1,62 +1,57 @@
-from scipy.stats import linregress
+from contextlib import ExitStack
+from typing import Callable
+import matplotlib
 from matplotlib.axes import Axes
 import numpy as np
 import pandas as pd
 from .PlotManager import PlotManager
-from .StockData import StockData
-from scipy.interpolate import pchip_interpolate
+from .DataCache import DataCache
+from .DataProvider import DataProvider
+from .compute import AnalysisResult, GrowthPhase, compute_stock_analysis
+from .ResultCache import (
+    ResultCache,
+    input_hash,
+    input_hash_path,
+    is_current,
+    write_input_hash,
+)
+from .timing import TimingRecorder, profiled, span, timing_hook
+from .valuation import Valuation
+from pathlib import Path
 
 
-def _mean_annual_growth(series: pd.Series) -> tuple[np.ndarray, float]:
-    """Computes an anual growth regression
-
-    Args:
-        series (pd.Series): Series with DatetimeIndex
-
-    Returns:
-        tuple[np.ndarray, float]: (regression line values, anual growth in percent)
-    """
-    x = np.arange(len(series))
-    y = np.log(series.values)
-    slope, intercept, r, p, se = linregress(x, y)
-    y_fit = np.exp(intercept + slope * x)
-    anual_growth = (
-        slope
-        * 100
-        * len(series)
-        * (pd.Timedelta(days=365) / (series.index[-1] - series.index[0]))
-    )
-    return (y_fit, anual_growth)
-
-
-def _add_piecewise_annual_growth_regression(
-    series: pd.Series, ax: Axes, phaselength: int
+def _add_growth_phases(
+    plot_manager: PlotManager,
+    ax: Axes,
+    phases: list[GrowthPhase],
+    text_y: float,
+    spans: bool = False,
 ) -> None:
-    """Add piecewise annual growth regression lines
+    """Add annual growth regression lines of the phases
 
     Args:
-        series (pd.Series): series with datetimeindex, one datapoint per year
+        plot_manager (PlotManager): plot manager drawing the lines
         ax (Axes): axes to print on
-        phaselength (int): length of phases in years
+        phases (list[GrowthPhase]): growth phases to draw
+        text_y (float): y position of the growth labels
+        spans (bool): shade the phases in the background
     """
-    series = series[series > 0]
-    iphases = list(range(len(series), 0, -phaselength))
-    iphases.sort()
-    if iphases[0] != 0:
-        iphases.insert(0, 0)
-    for i, istart_index in enumerate(iphases[0:-1]):
-        # get subseries, makes only sense if subseries is longer than one
-        subseries = series.iloc[istart_index : iphases[i + 1]]
-        if len(subseries) < 2:
-            continue
-        # compute mean average growth
-        y_fit, growth = _mean_annual_growth(subseries)
-        ax.plot(subseries.index, y_fit, color="red", linestyle="--", linewidth=1.2)
-        mid_date = subseries.index[len(subseries) // 2]
+    colors = ["#f4cccc", "#d9ead3", "#cfe2f3"]
+    for i, phase in enumerate(phases):
+        if spans:
+            ax.axvspan(
+                phase.start, phase.end, color=colors[i % len(colors)], alpha=0.25
+            )
+
+        # Regression line
+        plot_manager.plot_series(
+            ax, phase.fit, color="red", linestyle="--", linewidth=1.2
+        )
+
         ax.text(
-            mid_date,
-            series.max(),
-            f"{growth:.2f}%/yr",
+            phase.mid,
+            text_y,
+            f"{phase.growth:.2f}%/yr",
             ha="center",
             va="top",
             fontsize=9,
@@ -65,211 +60,370 @@ def _add_piecewise_annual_growth_regression(
         )
 
 
-def make_stock_analysis(symbol: str, show_figures: bool, save_to_pdf: bool) -> None:
-    """Main function for creating the stock analysis report for a given stock symbol
-
-    Args:
-        symbol (str): stock symbol
-        show_figures (bool): open matplotlib figures
-        save_to_pdf (bool): save figures to report pdf
-    """
-    print(f"Starting Analysis for {symbol} ...")
-
-    plot_manager = PlotManager(2, 2)
-    stock = StockData(symbol)
-
-    # --- 20-Year Chart with Phases ---
-    chartHistory = stock.history_20y.dropna()
-    n = len(chartHistory)
-    split_points = [n // 3, 2 * n // 3]
-    phases = [
-        chartHistory.iloc[: split_points[0]],
-        chartHistory.iloc[split_points[0] : split_points[1]],
-        chartHistory.iloc[split_points[1] :],
-    ]
-
-    ax = plot_manager.next_axis("Logarithmic Chart with Growth Phases", full=True)
-    ax.plot(
-        chartHistory, color="black", linewidth=1, label=f"{symbol} Closing Price (20y)"
+def _plot_price_phases(
+    plot_manager: PlotManager, ax: Axes, result: AnalysisResult
+) -> None:
+    plot_manager.plot_series(
+        ax,
+        result.history,
+        color="black",
+        linewidth=1,
+        label=f"{result.symbol} Closing Price (20y)",
     )
     ax.set_yscale("log")
     ax.set_xlabel("Date")
     ax.set_ylabel("Price (log scale)")
     ax.grid(True, which="both", ls="--", alpha=0.6)
+    _add_growth_phases(
+        plot_manager, ax, result.price_phases, result.history.max(), spans=True
+    )
 
-    colors = ["#f4cccc", "#d9ead3", "#cfe2f3"]
-    for i, phase in enumerate(phases):
-        ax.axvspan(phase.index[0], phase.index[-1], color=colors[i], alpha=0.25)
-
-        # Regression line
-        y_fit, anual_growth = _mean_annual_growth(phase)
-        ax.plot(phase.index, y_fit, color="red", linestyle="--", linewidth=1.2)
 
-        mid_date = phase.index[len(phase) // 2]
-        ax.text(
-            mid_date,
-            chartHistory.max(),
-            f"{anual_growth:.2f}%/yr",
-            ha="center",
-            va="top",
-            fontsize=9,
-            fontweight="bold",
-            bbox=dict(facecolor="white", alpha=0.7, edgecolor="none"),
+def _plot_rainbow_ema(
+    plot_manager: PlotManager, ax: Axes, result: AnalysisResult
+) -> None:
+    plot_manager.plot_series(
+        ax, result.history, color="black", linewidth=1, label=result.symbol
+    )
+    spans = result.rainbow_ema.columns
+    if len(spans):
+        plot_manager.plot_lines(
+            ax,
+            result.rainbow_ema,
+            linewidth=0.8,
+            label=f"{spans[0]} - {spans[-1]}",
         )
+    ax.set_yscale("log")
+    ax.set_ylabel("Price (log scale)")
+    ax.grid(True, which="both", ls="--", alpha=0.6)
 
-    # --- KGV ---
-    KGV = (
-        chartHistory.array[-1]
-        / stock.fq_eps.truncate(before=chartHistory.index[-1]).array[0]
-    )
-    KGVe = (
-        chartHistory.array[-1]
-        / stock.fq_eps.truncate(after=chartHistory.index[-1]).array[-1]
-    )
 
-    oldestValidKGVDate = stock.fq_eps.index[-1] - pd.Timedelta(days=365)
-    liveKGV = pd.Series(np.nan, chartHistory.truncate(before=oldestValidKGVDate).index)
-    for earningsDate in stock.fq_eps.index:
-        earlierDates = liveKGV.truncate(after=earningsDate.date()).index
-        liveKGV[earlierDates] = chartHistory[earlierDates] / stock.fq_eps[earningsDate]
-    liveKGVBounded = liveKGV.clip(lower=0)
-
-    ax = plot_manager.next_axis(f"KGV: {KGV:.1f}, KGVe: {KGVe:.1f}")
-    ax.plot(liveKGV, label="live KGVe")
-    ax.plot(liveKGVBounded, "--", label="bounded")
-    for date in stock.fq_eps.index:
+def _plot_rolling_growth(
+    plot_manager: PlotManager, ax: Axes, result: AnalysisResult
+) -> None:
+    for window, growth in result.rolling_growth.items():
+        plot_manager.plot_series(ax, growth, linewidth=1, label=window)
+    ax.axhline(0, c="k", lw=0.8)
+    ax.set_ylabel("Annual growth (%)")
+
+
+def _plot_live_kgv(plot_manager: PlotManager, ax: Axes, result: AnalysisResult) -> None:
+    plot_manager.plot_series(ax, result.live_kgv, label="live KGVe")
+    plot_manager.plot_series(ax, result.live_kgv_bounded, "--", label="bounded")
+    for date in result.eps.index:
         ax.axvline(date, ls="--", c="k")
 
-    # --- KCVe ---
-    # oldestValidKCVDate = stock.cash_flow_per_share.index[0] - pd.Timedelta(days=365)
-    # liveKCV = pd.Series(np.nan, chartHistory.truncate(before=oldestValidKCVDate).index)
-    # for date in stock.cash_flow_per_share.index[::-1]:
-    #     earlierDates = liveKCV.truncate(after=date.date()).index
-    #     liveKCV[earlierDates] = chartHistory[earlierDates] / stock.cash_flow_per_share[date]
-
-    # ax = plot_manager.next_axis(f"KCVe: {liveKCV.values[-1]:.1f}")
-    # ax.plot(liveKCV)
-    # for date in stock.cash_flow_per_share.index:
-    #     ax.axvline(date, ls="--", c="k")
-
-    # --- Fair Value ---
-    movingAverageTime = pd.Timedelta(days=365 * 3)
-    fairValue_value = []
-    for earningsDate in stock.fq_eps.index:
-        averagingStartDate = earningsDate - movingAverageTime
-        meanKGV = liveKGVBounded.truncate(
-            before=averagingStartDate, after=earningsDate
-        ).array.mean()
-        fairValue_value.append(meanKGV * stock.fq_eps[earningsDate])
-    fairValue = pd.Series(fairValue_value, stock.fq_eps.index)
-    fairValue = fairValue.iloc[::-1].copy()  # make it ascending order
-
-    fairValueDateFine = np.linspace(
-        fairValue.index.values[0].astype("float"),
-        fairValue.index.values[-1].astype("float"),
-        1000,
-    )
-    fairValueFine = pchip_interpolate(
-        fairValue.index.values.astype("float"), fairValue.array, fairValueDateFine
-    )
 
-    ax = plot_manager.next_axis("Fair value (KGV)", full=True)
-    ax.plot(chartHistory, label="Kurs")
+def _plot_fair_value(
+    plot_manager: PlotManager, ax: Axes, history: pd.Series, valuation: Valuation
+) -> None:
+    fairValue = valuation.fair_value
+    fairValueFine = valuation.fair_value_fine
+    plot_manager.plot_series(ax, history, label="Kurs")
     ax.plot(
         fairValue.index, fairValue.array, ls="", marker="x", label="Fair value", c="k"
     )
-    ax.plot(pd.to_datetime(fairValueDateFine), fairValueFine, c="k")
-    ax.plot(pd.to_datetime(fairValueDateFine), 1.2 * fairValueFine, label="+20%", c="r")
-    ax.plot(pd.to_datetime(fairValueDateFine), 0.8 * fairValueFine, label="-20%", c="g")
+    plot_manager.plot_series(ax, fairValueFine, c="k")
+    plot_manager.plot_series(ax, 1.2 * fairValueFine, label="+20%", c="r")
+    plot_manager.plot_series(ax, 0.8 * fairValueFine, label="-20%", c="g")
     ax.set_xlim(fairValue.index[0], fairValue.index[-1])
     ax.set_yscale("log")  # ← this line makes the y-axis logarithmic
     ax.grid(True, which="both", ls="--", lw=0.5)
 
-    ## --- logarithmic revenue
-    ax = plot_manager.next_axis("Total Revenue")
-    ax.bar(
-        stock.fq_income_df.index,
-        stock.fq_income_df["Total Revenue"].array,
-        width=pd.Timedelta(weeks=12),
-    )
-    _add_piecewise_annual_growth_regression(
-        stock.fq_income_df["Total Revenue"][::-1], ax, 5
-    )
-    ax.set_yscale("log")  # ← this line makes the y-axis logarithmic
-    ax.grid(True, which="both", ls="--", lw=0.5)
 
-    ## --- logarithmic income
-    ax = plot_manager.next_axis("Net Income")
-    ax.bar(
-        stock.fq_income_df.index,
-        stock.fq_income_df["Net Income"].array,
-        width=pd.Timedelta(weeks=12),
-    )
-    _add_piecewise_annual_growth_regression(
-        stock.fq_income_df["Net Income"][::-1], ax, 5
-    )
+def _fair_value_chart(
+    name: str,
+) -> Callable[[PlotManager, Axes, AnalysisResult], None]:
+    """Chart function of the fair value of one valuation model"""
+
+    def plot(plot_manager: PlotManager, ax: Axes, result: AnalysisResult) -> None:
+        _plot_fair_value(plot_manager, ax, result.history, result.valuations[name])
+
+    plot.__name__ = f"_plot_fair_value_{name.lower()}"
+    return plot
+
+
+def _plot_annual_bars(
+    plot_manager: PlotManager,
+    ax: Axes,
+    series: pd.Series,
+    phases: list[GrowthPhase] | None = None,
+    **kwargs,
+) -> None:
+    """Bar chart of annual values, with growth phases on a logarithmic axis"""
+    ax.bar(series.index, series.array, width=pd.Timedelta(weeks=12), **kwargs)
+    if phases is None:
+        return
+    _add_growth_phases(plot_manager, ax, phases, series[series > 0].max())
     ax.set_yscale("log")  # ← this line makes the y-axis logarithmic
     ax.grid(True, which="both", ls="--", lw=0.5)
 
-    # --- shares ---
-    ax = plot_manager.next_axis("Number of shares")
-    ax.bar(
-        stock.fq_balance_df.index,
-        stock.fq_balance_df["Shares Outstanding"].array,
-        width=pd.Timedelta(weeks=12),
-        label="finqual",
-    )
 
-    # --- Cashflow ---
-    ax = plot_manager.next_axis("Cashflow")
-    ax.bar(
-        stock.fq_cashflow_df.index,
-        stock.fq_cashflow_df["Operating Cash Flow"].array,
-        width=pd.Timedelta(weeks=12),
+def _plot_revenue(plot_manager: PlotManager, ax: Axes, result: AnalysisResult) -> None:
+    _plot_annual_bars(plot_manager, ax, result.revenue, result.revenue_phases)
+
+
+def _plot_net_income(
+    plot_manager: PlotManager, ax: Axes, result: AnalysisResult
+) -> None:
+    _plot_annual_bars(plot_manager, ax, result.net_income, result.net_income_phases)
+
+
+def _plot_shares(plot_manager: PlotManager, ax: Axes, result: AnalysisResult) -> None:
+    _plot_annual_bars(plot_manager, ax, result.shares, label="finqual")
+
+
+def _plot_cash_flow(
+    plot_manager: PlotManager, ax: Axes, result: AnalysisResult
+) -> None:
+    _plot_annual_bars(
+        plot_manager, ax, result.operating_cash_flow, result.cash_flow_phases
     )
-    # add mean average growth for phases
-    series = stock.fq_cashflow_df["Operating Cash Flow"][::-1]
-    _add_piecewise_annual_growth_regression(series, ax, 5)
-    ax.set_yscale("log")  # ← this line makes the y-axis logarithmic
-    ax.grid(True, which="both", ls="--", lw=0.5)
 
-    # --- Corrected EPS
-    ax = plot_manager.next_axis("EPS Correction")
+
+def _plot_eps_correction(
+    plot_manager: PlotManager, ax: Axes, result: AnalysisResult
+) -> None:
     ax.bar(
-        stock.fq_eps.index,
-        stock.fq_eps.array,
+        result.eps.index,
+        result.eps.array,
         width=pd.Timedelta(weeks=12),
         label="finqual+corrected estimates",
     )
     ax.bar(
-        stock.income_statement["asOfDate"],
-        stock.income_statement["BasicEPS"],
+        result.yahoo_eps.index,
+        result.yahoo_eps.array,
         width=pd.Timedelta(weeks=8),
         label="yahoo eps",
     )
     ax.bar(
-        pd.Timestamp(stock.yh_current_year_estimates["endDate"]),
-        stock.yh_current_year_estimates["earningsEstimate"]["avg"],
+        pd.Timestamp(result.current_year_estimate["endDate"]),
+        result.current_year_estimate["earningsEstimate"]["avg"],
         width=pd.Timedelta(weeks=8),
         label="Estimate +0y",
     )
     ax.bar(
-        pd.Timestamp(stock.yh_next_year_estimates["endDate"]),
-        stock.yh_next_year_estimates["earningsEstimate"]["avg"],
+        pd.Timestamp(result.next_year_estimate["endDate"]),
+        result.next_year_estimate["earningsEstimate"]["avg"],
         width=pd.Timedelta(weeks=8),
         label="Estimate +1y",
     )
     ax.bar(
-        stock.income_statement["asOfDate"].iloc[-1],
-        stock.yh_current_year_estimates["earningsEstimate"]["yearAgoEps"],
+        result.yahoo_eps.index[-1],
+        result.current_year_estimate["earningsEstimate"]["yearAgoEps"],
         width=pd.Timedelta(weeks=4),
         label="Estimate -1y",
     )
 
+
+def _plot_peers(plot_manager: PlotManager, ax: Axes, result: AnalysisResult) -> None:
+    comparison = result.peers
+    peers = comparison.peers
+    for i, figure in enumerate(comparison.figures.columns):
+        values = peers[figure].dropna()
+        if values.empty:
+            continue
+        q25, median, q75 = values.quantile([0.25, 0.5, 0.75])
+        first = i == 0
+        ax.hlines(
+            i,
+            q25,
+            q75,
+            color="tab:blue",
+            linewidth=8,
+            alpha=0.4,
+            label="Peers 25-75%" if first else None,
+        )
+        ax.plot(median, i, "|", c="k", markersize=14, label="Median" if first else None)
+        ax.plot(
+            values.array,
+            np.full(len(values), i),
+            "o",
+            c="grey",
+            markersize=3,
+            label="Peers" if first else None,
+        )
+    y = np.arange(len(comparison.figures.columns))
+    ax.plot(
+        comparison.figures.loc[result.symbol].array, y, "D", c="r", label=result.symbol
+    )
+    ax.set_yticks(y, comparison.figures.columns)
+    ax.invert_yaxis()
+    # KGVs of companies with little earnings would squeeze all other figures
+    ax.set_xscale("symlog", linthresh=10)
+    ax.set_xlabel("KGV, price to fair value, growth and margins in %")
+
+
+def _charts(
+    result: AnalysisResult,
+) -> list[tuple[str, bool, Callable[[PlotManager, Axes, AnalysisResult], None]]]:
+    """All charts of the report in order, as (title, full size, plot function)"""
+    charts = [
+        ("Logarithmic Chart with Growth Phases", True, _plot_price_phases),
+        ("Rainbow EMA", True, _plot_rainbow_ema),
+        (f"KGV: {result.kgv:.1f}, KGVe: {result.kgve:.1f}", False, _plot_live_kgv),
+        ("Rolling annual growth (CAGR)", False, _plot_rolling_growth),
+    ]
+    # one fair value chart per valuation model, KGV first
+    charts += [
+        (f"Fair value ({name})", True, _fair_value_chart(name))
+        for name in result.valuations
+    ]
+    charts += [
+        ("Total Revenue", False, _plot_revenue),
+        ("Net Income", False, _plot_net_income),
+        ("Number of shares", False, _plot_shares),
+        ("Cashflow", False, _plot_cash_flow),
+        ("EPS Correction", False, _plot_eps_correction),
+    ]
+    if result.peers is not None and len(result.peers.peers):
+        peers = result.peers.peers.index
+        title = f"Peers: {', '.join(peers[:8])}{' ...' if len(peers) > 8 else ''}"
+        charts.append((title, True, _plot_peers))
+    return charts
+
+
+def render_stock_analysis(result: AnalysisResult, plot_manager: PlotManager) -> None:
+    """Draw all charts of a computed stock analysis
+
+    Args:
+        result (AnalysisResult): computed stock analysis
+        plot_manager (PlotManager): plot manager to draw into
+    """
+    for title, full, plot in _charts(result):
+        ax = plot_manager.next_axis(title, full=full)
+        with span(f"render.{plot.__name__.removeprefix('_plot_')}"):
+            plot(plot_manager, ax, result)
+
+
+def report_input_hash(result: AnalysisResult, max_points: int | None) -> str:
+    """Hash of everything the report pdf of an analysis is rendered from"""
+    peers = result.peers.figures if result.peers is not None else None
+    return input_hash(result.inputs_hash, peers, max_points, matplotlib.__version__)
+
+
+def make_stock_analysis(
+    symbol: str,
+    show_figures: bool,
+    save_to_pdf: bool,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    output_dir: str | Path = "generated_pdf",
+    max_points: int | None = None,
+    timings_dir: str | Path | None = None,
+    profile_dir: str | Path | None = None,
+    provider: DataProvider | None = None,
+    peers: int = 0,
+    result_cache: ResultCache | None = None,
+) -> Path | None:
+    """Main function for creating the stock analysis report for a given stock symbol
+
+    The fetch, compute and render stages are timed in spans, see
+    `stock_analysis.timing` for hooks receiving them.
+
+    The input hash of a saved report is written next to it ("<symbol>.pdf.inputs").
+    If the report pdf already exists with the same hash, i.e. the data, the
+    options and the code are unchanged, rendering is skipped. Showing the
+    figures or `refresh` always renders.
+
+    Args:
+        symbol (str): stock symbol
+        show_figures (bool): open matplotlib figures
+        save_to_pdf (bool): save figures to report pdf
+        refresh (bool): ignore cached stock data and fetch everything again
+        cache (DataCache | None): cache for the stock data, None uses the default cache
+        output_dir (str | Path): folder of the report pdf
+        max_points (int | None): decimate the plotted time series to about this
+            many points, None draws all points
+        timings_dir (str | Path | None): write the timing spans to
+            "<timings_dir>/<symbol>.jsonl"
+        profile_dir (str | Path | None): run the analysis under cProfile and
+            dump the stats to "<profile_dir>/<symbol>.prof"
+        provider (DataProvider | None): source of the stock data, None fetches
+            live data
+        peers (int): add a comparison with up to this many comparable companies
+        result_cache (ResultCache | None): load the analysis stages with
+            unchanged inputs from this cache, see `compute_stock_analysis`
+
+    Returns:
+        Path | None: path of the report pdf, if saved
+    """
+    with ExitStack() as stack:
+        if timings_dir is not None:
+            recorder = stack.enter_context(timing_hook(TimingRecorder()))
+        if profile_dir is not None:
+            stack.enter_context(profiled(Path(profile_dir) / f"{symbol}.prof"))
+        with span("analysis", symbol=symbol):
+            filename = _make_stock_analysis(
+                symbol,
+                show_figures,
+                save_to_pdf,
+                refresh,
+                cache,
+                output_dir,
+                max_points,
+                provider,
+                peers,
+                result_cache,
+            )
+    if timings_dir is not None:
+        recorder.write_jsonl(Path(timings_dir) / f"{symbol}.jsonl")
+    return filename
+
+
+def _make_stock_analysis(
+    symbol: str,
+    show_figures: bool,
+    save_to_pdf: bool,
+    refresh: bool,
+    cache: DataCache | None,
+    output_dir: str | Path,
+    max_points: int | None,
+    provider: DataProvider | None,
+    peers: int = 0,
+    result_cache: ResultCache | None = None,
+) -> Path | None:
+    """Fetch, compute and render the report, see `make_stock_analysis`"""
+    print(f"Starting Analysis for {symbol} ...")
+
+    result = compute_stock_analysis(
+        symbol,
+        refresh=refresh,
+        cache=cache,
+        provider=provider,
+        peers=peers,
+        result_cache=result_cache,
+    )
+
     if save_to_pdf:
-        filename = f"generated_pdf/{stock.symbol}.pdf"
+        filename = Path(output_dir) / f"{result.symbol}.pdf"
+        report_hash = report_input_hash(result, max_points)
+        if not (show_figures or refresh) and is_current(filename, report_hash):
+            print(f"Report {filename} is up to date, skipping rendering")
+            print(f"Starting Analysis for {symbol} ... done")
+            return filename
+        # a report which fails while rendering has no valid hash
+        input_hash_path(filename).unlink(missing_ok=True)
     else:
         filename = None
 
-    plot_manager.finalize(show=show_figures, filename=filename)
+    with span("render"):
+        if show_figures:
+            plot_manager = PlotManager(2, 2, max_points=max_points)
+        else:
+            # nothing to show, write each page as soon as it is complete
+            plot_manager = PlotManager(2, 2, filename=filename, max_points=max_points)
+        try:
+            render_stock_analysis(result, plot_manager)
+            plot_manager.finalize(show=show_figures, filename=filename)
+        except BaseException:
+            # no figures left open in a batch worker and no truncated pdf
+            plot_manager.discard()
+            if filename is not None:
+                filename.unlink(missing_ok=True)
+            raise
+    if filename is not None:
+        write_input_hash(filename, report_hash)
+
     print(f"Starting Analysis for {symbol} ... done")
+    return filename
@@ -0,0 +1,238 @@
+###########################
+# backtest of the fair value bands on many symbols at once
+###########################
+from itertools import product
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from .compute import AnalysisResult
+
+# time from the end of a fiscal year until its figures are published
+PUBLICATION_LAG = pd.Timedelta(days=75)
+
+# combinations x bars x symbols per simulated chunk, bounds the memory use
+CHUNK_ELEMENTS = 2**21
+
+BACKTEST_COLUMNS = [
+    "total_return",
+    "buy_and_hold",
+    "max_drawdown",
+    "trades",
+    "hit_rate",
+    "exposure",
+]
+
+
+def fair_value_matrix(
+    results: list[AnalysisResult],
+    model: str = "KGV",
+    publication_lag: pd.Timedelta = PUBLICATION_LAG,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Closes and point-in-time fair values of many analyses, dates x symbols
+
+    The fair value of a report date is based on the figures of the fiscal year
+    ending at that date, which are only published some weeks later. So it is
+    only used from the report date plus `publication_lag` on, until the next
+    one is published. The fair values of the eps estimates are left out, as
+    is the interpolated fair value curve of the chart, which passes through
+    later report dates. Both would look into the future.
+
+    Args:
+        results (list[AnalysisResult]): computed analyses
+        model (str): valuation model of the fair value, e.g. "KGV"
+        publication_lag (pd.Timedelta): time from a report date until its
+            figures are public
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: closes and fair values on the union of
+            all trading days, one column per symbol. NaN before a symbol has a
+            close or a fair value.
+    """
+    closes = pd.concat(
+        {result.symbol: result.history for result in results}, axis=1, sort=True
+    )
+    fair_values = {}
+    for result in results:
+        fair_value = result.valuations[model].fair_value.dropna()
+        fair_value = fair_value[~fair_value.index.duplicated(keep="last")]
+        fair_value = fair_value.drop(_estimate_dates(result), errors="ignore")
+        fair_value.index = fair_value.index + publication_lag
+        fair_values[result.symbol] = (
+            fair_value.reindex(closes.index.union(fair_value.index))
+            .ffill()
+            .reindex(closes.index)
+        )
+    return closes, pd.DataFrame(fair_values, closes.index)
+
+
+def _estimate_dates(result: AnalysisResult) -> pd.DatetimeIndex:
+    """Report dates of the yahoo eps estimates, which have no reported figures"""
+    dates = pd.DatetimeIndex(
+        [
+            estimate["endDate"]
+            for estimate in [result.current_year_estimate, result.next_year_estimate]
+            if estimate and estimate.get("endDate")
+        ]
+    )
+    return dates.difference(result.net_income.index)
+
+
+def backtest_fair_value(
+    closes: pd.DataFrame,
+    fair_values: pd.DataFrame,
+    entries: Sequence[float] = (-0.2,),
+    exits: Sequence[float] = (0.2,),
+    max_holds: Sequence[int | None] = (None,),
+) -> pd.DataFrame:
+    """Backtest buying below and selling above the fair value bands
+
+    A position is opened at the close when the price falls below
+    (1 + entry) * fair value, and closed at the close when the price rises above
+    (1 + exit) * fair value, or when it was held for `max_hold` bars. A closed
+    position is only opened again when the price falls below the entry band
+    again, a new entry signal during a position renews its holding period.
+
+    All threshold combinations and symbols are simulated together on
+    (combinations, bars, symbols) arrays: the position follows from the last
+    entry or exit signal, found with a running maximum of the signal bars, and
+    the holding period from the bars since the last entry.
+
+    Args:
+        closes (pd.DataFrame): closes, dates x symbols, see `fair_value_matrix`
+        fair_values (pd.DataFrame): fair values with the same index and columns
+        entries (Sequence[float]): entry bands relative to the fair value,
+            e.g. -0.2 buys below 80% of the fair value
+        exits (Sequence[float]): exit bands relative to the fair value, e.g.
+            0.2 sells above 120% of the fair value
+        max_holds (Sequence[int | None]): maximum holding periods in bars,
+            None holds until the exit band is reached
+
+    Returns:
+        pd.DataFrame: one row per combination and symbol, with the index levels
+            "entry", "exit", "max_hold" (inf for no limit) and "symbol". Returns
+            and drawdowns are in percent: the total return of the strategy and
+            of buying and holding, the maximum drawdown of the strategy, the
+            number of trades (an open position counts as trade), the share of
+            trades with a gain and the share of trading days with a position.
+            Combinations with entry >= exit are skipped. Compare combinations e.g.
+            with `result.groupby(level=["entry", "exit", "max_hold"]).median()`.
+    """
+    fair_values = fair_values.reindex(index=closes.index, columns=closes.columns)
+    close = closes.to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = close / fair_values.to_numpy(dtype=float)
+        log_returns = np.diff(np.log(close), axis=0, prepend=np.nan)
+    log_returns[~np.isfinite(log_returns)] = 0.0
+    valid = np.isfinite(close)
+
+    combinations = [
+        (entry, exit, np.inf if max_hold is None else max_hold)
+        for entry, exit, max_hold in product(entries, exits, max_holds)
+        if entry < exit
+    ]
+    index = pd.MultiIndex.from_tuples(
+        [(*combination, symbol) for combination in combinations for symbol in closes],
+        names=["entry", "exit", "max_hold", "symbol"],
+    )
+    if not combinations or close.size == 0:
+        return pd.DataFrame(index=index, columns=BACKTEST_COLUMNS, dtype=float)
+
+    # the last entry and exit signals at each bar only depend on one band each
+    with np.errstate(invalid="ignore"):  # NaN ratios (no fair value) give no signals
+        last_entry = {}
+        for band in dict.fromkeys(entry for entry, _, _ in combinations):
+            below = ratio < 1 + band
+            below[1:] &= ~below[:-1]
+            last_entry[band] = _last_signal(below)
+        last_exit = {
+            band: _last_signal(ratio > 1 + band)
+            for band in dict.fromkeys(exit for _, exit, _ in combinations)
+        }
+    cum_returns = np.cumsum(log_returns, axis=0)
+    t = np.arange(len(close), dtype=np.int32)[None, :, None]
+
+    chunk = max(1, CHUNK_ELEMENTS // close.size)
+    metrics = []
+    for start in range(0, len(combinations), chunk):
+        entry_bands, exit_bands, max_hold = zip(*combinations[start : start + chunk])
+        entered = np.stack([last_entry[band] for band in entry_bands])
+        # hysteresis: invested if the last signal was an entry, both never coincide
+        position = entered > np.stack([last_exit[band] for band in exit_bands])
+        # holding rule: bars since the last entry signal
+        position &= t - entered < np.array(max_hold)[:, None, None]
+        metrics.append(_evaluate(position, log_returns, cum_returns, valid))
+    stacked = {
+        name: np.concatenate([m[name] for m in metrics]).ravel()
+        for name in BACKTEST_COLUMNS
+    }
+    return pd.DataFrame(stacked, index)
+
+
+def _last_signal(signal: np.ndarray) -> np.ndarray:
+    """Bar of the last signal at or before each bar, -1 before the first one"""
+    t = np.arange(len(signal), dtype=np.int32)[:, None]
+    return np.maximum.accumulate(np.where(signal, t, -1), axis=0)
+
+
+def _evaluate(
+    position: np.ndarray,
+    log_returns: np.ndarray,
+    cum_returns: np.ndarray,
+    valid: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """Metrics of simulated positions, see `backtest_fair_value`
+
+    Args:
+        position (np.ndarray): invested at the close of a bar, shape
+            (combinations, bars, symbols)
+        log_returns (np.ndarray): log returns to each bar, 0 where unknown,
+            shape (bars, symbols)
+        cum_returns (np.ndarray): cumulative sum of `log_returns`
+        valid (np.ndarray): bars with a close
+
+    Returns:
+        dict[str, np.ndarray]: the metrics of `BACKTEST_COLUMNS`, shape
+            (combinations, symbols)
+    """
+    n_combinations, n, n_symbols = position.shape
+    # a position at the close of a bar earns the return to the next bar
+    log_equity = np.zeros(position.shape)
+    np.multiply(position[:, :-1], log_returns[None, 1:], out=log_equity[:, 1:])
+    np.cumsum(log_equity, axis=1, out=log_equity)
+    drawdown = np.maximum.accumulate(log_equity, axis=1)
+    drawdown -= log_equity
+
+    # trades: from an opening bar to the closing bar, or to the last bar. Trades
+    # do not overlap, so the opening and closing bars sorted by combination,
+    # symbol and bar pair up.
+    change = np.zeros_like(position)
+    change[:, 1:] = position[:, 1:] != position[:, :-1]
+    change[:, 0] = position[:, 0]
+    # the last bar closes a held trade, a trade opened on it has no bars
+    change[:, -1] = position[:, -2] if n > 1 else False
+    ic, it, isymbol = np.nonzero(change)
+    order = np.lexsort((it, isymbol, ic))
+    ic, it, isymbol = ic[order], it[order], isymbol[order]
+    trade_return = (
+        cum_returns[it[1::2], isymbol[1::2]] - cum_returns[it[0::2], isymbol[0::2]]
+    )
+    trade_at = ic[0::2] * n_symbols + isymbol[0::2]
+    size = n_combinations * n_symbols
+    trades = np.bincount(trade_at, minlength=size).reshape(-1, n_symbols)
+    wins = np.bincount(trade_at, trade_return > 0, minlength=size)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "total_return": np.expm1(log_equity[:, -1]) * 100,
+            "buy_and_hold": np.broadcast_to(
+                np.expm1(cum_returns[-1]) * 100, trades.shape
+            ),
+            "max_drawdown": np.expm1(-drawdown.max(axis=1)) * 100,
+            "trades": trades.astype(float),
+            "hit_rate": np.where(
+                trades > 0, wins.reshape(trades.shape) / trades, np.nan
+            ),
+            "exposure": (position & valid).sum(axis=1) / valid.sum(axis=0),
+        }
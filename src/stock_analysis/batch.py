@@ -0,0 +1,403 @@
+###########################
+# batch analysis of a whole watchlist
+###########################
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from .DataCache import DataCache
+from .DataProvider import DataProvider, LiveProvider, close_history
+from .FetchScheduler import default_scheduler, share_default_scheduler
+from .ResultCache import ResultCache
+from .StockData import (
+    HISTORY_WINDOW,
+    HISTORY_YEARS,
+    history_update_start,
+    merge_history,
+)
+from .timing import TimingRecorder, timing_hook
+
+# plotted points per time series in batch reports, no visible difference on a page
+DEFAULT_MAX_POINTS = 2000
+
+
+@dataclass
+class AnalysisSummary:
+    """Outcome of the analysis of one symbol in a batch run"""
+
+    symbol: str
+    status: str  # "ok" or "failed"
+    duration: float  # seconds
+    output: Path | None = None
+    error: str | None = None
+    timings: dict[str, float] = field(default_factory=dict)  # seconds per span name
+    # requests, retries, deduplicated and failed requests of the fetch scheduler
+    fetches: dict[str, int] = field(default_factory=dict)
+
+
+def make_stock_analyses(
+    symbols: list[str],
+    workers: int | None = None,
+    save_to_pdf: bool = True,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    output_dir: str | Path = "generated_pdf",
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    timings_dir: str | Path | None = None,
+    profile_dir: str | Path | None = None,
+    provider: DataProvider | None = None,
+    peers: int = 0,
+    result_cache: ResultCache | None = None,
+) -> list[AnalysisSummary]:
+    """Create the stock analysis reports for a list of symbols
+
+    With live data, the yahoo data of all symbols is fetched with a few batched
+    requests into the cache first, then the symbols are analysed on a process pool. A failing
+    symbol is reported in its summary and does not stop the others.
+
+    Args:
+        symbols (list[str]): stock symbols
+        workers (int | None): number of worker processes, None uses all cores
+        save_to_pdf (bool): save figures to report pdfs
+        refresh (bool): ignore cached stock data and fetch everything again
+        cache (DataCache | None): cache for the stock data, None uses the default cache
+        output_dir (str | Path): folder of the report pdfs
+        max_points (int | None): decimate the plotted time series to about this
+            many points, None draws all points
+        timings_dir (str | Path | None): write the timing spans of every symbol
+            to "<timings_dir>/<symbol>.jsonl"
+        profile_dir (str | Path | None): profile every analysis with cProfile and
+            dump the stats to "<profile_dir>/<symbol>.prof"
+        provider (DataProvider | None): source of the stock data, None fetches
+            live data
+        peers (int): add a comparison with up to this many comparable
+            companies to every report
+        result_cache (ResultCache | None): load the analysis stages with
+            unchanged inputs from this cache. Reports with unchanged inputs are
+            not rendered again anyway, see `make_stock_analysis`.
+
+    Returns:
+        list[AnalysisSummary]: one summary per symbol, in the order of `symbols`.
+            `timing_report` aggregates their stage timings, `fetch_counts`
+            their requests.
+    """
+    cache = cache if cache is not None else DataCache()
+    symbols = list(dict.fromkeys(symbols))  # drop duplicates, keep order
+
+    prefetch_stock_data(symbols, cache, refresh, provider)
+
+    summaries: dict[str, AnalysisSummary] = {}
+    workers = workers or os.cpu_count() or 1
+    # the workers share the rate limits of the live data sources
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=share_default_scheduler,
+        initargs=(workers,),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _analyse_symbol,
+                symbol,
+                save_to_pdf,
+                refresh,
+                cache,
+                output_dir,
+                max_points,
+                timings_dir,
+                profile_dir,
+                provider,
+                peers,
+                result_cache,
+            ): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:  # e.g. a crashed worker process
+                summary = AnalysisSummary(symbol, "failed", 0.0, error=repr(e))
+            summaries[symbol] = summary
+            print(f"{symbol}: {summary.status} ({summary.duration:.1f}s)")
+
+    return [summaries[symbol] for symbol in symbols]
+
+
+def prefetch_stock_data(
+    symbols: list[str],
+    cache: DataCache,
+    refresh: bool = False,
+    provider: DataProvider | None = None,
+) -> None:
+    """Fill the cache with batched yahoo requests before a run over many symbols
+
+    Only live data is prefetched. With refresh, the workers fetch everything
+    again anyway. Errors are printed, the workers then fetch whatever is missing
+    on their own.
+    """
+    if refresh or not (provider is None or isinstance(provider, LiveProvider)):
+        return
+    print(f"Prefetching yahoo data for {len(symbols)} symbols ...")
+    try:
+        prefetch_yahoo_data(symbols, cache)
+    except Exception as e:
+        print(f"Prefetching yahoo data failed: {e}")
+    print(f"Prefetching yahoo data for {len(symbols)} symbols ... done")
+
+
+def _analyse_symbol(
+    symbol: str,
+    save_to_pdf: bool,
+    refresh: bool,
+    cache: DataCache,
+    output_dir: str | Path,
+    max_points: int | None,
+    timings_dir: str | Path | None = None,
+    profile_dir: str | Path | None = None,
+    provider: DataProvider | None = None,
+    peers: int = 0,
+    result_cache: ResultCache | None = None,
+) -> AnalysisSummary:
+    """Worker: analyse one symbol and catch all errors"""
+    from .analysis import make_stock_analysis
+
+    start = time.perf_counter()
+    fetches = default_scheduler().counters()
+    with timing_hook(TimingRecorder()) as recorder:
+        try:
+            output = make_stock_analysis(
+                symbol,
+                show_figures=False,
+                save_to_pdf=save_to_pdf,
+                refresh=refresh,
+                cache=cache,
+                output_dir=output_dir,
+                max_points=max_points,
+                timings_dir=timings_dir,
+                profile_dir=profile_dir,
+                provider=provider,
+                peers=peers,
+                result_cache=result_cache,
+            )
+        except Exception as e:
+            return AnalysisSummary(
+                symbol,
+                "failed",
+                time.perf_counter() - start,
+                error=repr(e),
+                timings=recorder.totals(),
+                fetches=_fetches_since(fetches),
+            )
+    return AnalysisSummary(
+        symbol,
+        "ok",
+        time.perf_counter() - start,
+        output,
+        timings=recorder.totals(),
+        fetches=_fetches_since(fetches),
+    )
+
+
+def _fetches_since(before: dict[str, int]) -> dict[str, int]:
+    """Requests of the fetch scheduler of this process since the `before` counts"""
+    return {
+        name: count - before[name]
+        for name, count in default_scheduler().counters().items()
+    }
+
+
+def fetch_counts(summaries: list[AnalysisSummary]) -> dict[str, int]:
+    """Requests, retries, deduplicated and failed requests of a batch run
+
+    Args:
+        summaries (list[AnalysisSummary]): summaries of `make_stock_analyses`
+
+    Returns:
+        dict[str, int]: counts of the workers and of the prefetch in this process
+    """
+    counts = default_scheduler().counters()
+    for summary in summaries:
+        for name, count in summary.fetches.items():
+            counts[name] = counts.get(name, 0) + count
+    return counts
+
+
+def timing_report(summaries: list[AnalysisSummary]) -> pd.DataFrame:
+    """Aggregate the stage timings of a batch run
+
+    Spans are nested ("fetch" contains "fetch.history"), so the shares of all
+    stages add up to more than 100%.
+
+    Args:
+        summaries (list[AnalysisSummary]): summaries of `make_stock_analyses`
+
+    Returns:
+        pd.DataFrame: one row per span name, sorted by total time, with the number
+            of symbols, the total, mean, median and max seconds and the share of
+            the summed analysis durations
+    """
+    timings = pd.DataFrame({summary.symbol: summary.timings for summary in summaries}).T
+    columns = ["symbols", "total", "mean", "median", "max", "share"]
+    if timings.empty:
+        return pd.DataFrame(columns=columns)
+    report = pd.DataFrame(
+        {
+            "symbols": timings.count(),
+            "total": timings.sum(),
+            "mean": timings.mean(),
+            "median": timings.median(),
+            "max": timings.max(),
+        }
+    )
+    report["share"] = report["total"] / sum(summary.duration for summary in summaries)
+    report.index.name = "span"
+    return report.sort_values("total", ascending=False)[columns]
+
+
+def prefetch_yahoo_data(
+    symbols: list[str], cache: DataCache, refresh: bool = False
+) -> None:
+    """Fetch the yahoo data of many symbols with batched requests into the cache
+
+    Price histories, earnings trends and income statements are requested for all
+    symbols at once, instead of once per symbol. Only entries which are missing
+    or expired in the cache are fetched.
+
+    Args:
+        symbols (list[str]): stock symbols
+        cache (DataCache): cache to fill
+        refresh (bool): fetch everything again, ignoring cached entries
+    """
+    from yahooquery import Ticker
+
+    scheduler = default_scheduler()
+    prefetch_history(symbols, cache, refresh)
+
+    def expired(source: str, window: str, kind: str) -> list[str]:
+        return [
+            symbol
+            for symbol in symbols
+            if refresh or cache.load(symbol, source, window, kind) is None
+        ]
+
+    trend_symbols = expired("earnings_trend", "current", "estimates")
+    if trend_symbols:
+        earnings_trend = scheduler.call(
+            "yahoo", lambda: Ticker(trend_symbols).earnings_trend
+        )
+        for symbol in trend_symbols:
+            entry = earnings_trend.get(symbol)
+            if isinstance(entry, dict) and "trend" in entry:
+                cache.store(symbol, "earnings_trend", "current", entry["trend"])
+
+    income_symbols = expired("income_statement", "annual", "fundamentals")
+    if income_symbols:
+        income_statement = scheduler.call(
+            "yahoo", lambda: Ticker(income_symbols).income_statement(trailing=False)
+        )
+        if isinstance(income_statement, pd.DataFrame):
+            for symbol in income_symbols:
+                if symbol in income_statement.index:
+                    cache.store(
+                        symbol,
+                        "income_statement",
+                        "annual",
+                        income_statement.loc[[symbol]],
+                    )
+
+
+def prefetch_history(
+    symbols: list[str], cache: DataCache, refresh: bool = False
+) -> None:
+    """Fetch the yahoo price histories of many symbols with batched requests
+
+    Full histories of new symbols are fetched with one request. New bars of
+    expired stored histories are fetched with one request per month of their
+    update start, so a long outdated history does not make the up to date ones
+    fetch months of bars again. All histories are stored in the cache.
+
+    Args:
+        symbols (list[str]): stock symbols
+        cache (DataCache): cache to fill
+        refresh (bool): fetch the full histories again, ignoring cached entries
+    """
+    from yahooquery import Ticker
+
+    scheduler = default_scheduler()
+    stored = {}
+    full_symbols = []
+    for symbol in symbols:
+        history = None if refresh else cache.load(symbol, "history", HISTORY_WINDOW)
+        if history is None:
+            full_symbols.append(symbol)
+        elif cache.age(symbol, "history", HISTORY_WINDOW) > cache.ttl["prices"]:
+            stored[symbol] = history
+
+    # incremental update, one request per month of the update starts, each
+    # starting at the oldest date required in its month
+    starts = {symbol: history_update_start(h) for symbol, h in stored.items()}
+    groups: dict[pd.Period, list[str]] = {}
+    for symbol, start in starts.items():
+        groups.setdefault(start.to_period("M"), []).append(symbol)
+    for group in groups.values():
+        start = min(starts[symbol] for symbol in group)
+        recent = _history_by_symbol(
+            scheduler.call(
+                "yahoo",
+                lambda: Ticker(group).history(
+                    start=start.strftime("%Y-%m-%d"),
+                    interval="1d",
+                    adj_timezone=False,
+                ),
+            ),
+            group,
+        )
+        for symbol in group:
+            merged = None
+            if symbol in recent:
+                merged = merge_history(stored[symbol], recent[symbol])
+            if merged is None:
+                full_symbols.append(symbol)
+            else:
+                cache.store(symbol, "history", HISTORY_WINDOW, merged)
+
+    if full_symbols:
+        full = _history_by_symbol(
+            scheduler.call(
+                "yahoo",
+                lambda: Ticker(full_symbols).history(
+                    period=f"{HISTORY_YEARS}y", interval="1d", adj_timezone=False
+                ),
+            ),
+            full_symbols,
+        )
+        for symbol, history in full.items():
+            cache.store(symbol, "history", HISTORY_WINDOW, history)
+
+
+def _history_by_symbol(
+    hist: pd.DataFrame | dict, symbols: list[str]
+) -> dict[str, pd.DataFrame]:
+    """Split a multi-symbol yahooquery history into daily closes per symbol"""
+    if isinstance(hist, dict):
+        # yahooquery returns a dict if some symbols failed
+        frames = {
+            symbol: frame
+            for symbol, frame in hist.items()
+            if isinstance(frame, pd.DataFrame)
+        }
+        if not frames:
+            return {}
+        hist = pd.concat(frames, names=["symbol", "date"])
+
+    histories = {}
+    for symbol in symbols:
+        try:
+            histories[symbol] = close_history(hist, symbol)
+        except KeyError:
+            continue
+    return histories
@@ -0,0 +1,324 @@
+###########################
+# command line interface
+###########################
+import argparse
+from pathlib import Path
+
+
+def read_watchlist(path: str | Path) -> list[str]:
+    """Read symbols from a watchlist file, one symbol per line, "#" starts a comment"""
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            symbol = line.split("#", 1)[0].strip()
+            if symbol:
+                symbols.append(symbol)
+    return symbols
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="stock-analysis",
+        description="Create stock analysis reports for one or many symbols.",
+    )
+    parser.add_argument("symbols", nargs="*", help="stock symbols, e.g. AAPL MSFT")
+    parser.add_argument(
+        "-w", "--watchlist", help="file with one symbol per line ('#' for comments)"
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: all cores)",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default="generated_pdf", help="folder of the report pdfs"
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=None,
+        help="decimate plotted time series to about this many points "
+        "(default: all points for a single shown report, 2000 in batch runs)",
+    )
+    parser.add_argument("--no-pdf", action="store_true", help="do not save pdf reports")
+    parser.add_argument(
+        "--show", action="store_true", help="open the figures (single symbol only)"
+    )
+    parser.add_argument(
+        "--refresh", action="store_true", help="ignore cached data and fetch again"
+    )
+    parser.add_argument(
+        "--timings",
+        metavar="DIR",
+        help="write the stage timings as <symbol>.jsonl to DIR, batch runs "
+        "additionally print and save an aggregate timing report",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="run every analysis under cProfile and save the stats to DIR",
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--replay", metavar="DIR", help="use data recorded with --record, offline"
+    )
+    source.add_argument(
+        "--synthetic", action="store_true", help="use generated random data"
+    )
+    parser.add_argument(
+        "--record",
+        metavar="DIR",
+        help="only record the data of the symbols to DIR, for --replay",
+    )
+    parser.add_argument(
+        "--peers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="compare every report with up to N comparable companies",
+    )
+    parser.add_argument(
+        "--result-cache",
+        metavar="DIR",
+        help="store the computed analysis stages in DIR and reuse the ones with "
+        "unchanged inputs in later runs",
+    )
+    parser.add_argument(
+        "--screen",
+        metavar="FILE",
+        help="instead of reports, rank the symbols by their discount to the fair "
+        "value and save the table to FILE (.csv or .parquet)",
+    )
+    parser.add_argument(
+        "--query",
+        metavar="EXPR",
+        help="filter of --screen, e.g. 'price < 0.8 * fair_value and "
+        "revenue_growth > 10'",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="instead of reports, compare the relative performance of the symbols "
+        "to the first one (relative_comparison.pdf)",
+    )
+    parser.add_argument(
+        "--period",
+        default="5y",
+        help="period of --compare, e.g. 1y, 6mo, ytd or max (default: 5y)",
+    )
+    parser.add_argument(
+        "--price-store",
+        metavar="DIR",
+        help="keep the closes of all symbols of --screen or --compare in a memory "
+        "mapped store in DIR, and read the price histories from it",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="FORMATS",
+        help="instead of reports, export every report to <output-dir>/<symbol>/ "
+        "in some of the formats pdf,png,svg,data (comma separated), rendered on "
+        "--workers processes, with a manifest.json",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="[HOST:]PORT",
+        help="instead of reports, run a local http service of the analyses "
+        "(json, png and pdf), the given symbols are analysed at start",
+    )
+    args = parser.parse_args(argv)
+
+    symbols = list(args.symbols)
+    if args.watchlist:
+        symbols += read_watchlist(args.watchlist)
+    if not symbols and not args.serve:
+        parser.error("no symbols given")
+
+    provider = None
+    if args.replay:
+        from .DataProvider import RecordedProvider
+
+        provider = RecordedProvider(args.replay)
+    elif args.synthetic:
+        from .DataProvider import SyntheticProvider
+
+        provider = SyntheticProvider()
+
+    if args.record:
+        from .DataProvider import record_stock_data
+
+        for symbol in symbols:
+            print(f"Recording {symbol} ...")
+            record_stock_data(symbol, args.record, provider)
+        return 0
+
+    result_cache = None
+    if args.result_cache:
+        from .ResultCache import ResultCache
+
+        result_cache = ResultCache(args.result_cache)
+
+    if args.export:
+        from .compute import compute_stock_analysis
+        from .export import EXPORT_FORMATS, export_report
+
+        formats = [fmt.strip() for fmt in args.export.split(",") if fmt.strip()]
+        if not formats or set(formats) - set(EXPORT_FORMATS):
+            parser.error(f"--export formats must be some of {','.join(EXPORT_FORMATS)}")
+        failed = 0
+        for symbol in symbols:
+            try:
+                result = compute_stock_analysis(
+                    symbol,
+                    refresh=args.refresh,
+                    provider=provider,
+                    peers=args.peers,
+                    result_cache=result_cache,
+                )
+                export_report(
+                    result,
+                    args.output_dir,
+                    formats,
+                    workers=args.workers,
+                    max_points=args.max_points,
+                )
+            except Exception as e:
+                print(f"Exporting {symbol} failed: {e!r}")
+                failed += 1
+        return 1 if failed else 0
+
+    if args.serve:
+        from .AnalysisService import SERVICE_MAX_POINTS, serve
+
+        host, _, port = args.serve.rpartition(":")
+        if not port.isdigit():
+            parser.error("--serve expects [HOST:]PORT, e.g. 8000 or 0.0.0.0:8000")
+        serve(
+            host or "127.0.0.1",
+            int(port),
+            symbols,
+            provider=provider,
+            result_cache=result_cache,
+            peers=args.peers,
+            max_points=args.max_points or SERVICE_MAX_POINTS,
+        )
+        return 0
+
+    price_store = None
+    if args.price_store:
+        if not (args.screen or args.compare):
+            parser.error("--price-store requires --screen or --compare")
+        from .PriceStore import PriceStore
+
+        price_store = PriceStore(args.price_store)
+
+    if args.screen:
+        from .screener import SCREEN_FORMATS, export_screen, screen_stocks
+
+        if Path(args.screen).suffix not in SCREEN_FORMATS:
+            parser.error(f"--screen FILE must end with {' or '.join(SCREEN_FORMATS)}")
+        screen = screen_stocks(
+            symbols,
+            query=args.query,
+            workers=args.workers,
+            refresh=args.refresh,
+            provider=provider,
+            price_store=price_store,
+        )
+        print()
+        print(screen.drop(columns="error").to_string(float_format=lambda x: f"{x:.2f}"))
+        export_screen(screen, args.screen)
+        return 0
+    if args.query:
+        parser.error("--query requires --screen")
+
+    if args.compare:
+        import pandas as pd
+
+        from .compare import compare_relative, period_start
+
+        try:
+            period_start(pd.Timestamp.today(), args.period)
+        except ValueError as e:
+            parser.error(str(e))
+        comparison = compare_relative(
+            symbols,
+            period=args.period,
+            show_figures=args.show,
+            save_to_pdf=not args.no_pdf,
+            output_dir=args.output_dir,
+            max_points=args.max_points,
+            refresh=args.refresh,
+            provider=provider,
+            price_store=price_store,
+        )
+        print()
+        print(comparison.summary().to_string(float_format=lambda x: f"{x:.2f}"))
+        return 0
+
+    if args.show:
+        if len(symbols) > 1:
+            parser.error("--show is only supported for a single symbol")
+        from .analysis import make_stock_analysis
+
+        make_stock_analysis(
+            symbols[0],
+            show_figures=True,
+            save_to_pdf=not args.no_pdf,
+            refresh=args.refresh,
+            output_dir=args.output_dir,
+            max_points=args.max_points,
+            timings_dir=args.timings,
+            profile_dir=args.profile,
+            provider=provider,
+            peers=args.peers,
+            result_cache=result_cache,
+        )
+        return 0
+
+    from .batch import (
+        DEFAULT_MAX_POINTS,
+        fetch_counts,
+        make_stock_analyses,
+        timing_report,
+    )
+
+    summaries = make_stock_analyses(
+        symbols,
+        workers=args.workers,
+        save_to_pdf=not args.no_pdf,
+        refresh=args.refresh,
+        output_dir=args.output_dir,
+        max_points=args.max_points or DEFAULT_MAX_POINTS,
+        timings_dir=args.timings,
+        profile_dir=args.profile,
+        provider=provider,
+        peers=args.peers,
+        result_cache=result_cache,
+    )
+
+    print()
+    for summary in summaries:
+        detail = summary.error if summary.status != "ok" else summary.output or ""
+        print(
+            f"{summary.symbol:<10} {summary.status:<7} {summary.duration:7.1f}s  {detail}"
+        )
+    if args.timings:
+        report = timing_report(summaries)
+        path = Path(args.timings) / "timing_report.csv"
+        # no timings were written if every symbol failed early
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report.to_csv(path)
+        print()
+        print(report.to_string(float_format=lambda x: f"{x:.3f}"))
+        print(f"Saved timing report to '{path}'")
+    counts = fetch_counts(summaries)
+    if counts["requests"]:
+        print(
+            f"{counts['requests']} requests, {counts['retries']} retries, "
+            f"{counts['deduplicated']} deduplicated, {counts['failed']} failed"
+        )
+    failed = sum(summary.status != "ok" for summary in summaries)
+    print(f"{len(summaries) - failed} of {len(summaries)} analyses succeeded")
+    return 1 if failed else 0
@@ -0,0 +1,327 @@
+###########################
+# relative performance comparison of many symbols
+###########################
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from .DataCache import DataCache
+from .DataProvider import DataProvider, LiveProvider
+from .timing import span
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+
+    from .PlotManager import PlotManager
+    from .PriceStore import PriceStore
+
+# yahoo style periods, e.g. "6mo", "5y"
+PERIOD_PATTERN = re.compile(r"(\d+)(d|wk|mo|y)")
+PERIOD_OFFSETS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+TRADING_DAYS = 252
+# more symbols are labeled at the end of their lines instead of in a legend
+LEGEND_SYMBOLS = 10
+
+
+@dataclass
+class RelativeComparison:
+    """
+    Relative performance of many symbols on one calendar, see `relative_performance`
+    """
+
+    benchmark: str
+    closes: pd.DataFrame
+    relative: pd.DataFrame
+    correlation: pd.DataFrame | None = None
+    relative_strength: pd.DataFrame | None = None
+    correlation_window: int | None = None
+
+    def summary(self) -> pd.DataFrame:
+        """Key figures per symbol, in percent
+
+        Returns:
+            pd.DataFrame: total and annual return, annualized volatility and
+                maximum drawdown, and the correlation of the daily returns to the
+                benchmark over the whole period. Sorted by total return.
+        """
+        returns = np.log(self.closes).diff()
+        first = self.closes.apply(pd.Series.first_valid_index)
+        years = (self.closes.index[-1] - first).dt.days / 365.25
+        total = self.relative.iloc[-1] / 100
+        with np.errstate(divide="ignore", invalid="ignore"):
+            annual = total ** (1 / years.to_numpy()) - 1
+        summary = pd.DataFrame(
+            {
+                "total_return": (total - 1) * 100,
+                "annual_return": annual * 100,
+                "volatility": returns.std() * np.sqrt(TRADING_DAYS) * 100,
+                "max_drawdown": (self.relative / self.relative.cummax() - 1).min()
+                * 100,
+                "correlation": returns.corrwith(returns[self.benchmark]),
+            }
+        )
+        summary.index.name = "symbol"
+        return summary.sort_values("total_return", ascending=False)
+
+
+def period_start(end: pd.Timestamp, period: str) -> pd.Timestamp | None:
+    """First date of a yahoo style period ending at `end`
+
+    Args:
+        end (pd.Timestamp): last date
+        period (str): e.g. "5d", "6mo", "5y", "ytd", or "max" for no limit
+
+    Returns:
+        pd.Timestamp | None: first date, None for "max"
+    """
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(end.year, 1, 1)
+    match = PERIOD_PATTERN.fullmatch(period)
+    if match is None:
+        raise ValueError(f"Invalid period '{period}', use e.g. '6mo', '5y' or 'max'")
+    count, unit = match.groups()
+    return end - pd.DateOffset(**{PERIOD_OFFSETS[unit]: int(count)})
+
+
+def load_closes(
+    symbols: list[str],
+    period: str = "5y",
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+    price_store: PriceStore | None = None,
+) -> pd.DataFrame:
+    """Daily closes of many symbols on the union of their trading days
+
+    With live data the histories of all symbols are fetched into the cache with
+    one batched yahoo request, only new bars are requested for cached ones.
+    Symbols without closes are printed and skipped.
+
+    Args:
+        symbols (list[str]): stock symbols
+        period (str): yahoo style period, see `period_start`. Histories are
+            kept for 20 years, "max" returns all of them.
+        refresh (bool): ignore cached closes and fetch them again
+        cache (DataCache | None): cache of the histories, None uses the default
+            cache
+        provider (DataProvider | None): source of the histories, None fetches
+            live data
+        price_store (PriceStore | None): store to update and read the closes from
+
+    Returns:
+        pd.DataFrame: closes, dates x symbols, NaN on the days a symbol was not
+            traded
+    """
+    from .StockData import update_history
+
+    cache = cache if cache is not None else DataCache()
+    provider = provider if provider is not None else LiveProvider()
+    symbols = list(dict.fromkeys(symbols))  # drop duplicates, keep order
+
+    if price_store is not None:
+        price_store.update(symbols, cache, provider, refresh)
+        stored = [symbol for symbol in symbols if symbol in price_store]
+        closes = price_store.frame(stored)
+    else:
+        if isinstance(provider, LiveProvider):
+            from .batch import prefetch_history
+
+            try:
+                prefetch_history(symbols, cache, refresh)
+                refresh = False  # the cached histories are fresh now
+            except Exception as e:
+                print(f"Prefetching yahoo histories failed: {e}")
+        series = {}
+        for symbol in symbols:
+            try:
+                series[symbol] = update_history(symbol, cache, provider, refresh)[
+                    "close"
+                ]
+            except Exception as e:
+                print(f"No closes of {symbol}: {e!r}")
+        closes = pd.concat(series, axis=1, sort=True) if series else pd.DataFrame()
+
+    missing = [symbol for symbol in symbols if symbol not in closes]
+    if missing:
+        print(f"Skipping {', '.join(missing)} without closes")
+    if closes.empty:
+        raise ValueError(f"No closes of {', '.join(symbols)}")
+    closes = closes.truncate(before=period_start(closes.index[-1], period))
+    return closes.dropna(axis=1, how="all")
+
+
+def relative_performance(
+    closes: pd.DataFrame,
+    benchmark: str | None = None,
+    correlation_window: int | None = 63,
+    relative_strength: bool = True,
+) -> RelativeComparison:
+    """Normalize closes to 100 and compare them to a benchmark
+
+    The closes are forward filled on the shared calendar, so holidays of one
+    exchange do not break the lines of its symbols. Every symbol starts at 100
+    at its first close, all columns are divided in one vectorized operation.
+
+    Args:
+        closes (pd.DataFrame): closes, dates x symbols, see `load_closes`
+        benchmark (str | None): symbol to compare to, None uses the first column
+        correlation_window (int | None): trading days of the rolling correlation
+            of the daily returns to the benchmark, None skips it
+        relative_strength (bool): compute the relative performance divided by
+            the one of the benchmark
+
+    Returns:
+        RelativeComparison: normalized closes and the optional panels
+    """
+    benchmark = benchmark if benchmark is not None else closes.columns[0]
+    if benchmark not in closes:
+        raise KeyError(f"Benchmark {benchmark} is not one of the symbols")
+    with span("compare.compute"):
+        closes = closes.ffill()
+        values = closes.to_numpy(dtype=float)
+        first = values[np.isnan(values).argmin(axis=0), np.arange(values.shape[1])]
+        relative = pd.DataFrame(
+            values / first * 100, closes.index, closes.columns, copy=False
+        )
+        others = closes.columns.drop(benchmark)
+
+        correlation = None
+        if correlation_window is not None:
+            returns = np.log(closes).diff()
+            correlation = (
+                returns[others]
+                .rolling(correlation_window, min_periods=correlation_window // 2)
+                .corr(returns[benchmark])
+            )
+        strength = None
+        if relative_strength:
+            strength = relative[others].div(relative[benchmark], axis=0) * 100
+    return RelativeComparison(
+        benchmark, closes, relative, correlation, strength, correlation_window
+    )
+
+
+def _plot_symbols(
+    plot_manager: PlotManager, ax: Axes, frame: pd.DataFrame, reference: float
+) -> None:
+    """Plot one line per symbol, labeled in the legend or at the line ends"""
+    legend = len(frame.columns) <= LEGEND_SYMBOLS
+    for symbol, series in frame.items():
+        series = series.dropna()
+        if series.empty:
+            continue
+        (line,) = plot_manager.plot_series(
+            ax, series, linewidth=1, label=symbol if legend else None
+        )
+        if not legend:
+            ax.annotate(
+                symbol,
+                (series.index[-1], series.iloc[-1]),
+                xytext=(3, 0),
+                textcoords="offset points",
+                va="center",
+                fontsize=7,
+                color=line.get_color(),
+            )
+    ax.axhline(reference, color="black", linewidth=0.8, linestyle="--")
+    ax.set_xlabel("Date")
+
+
+def render_relative_comparison(
+    comparison: RelativeComparison, plot_manager: PlotManager
+) -> None:
+    """Draw the relative chart and the optional correlation and strength panels
+
+    Args:
+        comparison (RelativeComparison): computed comparison
+        plot_manager (PlotManager): plot manager to draw into
+    """
+    benchmark = comparison.benchmark
+    with span("render.relative"):
+        ax = plot_manager.next_axis("Relative Chart", full=True)
+        _plot_symbols(plot_manager, ax, comparison.relative, 100)
+        ax.set_ylabel("Performance (start = 100)")
+    if comparison.correlation is not None:
+        with span("render.correlation"):
+            ax = plot_manager.next_axis(
+                f"Rolling correlation to {benchmark} "
+                f"({comparison.correlation_window} days)"
+            )
+            _plot_symbols(plot_manager, ax, comparison.correlation, 0)
+            ax.set_ylim(-1, 1)
+            ax.set_ylabel("Correlation of daily returns")
+    if comparison.relative_strength is not None:
+        with span("render.relative_strength"):
+            ax = plot_manager.next_axis(f"Relative strength to {benchmark}")
+            _plot_symbols(plot_manager, ax, comparison.relative_strength, 100)
+            ax.set_ylabel(f"Performance relative to {benchmark}")
+
+
+def compare_relative(
+    symbols: list[str],
+    period: str = "5y",
+    benchmark: str | None = None,
+    correlation_window: int | None = 63,
+    relative_strength: bool = True,
+    show_figures: bool = True,
+    save_to_pdf: bool = False,
+    output_dir: str | Path = "generated_pdf",
+    max_points: int | None = None,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+    price_store: PriceStore | None = None,
+) -> RelativeComparison:
+    """Compare the relative performance of many symbols in one chart
+
+    Args:
+        symbols (list[str]): stock symbols
+        period (str): yahoo style period, e.g. "1y", "5y" or "max"
+        benchmark (str | None): symbol of the correlation and relative strength
+            panels, None uses the first symbol
+        correlation_window (int | None): trading days of the rolling
+            correlation panel, None skips it
+        relative_strength (bool): add the relative strength panel
+        show_figures (bool): open matplotlib figures
+        save_to_pdf (bool): save the figures to "<output_dir>/relative_comparison.pdf"
+        output_dir (str | Path): folder of the pdf
+        max_points (int | None): decimate the lines to about this many points,
+            None draws all points
+        refresh (bool): ignore cached closes and fetch them again
+        cache (DataCache | None): cache of the histories, None uses the default
+            cache
+        provider (DataProvider | None): source of the histories, None fetches
+            live data
+        price_store (PriceStore | None): store to update and read the closes from
+
+    Returns:
+        RelativeComparison: the plotted data, see `RelativeComparison.summary`
+    """
+    from .PlotManager import PlotManager
+
+    print(f"Comparing {len(symbols)} symbols ...")
+    with span("compare.load"):
+        closes = load_closes(symbols, period, refresh, cache, provider, price_store)
+    comparison = relative_performance(
+        closes, benchmark, correlation_window, relative_strength
+    )
+
+    filename = Path(output_dir) / "relative_comparison.pdf" if save_to_pdf else None
+    with span("render"):
+        if show_figures:
+            plot_manager = PlotManager(2, 1, max_points=max_points)
+        else:
+            plot_manager = PlotManager(2, 1, filename=filename, max_points=max_points)
+        render_relative_comparison(comparison, plot_manager)
+        plot_manager.finalize(show=show_figures, filename=filename)
+    print(f"Comparing {len(symbols)} symbols ... done")
+    return comparison
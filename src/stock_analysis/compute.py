@@ -0,0 +1,381 @@
+###########################
+# computation of the stock analysis, without any plotting
+###########################
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from .DataCache import DataCache
+from .DataProvider import DataProvider
+from .PriceStore import PriceStore
+from .ResultCache import ResultCache, input_hash
+from .indicators import rainbow_ema, rolling_growth_frame
+from .StockData import StockData
+from .StockSnapshot import StockSnapshot
+from .timing import span
+from .valuation import VALUATION_MODELS, Valuation, compute_valuations
+
+if TYPE_CHECKING:
+    from .peers import PeerComparison
+
+T = TypeVar("T")
+
+# stages of the price indicators, which only their charts and metrics read
+INDICATOR_STAGES = ["rolling_growth", "rainbow_ema"]
+
+
+@dataclass
+class GrowthPhase:
+    """Log-linear growth regression over one phase of a series"""
+
+    fit: pd.Series  # regression line values with the DatetimeIndex of the phase
+    growth: float  # annual growth in percent
+
+    @property
+    def start(self) -> pd.Timestamp:
+        return self.fit.index[0]
+
+    @property
+    def end(self) -> pd.Timestamp:
+        return self.fit.index[-1]
+
+    @property
+    def mid(self) -> pd.Timestamp:
+        return self.fit.index[len(self.fit) // 2]
+
+
+@dataclass
+class AnalysisResult:
+    """All computed data of a stock analysis, as needed for the report"""
+
+    symbol: str
+    kgv: float
+    kgve: float
+    history: pd.Series  # daily closes of the last 20 years
+    price_phases: list[GrowthPhase]
+    eps: pd.Series  # finqual eps with corrected yahoo estimates, descending dates
+    live_kgv: pd.Series
+    live_kgv_bounded: pd.Series
+    fair_value: pd.Series  # fair value at the earnings dates, ascending dates
+    fair_value_fine: pd.Series  # interpolated fair value curve
+    revenue: pd.Series
+    net_income: pd.Series
+    operating_cash_flow: pd.Series
+    shares: pd.Series
+    revenue_phases: list[GrowthPhase] = field(default_factory=list)
+    net_income_phases: list[GrowthPhase] = field(default_factory=list)
+    cash_flow_phases: list[GrowthPhase] = field(default_factory=list)
+    # rolling annual price growth in percent, one column per window ("1y", ...)
+    rolling_growth: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # EMAs of the price history, one column per span ("EMA10", ...)
+    rainbow_ema: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # fair values by valuation model ("KGV", "KCV", ...), see `stock_analysis.valuation`
+    valuations: dict[str, Valuation] = field(default_factory=dict)
+    yahoo_eps: pd.Series = field(default_factory=lambda: pd.Series(dtype=float))
+    current_year_estimate: dict = field(default_factory=dict)
+    next_year_estimate: dict = field(default_factory=dict)
+    # key figures of comparable companies, see `stock_analysis.peers`
+    peers: PeerComparison | None = None
+    # hash of all inputs of the analysis, see `stock_analysis.ResultCache`
+    inputs_hash: str = ""
+
+    @property
+    def eps_table(self) -> pd.DataFrame:
+        """EPS used for the analysis next to the eps reported by yahoo"""
+        return pd.DataFrame({"eps": self.eps, "yahoo_eps": self.yahoo_eps}).sort_index()
+
+    def metrics(self) -> dict[str, float]:
+        """Scalar key figures of the analysis"""
+        price = self.history.array[-1]
+        fair_value = self.fair_value_fine.truncate(after=self.history.index[-1])
+        fair_value = fair_value.array[-1] if len(fair_value) else np.nan
+        metrics = {
+            "price": price,
+            "kgv": self.kgv,
+            "kgve": self.kgve,
+            "fair_value": fair_value,
+            "price_to_fair_value": price / fair_value,
+        }
+        for name, phases in [
+            ("price", self.price_phases),
+            ("revenue", self.revenue_phases),
+            ("net_income", self.net_income_phases),
+            ("cash_flow", self.cash_flow_phases),
+        ]:
+            metrics[f"{name}_growth"] = phases[-1].growth if phases else np.nan
+        metrics["net_margin"] = _last_margin(self.net_income, self.revenue)
+        metrics["cash_flow_margin"] = _last_margin(
+            self.operating_cash_flow, self.revenue
+        )
+        for window, growth in self.rolling_growth.items():
+            metrics[f"rolling_growth_{window}"] = growth.array[-1]
+        for name, valuation in self.valuations.items():
+            model_fair_value = valuation.current_fair_value(self.history.index[-1])
+            metrics[f"fair_value_{name}"] = model_fair_value
+            metrics[f"price_to_fair_value_{name}"] = price / model_fair_value
+        return metrics
+
+
+def _last_margin(values: pd.Series, revenue: pd.Series) -> float:
+    """Latest ratio of values to the revenue at the same date, in percent"""
+    margin = (values / revenue).dropna().sort_index()
+    return margin.array[-1] * 100 if len(margin) else np.nan
+
+
+def _mean_annual_growth(series: pd.Series) -> tuple[np.ndarray, float]:
+    """Computes an anual growth regression
+
+    Args:
+        series (pd.Series): Series with DatetimeIndex
+
+    Returns:
+        tuple[np.ndarray, float]: (regression line values, anual growth in percent)
+    """
+    from scipy.stats import linregress
+
+    x = np.arange(len(series))
+    y = np.log(series.values)
+    slope, intercept, r, p, se = linregress(x, y)
+    y_fit = np.exp(intercept + slope * x)
+    anual_growth = (
+        slope
+        * 100
+        * len(series)
+        * (pd.Timedelta(days=365) / (series.index[-1] - series.index[0]))
+    )
+    return (y_fit, anual_growth)
+
+
+def _growth_phase(series: pd.Series) -> GrowthPhase:
+    y_fit, growth = _mean_annual_growth(series)
+    return GrowthPhase(pd.Series(y_fit, series.index), growth)
+
+
+def _piecewise_annual_growth(series: pd.Series, phaselength: int) -> list[GrowthPhase]:
+    """Computes piecewise annual growth regressions
+
+    Args:
+        series (pd.Series): series with ascending datetimeindex, one datapoint per year
+        phaselength (int): length of phases in years
+
+    Returns:
+        list[GrowthPhase]: growth phases, the oldest first
+    """
+    series = series[series > 0]
+    iphases = list(range(len(series), 0, -phaselength))
+    iphases.sort()
+    if not iphases or iphases[0] != 0:
+        iphases.insert(0, 0)
+    phases = []
+    for i, istart_index in enumerate(iphases[0:-1]):
+        # get subseries, makes only sense if subseries is longer than one
+        subseries = series.iloc[istart_index : iphases[i + 1]]
+        if len(subseries) < 2:
+            continue
+        phases.append(_growth_phase(subseries))
+    return phases
+
+
+def compute_stock_analysis(
+    stock: StockData | StockSnapshot | str,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+    price_store: PriceStore | None = None,
+    peers: int = 0,
+    result_cache: ResultCache | None = None,
+    indicators: list[str] | None = None,
+) -> AnalysisResult:
+    """Computes the stock analysis without drawing anything
+
+    Args:
+        stock (StockData | StockSnapshot | str): fetched stock data, a snapshot
+            of it, or a stock symbol to fetch
+        refresh (bool): ignore cached stock data and fetch everything again
+        cache (DataCache | None): cache for the stock data, None uses the default
+            cache. With fetched stock data, the ones of the stock data are used.
+        provider (DataProvider | None): source of the stock data, None fetches
+            live data
+        price_store (PriceStore | None): closes to read the price history from,
+            see `StockData`
+        peers (int): compare with up to this many comparable companies, see
+            `stock_analysis.peers`
+        result_cache (ResultCache | None): load the stages with unchanged inputs
+            from this cache and store the computed ones, None computes all stages
+        indicators (list[str] | None): stages of `INDICATOR_STAGES` to compute,
+            None computes all. The skipped indicators are empty frames, e.g.
+            for screens which only read the fair value and the growth phases.
+
+    Returns:
+        AnalysisResult: key figures, growth phases, fair value and eps data
+    """
+    indicators = INDICATOR_STAGES if indicators is None else indicators
+    unknown = set(indicators) - set(INDICATOR_STAGES)
+    if unknown:
+        raise ValueError(
+            f"Unknown indicators {sorted(unknown)}, use {INDICATOR_STAGES}"
+        )
+    if isinstance(stock, str):
+        stock = StockData(
+            stock,
+            cache=cache,
+            refresh=refresh,
+            provider=provider,
+            price_store=price_store,
+        )
+    if isinstance(stock, StockData):
+        refresh, cache, provider = stock.refresh, stock.cache, stock.provider
+        stock = stock.snapshot()
+    with span("compute", symbol=stock.symbol):
+        result = _compute_stock_analysis(stock, result_cache, indicators)
+    if peers:
+        from .peers import add_peer_comparison
+
+        add_peer_comparison(result, peers, refresh, cache, provider, result_cache)
+    return result
+
+
+def _stage(
+    result_cache: ResultCache | None,
+    symbol: str,
+    stage: str,
+    key: str,
+    fn: Callable[[], T],
+) -> T:
+    """Run one timed stage, through the result cache if there is one"""
+    with span(f"compute.{stage}"):
+        if result_cache is None:
+            return fn()
+        return result_cache.memoize(symbol, stage, key, fn)
+
+
+def _price_phases(chartHistory: pd.Series) -> list[GrowthPhase]:
+    """Growth phases of the three thirds of the price history"""
+    n = len(chartHistory)
+    split_points = [n // 3, 2 * n // 3]
+    return [
+        _growth_phase(phase)
+        for phase in [
+            chartHistory.iloc[: split_points[0]],
+            chartHistory.iloc[split_points[0] : split_points[1]],
+            chartHistory.iloc[split_points[1] :],
+        ]
+    ]
+
+
+def _compute_stock_analysis(
+    stock: StockSnapshot,
+    result_cache: ResultCache | None = None,
+    indicators: list[str] = INDICATOR_STAGES,
+) -> AnalysisResult:
+    """Computes the stock analysis of a stock data snapshot, see `compute_stock_analysis`"""
+    symbol = stock.symbol
+    chartHistory = stock.history_20y
+    fundamentals = stock.fundamentals
+    eps = stock.eps
+    revenue = stock.revenue
+    net_income = stock.net_income
+    operating_cash_flow = stock.operating_cash_flow
+    yahoo_eps = stock.yahoo_eps
+
+    # --- input hashes of the stages, the price stages only change with new bars ---
+    price_key = input_hash(chartHistory)
+    valuation_key = input_hash(price_key, fundamentals, VALUATION_MODELS)
+    fundamentals_key = input_hash(revenue, net_income, operating_cash_flow)
+
+    # --- 20-Year Chart with Phases ---
+    price_phases = _stage(
+        result_cache,
+        symbol,
+        "price_phases",
+        price_key,
+        lambda: _price_phases(chartHistory),
+    )
+
+    # --- KGV ---
+    KGV = chartHistory.array[-1] / eps.truncate(before=chartHistory.index[-1]).array[0]
+    KGVe = chartHistory.array[-1] / eps.truncate(after=chartHistory.index[-1]).array[-1]
+
+    rollingGrowth = pd.DataFrame()
+    if "rolling_growth" in indicators:
+        rollingGrowth = _stage(
+            result_cache,
+            symbol,
+            "rolling_growth",
+            price_key,
+            lambda: rolling_growth_frame(chartHistory),
+        )
+    rainbowEMA = pd.DataFrame()
+    if "rainbow_ema" in indicators:
+        rainbowEMA = _stage(
+            result_cache,
+            symbol,
+            "rainbow_ema",
+            price_key,
+            lambda: rainbow_ema(chartHistory),
+        )
+
+    # --- Fair Value of all valuation models, the KGV model is the main one ---
+    valuations = _stage(
+        result_cache,
+        symbol,
+        "fair_value",
+        valuation_key,
+        lambda: compute_valuations(chartHistory, fundamentals),
+    )
+    kgvValuation = valuations["KGV"]
+
+    # --- Fundamentals, reversed to ascending order for the regressions ---
+    revenue_phases, net_income_phases, cash_flow_phases = _stage(
+        result_cache,
+        symbol,
+        "fundamental_phases",
+        fundamentals_key,
+        lambda: tuple(
+            _piecewise_annual_growth(series[::-1], 5)
+            for series in [revenue, net_income, operating_cash_flow]
+        ),
+    )
+
+    shares = stock.shares
+    inputs_hash = input_hash(
+        price_key,
+        valuation_key,
+        fundamentals_key,
+        eps,
+        shares,
+        yahoo_eps,
+        stock.current_year_estimate,
+        stock.next_year_estimate,
+    )
+
+    return AnalysisResult(
+        symbol=symbol,
+        kgv=KGV,
+        kgve=KGVe,
+        history=chartHistory,
+        price_phases=price_phases,
+        eps=eps,
+        live_kgv=kgvValuation.live_multiple,
+        live_kgv_bounded=kgvValuation.live_multiple_bounded,
+        fair_value=kgvValuation.fair_value,
+        fair_value_fine=kgvValuation.fair_value_fine,
+        revenue=revenue,
+        net_income=net_income,
+        operating_cash_flow=operating_cash_flow,
+        shares=shares,
+        revenue_phases=revenue_phases,
+        net_income_phases=net_income_phases,
+        cash_flow_phases=cash_flow_phases,
+        rolling_growth=rollingGrowth,
+        rainbow_ema=rainbowEMA,
+        valuations=valuations,
+        yahoo_eps=yahoo_eps,
+        current_year_estimate=stock.current_year_estimate,
+        next_year_estimate=stock.next_year_estimate,
+        inputs_hash=inputs_hash,
+    )
@@ -0,0 +1,155 @@
+###########################
+# downsampling of dense series for plotting
+###########################
+import numpy as np
+import pandas as pd
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling
+
+    The first and last point are always kept. The points in between are split
+    into n_out - 2 buckets, and from each bucket the point forming the largest
+    triangle with the previously kept point and the mean of the next bucket is
+    kept. This preserves the visual shape of the line.
+
+    Several lines sharing the same x values are downsampled together, with one
+    vectorized step per bucket for all of them.
+
+    Args:
+        x (np.ndarray): ascending x values
+        y (np.ndarray): finite y values, shape (n,) or (n, lines)
+        n_out (int): number of points to keep
+
+    Returns:
+        np.ndarray: ascending indices of the kept points, shape (n_out,) or
+            (n_out, lines)
+    """
+    n = len(x)
+    y = np.asarray(y, dtype=float)
+    if n_out >= n or n_out < 3:
+        kept = np.arange(n)
+        return kept if y.ndim == 1 else np.repeat(kept[:, None], y.shape[1], axis=1)
+    x = np.asarray(x, dtype=float)
+    y2d = y if y.ndim == 2 else y[:, None]
+
+    # bucket i holds the points edges[i]:edges[i + 1]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # means of the bucket after bucket i, the last point for the last bucket
+    counts = np.diff(edges)
+    next_mean_x = np.append(np.add.reduceat(x[: n - 1], edges[:-1]) / counts, x[-1])[1:]
+    next_mean_y = np.concatenate(
+        [np.add.reduceat(y2d[: n - 1], edges[:-1]) / counts[:, None], y2d[-1:]]
+    )[1:]
+
+    if y.ndim == 1:
+        # scalar indexing is faster for a single line
+        next_mean_y = next_mean_y[:, 0]
+        kept = np.empty(n_out, dtype=np.int64)
+        kept[0] = 0
+        kept[-1] = n - 1
+        a = 0
+        for i in range(n_out - 2):
+            start, end = edges[i], edges[i + 1]
+            # twice the triangle areas, the constant factor does not matter
+            area = np.abs(
+                (x[a] - next_mean_x[i]) * (y[start:end] - y[a])
+                - (x[a] - x[start:end]) * (next_mean_y[i] - y[a])
+            )
+            a = start + int(np.argmax(area))
+            kept[i + 1] = a
+        return kept
+
+    lines = np.arange(y.shape[1])
+    kept = np.empty((n_out, len(lines)), dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = np.zeros(len(lines), dtype=np.int64)
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        x_a = x[a]
+        y_a = y[a, lines]
+        area = np.abs(
+            (x_a - next_mean_x[i]) * (y[start:end] - y_a)
+            - (x_a - x[start:end, None]) * (next_mean_y[i] - y_a)
+        )
+        a = start + np.argmax(area, axis=0)
+        kept[i + 1] = a
+    return kept
+
+
+def decimate_series(series: pd.Series, max_points: int) -> pd.Series:
+    """Reduce a series to about `max_points` points for plotting
+
+    Every run of finite values is downsampled with LTTB, getting a share of the
+    points proportional to its length, and its minimum and maximum are always
+    kept. The first NaN after a run is kept as well, so gaps stay visible.
+
+    Args:
+        series (pd.Series): series with ascending (Datetime)Index
+        max_points (int): approximate number of points to keep
+
+    Returns:
+        pd.Series: subset of the series
+    """
+    if len(series) <= max_points:
+        return series
+
+    values = series.to_numpy(dtype=float)
+    if isinstance(series.index, pd.DatetimeIndex):
+        x = series.index.asi8.astype(float)
+    else:
+        x = series.index.to_numpy(dtype=float)
+
+    finite = np.isfinite(values)
+    n_finite = finite.sum()
+    if n_finite == 0:
+        return series
+
+    # start and end indices of the runs of finite values
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], finite.view(np.int8), [0]])))
+    kept = []
+    for start, end in zip(edges[0::2], edges[1::2]):
+        n_out = max(3, round(max_points * (end - start) / n_finite))
+        run = values[start:end]
+        kept.append(start + lttb(x[start:end], run, n_out))
+        kept.append(start + np.array([np.argmin(run), np.argmax(run)]))
+        if end < len(values):
+            kept.append(np.array([end]))
+    return series.iloc[np.unique(np.concatenate(kept))]
+
+
+def decimate_frame(frame: pd.DataFrame, max_points: int) -> list[pd.Series]:
+    """Reduce every column of a frame to about `max_points` points for plotting
+
+    Columns without NaN are downsampled together with LTTB (keeping their
+    minimum and maximum), which is much faster than one `decimate_series` call
+    per column. Columns with gaps are decimated one by one.
+
+    Args:
+        frame (pd.DataFrame): columns with ascending (Datetime)Index
+        max_points (int): approximate number of points to keep per column
+
+    Returns:
+        list[pd.Series]: decimated columns
+    """
+    if len(frame) <= max_points:
+        return [series for _, series in frame.items()]
+
+    values = frame.to_numpy(dtype=float)
+    finite = np.isfinite(values).all(axis=0)
+    decimated = {}
+    if finite.any():
+        if isinstance(frame.index, pd.DatetimeIndex):
+            x = frame.index.asi8.astype(float)
+        else:
+            x = frame.index.to_numpy(dtype=float)
+        block = values[:, finite]
+        kept = lttb(x, block, max(3, max_points))
+        extremes = np.stack([np.argmin(block, axis=0), np.argmax(block, axis=0)])
+        kept = np.concatenate([kept, extremes])
+        for j, column in enumerate(np.flatnonzero(finite)):
+            decimated[column] = frame.iloc[np.unique(kept[:, j]), column]
+    for column in np.flatnonzero(~finite):
+        decimated[column] = decimate_series(frame.iloc[:, column], max_points)
+    return [decimated[column] for column in range(frame.shape[1])]
@@ -0,0 +1,468 @@
+###########################
+# parallel export of a report to pdf, images and a data bundle
+###########################
+from __future__ import annotations
+
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from .compute import AnalysisResult
+from .timing import span
+
+EXPORT_FORMATS = ["pdf", "png", "svg", "data"]
+IMAGE_FORMATS = ["png", "svg"]
+DEFAULT_DPI = 100
+# grid of the report pages, as in `make_stock_analysis`
+PAGE_ROWS = 2
+PAGE_COLS = 2
+
+# analysis of the report being exported, set once per worker process
+_result: AnalysisResult | None = None
+
+
+def init_render_worker(result: AnalysisResult | None = None) -> None:
+    """Render process initializer: matplotlib without a display, the analysis to render"""
+    global _result
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from . import analysis  # noqa: F401
+
+    _result = result
+
+
+def report_pages(result: AnalysisResult) -> list[list[int]]:
+    """Charts of each pdf page, in page order
+
+    A full size chart gets a page of its own, the other charts fill the
+    grid pages in chart order. A grid page is started when its first chart is
+    drawn, so full size charts can come between its charts, exactly as in the
+    pdf of `make_stock_analysis`.
+
+    Returns:
+        list[list[int]]: indices of the charts of `analysis._charts` per page
+    """
+    from .analysis import _charts
+
+    pages: list[list[int]] = []
+    grid: list[int] | None = None
+    for chart, (_, full, _) in enumerate(_charts(result)):
+        if full:
+            pages.append([chart])
+            continue
+        if grid is None or len(grid) == PAGE_ROWS * PAGE_COLS:
+            grid = []
+            pages.append(grid)
+        grid.append(chart)
+    return pages
+
+
+def chart_name(result: AnalysisResult, chart: int) -> str:
+    """File name of a chart without suffix, e.g. "00_price_phases" """
+    from .analysis import _charts
+
+    plot = _charts(result)[chart][2]
+    return f"{chart:02d}_{plot.__name__.removeprefix('_plot_')}"
+
+
+def render_page(
+    result: AnalysisResult,
+    page: int,
+    charts: list[int],
+    filename: str | Path,
+    max_points: int | None = None,
+) -> None:
+    """Render one page of the report pdf into a pdf of its own
+
+    Args:
+        result (AnalysisResult): computed stock analysis
+        page (int): index of the page, see `report_pages`
+        charts (list[int]): charts of the page
+        filename (str | Path): pdf to write
+        max_points (int | None): decimate the plotted time series to about
+            this many points, None draws all points
+    """
+    from .analysis import _charts
+    from .PlotManager import PlotManager
+
+    all_charts = _charts(result)
+    plot_manager = PlotManager(
+        PAGE_ROWS,
+        PAGE_COLS,
+        filename=filename,
+        max_points=max_points,
+        window_offset=page,
+    )
+    try:
+        for chart in charts:
+            title, full, plot = all_charts[chart]
+            ax = plot_manager.next_axis(title, full=full)
+            with span(f"render.{plot.__name__.removeprefix('_plot_')}"):
+                plot(plot_manager, ax, result)
+        plot_manager.finalize(show=False)
+    except BaseException:
+        plot_manager.discard()
+        raise
+
+
+def render_report_pdf(
+    result: AnalysisResult, filename: str | Path, max_points: int | None = None
+) -> None:
+    """Render the whole report pdf, page by page in one process"""
+    from .analysis import render_stock_analysis
+    from .PlotManager import PlotManager
+
+    plot_manager = PlotManager(
+        PAGE_ROWS, PAGE_COLS, filename=filename, max_points=max_points
+    )
+    try:
+        render_stock_analysis(result, plot_manager)
+        plot_manager.finalize(show=False)
+    except BaseException:
+        plot_manager.discard()
+        raise
+
+
+def render_chart(
+    result: AnalysisResult,
+    chart: int,
+    formats: list[str] | None = None,
+    max_points: int | None = None,
+    dpi: int = DEFAULT_DPI,
+) -> dict[str, bytes]:
+    """Render one chart of the report as full size image
+
+    Args:
+        result (AnalysisResult): computed stock analysis
+        chart (int): index of the chart, see `analysis._charts`
+        formats (list[str] | None): image formats of matplotlib, e.g. "png" or
+            "svg", None renders a png
+        max_points (int | None): decimate the plotted time series to about
+            this many points, None draws all points
+        dpi (int): resolution of raster images
+
+    Returns:
+        dict[str, bytes]: the image in each format
+    """
+    import matplotlib.pyplot as plt
+
+    from .analysis import _charts
+    from .PlotManager import PlotManager
+
+    title, _, plot = _charts(result)[chart]
+    plot_manager = PlotManager(max_points=max_points)
+    ax = plot_manager.next_axis(title, full=True)
+    try:
+        with span(f"render.{plot.__name__.removeprefix('_plot_')}"):
+            plot(plot_manager, ax, result)
+        plot_manager.finalize(show=False)
+        images = {}
+        for fmt in formats or ["png"]:
+            buffer = io.BytesIO()
+            with span(f"render.{fmt}"):
+                ax.figure.savefig(buffer, format=fmt, dpi=dpi)
+            images[fmt] = buffer.getvalue()
+    finally:
+        # the workers of the service render many charts
+        plt.close(ax.figure)
+    return images
+
+
+def plotted_series(result: AnalysisResult) -> pd.DataFrame:
+    """All plotted time series of the report in long format
+
+    Returns:
+        pd.DataFrame: columns "series", "date" and "value", e.g. the series
+            "close", "ema.EMA50", "valuation.KGV.fair_value_fine" or "revenue"
+    """
+    series: dict[str, pd.Series] = {
+        "close": result.history,
+        "eps": result.eps,
+        "yahoo_eps": result.yahoo_eps,
+        "revenue": result.revenue,
+        "net_income": result.net_income,
+        "operating_cash_flow": result.operating_cash_flow,
+        "shares": result.shares,
+    }
+    for name, phases in [
+        ("price_phase", result.price_phases),
+        ("revenue_phase", result.revenue_phases),
+        ("net_income_phase", result.net_income_phases),
+        ("cash_flow_phase", result.cash_flow_phases),
+    ]:
+        for i, phase in enumerate(phases):
+            series[f"{name}.{i}"] = phase.fit
+    for column, values in result.rainbow_ema.items():
+        series[f"ema.{column}"] = values
+    for column, values in result.rolling_growth.items():
+        series[f"rolling_growth.{column}"] = values
+    for name, valuation in result.valuations.items():
+        for field in ["per_share", "live_multiple", "fair_value", "fair_value_fine"]:
+            series[f"valuation.{name}.{field}"] = getattr(valuation, field)
+
+    frames = [
+        pd.DataFrame(
+            {
+                "series": name,
+                "date": pd.DatetimeIndex(values.index),
+                "value": values.to_numpy(dtype=float),
+            }
+        )
+        for name, values in series.items()
+    ]
+    frame = pd.concat(frames, ignore_index=True)
+    frame["series"] = frame["series"].astype("category")
+    return frame
+
+
+def _json_safe(value: Any) -> Any:
+    """Nested data with NaN as None and timestamps as iso strings"""
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if hasattr(value, "item"):  # numpy scalars
+        return _json_safe(value.item())
+    return value
+
+
+def report_data(result: AnalysisResult) -> dict[str, Any]:
+    """Key figures, growth phases, estimates and peer figures as json data"""
+    data = {
+        "symbol": result.symbol,
+        "inputs_hash": result.inputs_hash,
+        "metrics": result.metrics(),
+        "growth_phases": {
+            name: [
+                {"start": phase.start, "end": phase.end, "growth": phase.growth}
+                for phase in phases
+            ]
+            for name, phases in [
+                ("price", result.price_phases),
+                ("revenue", result.revenue_phases),
+                ("net_income", result.net_income_phases),
+                ("cash_flow", result.cash_flow_phases),
+            ]
+        },
+        "current_year_estimate": result.current_year_estimate,
+        "next_year_estimate": result.next_year_estimate,
+    }
+    if result.peers is not None:
+        data["peers"] = result.peers.figures.to_dict(orient="index")
+    return _json_safe(data)
+
+
+def _export_page(page: int, charts: list[int], folder: Path, max_points) -> Path:
+    """Task: render one pdf page of the worker's analysis"""
+    path = folder / f"page-{page:03d}.pdf"
+    with span("export.page", symbol=_result.symbol):
+        render_page(_result, page, charts, path, max_points)
+    return path
+
+
+def _export_pdf(path: Path, max_points: int | None) -> Path:
+    """Task: render the whole pdf of the worker's analysis"""
+    with span("export.pdf", symbol=_result.symbol):
+        render_report_pdf(_result, path, max_points)
+    return path
+
+
+def _export_chart(
+    chart: int, formats: list[str], folder: Path, max_points, dpi: int
+) -> list[Path]:
+    """Task: render one chart of the worker's analysis in all image formats"""
+    with span("export.chart", symbol=_result.symbol):
+        images = render_chart(_result, chart, formats, max_points, dpi)
+    paths = []
+    for fmt, image in images.items():
+        path = folder / f"{chart_name(_result, chart)}.{fmt}"
+        path.write_bytes(image)
+        paths.append(path)
+    return paths
+
+
+def merge_pdfs(pages: list[Path], filename: Path) -> None:
+    """Merge single page pdfs in order, needs the optional pypdf package"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for page in pages:
+        writer.append(page)
+    with open(filename, "wb") as f:
+        writer.write(f)
+
+
+def _has_pypdf() -> bool:
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_report(
+    result: AnalysisResult,
+    output_dir: str | Path = "generated_pdf",
+    formats: list[str] | None = None,
+    workers: int | None = None,
+    max_points: int | None = None,
+    dpi: int = DEFAULT_DPI,
+) -> Path:
+    """Export a report to pdf, chart images and a data bundle, with a manifest
+
+    The pdf pages and the chart images are rendered independently on a pool
+    of worker processes with the Agg backend, each worker receives the
+    analysis once. The pages are merged in order with pypdf (the optional
+    "export" extra); without pypdf one worker renders the whole pdf instead,
+    next to the images. The data bundle is written meanwhile.
+
+    Files in "<output_dir>/<symbol>/":
+    - report.pdf
+    - charts/<index>_<chart>.png and .svg, one per chart
+    - data/series.parquet: all plotted series, see `plotted_series`
+    - data/report.json: key figures and growth phases, see `report_data`
+    - manifest.json: the written files with their formats, charts and sizes
+
+    Args:
+        result (AnalysisResult): computed stock analysis
+        output_dir (str | Path): folder of the exports
+        formats (list[str] | None): some of `EXPORT_FORMATS`, None exports all
+        workers (int | None): number of worker processes, None uses all
+            cores, 1 renders in this process
+        max_points (int | None): decimate the plotted time series to about
+            this many points, None draws all points
+        dpi (int): resolution of the png images
+
+    Returns:
+        Path: the manifest
+    """
+    from .analysis import _charts
+
+    formats = list(formats) if formats is not None else EXPORT_FORMATS
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(
+            f"Unknown export formats {sorted(unknown)}, use {EXPORT_FORMATS}"
+        )
+    start = time.perf_counter()
+    folder = Path(output_dir) / result.symbol
+    folder.mkdir(parents=True, exist_ok=True)
+    images = [fmt for fmt in IMAGE_FORMATS if fmt in formats]
+    pages = report_pages(result)
+    merge = "pdf" in formats and _has_pypdf()
+
+    tasks = []
+    pages_dir = None
+    if "pdf" in formats:
+        if merge:
+            # the single page pdfs, removed even if the export fails
+            pages_dir = Path(tempfile.mkdtemp(prefix=".pages-", dir=folder))
+            tasks += [
+                (_export_page, page, charts, pages_dir, max_points)
+                for page, charts in enumerate(pages)
+            ]
+        else:
+            tasks.append((_export_pdf, folder / "report.pdf", max_points))
+    if images:
+        (folder / "charts").mkdir(exist_ok=True)
+        tasks += [
+            (_export_chart, chart, images, folder / "charts", max_points, dpi)
+            for chart in range(sum(len(charts) for charts in pages))
+        ]
+
+    print(f"Exporting {result.symbol} ({', '.join(formats)}) ...")
+    workers = min(workers or os.cpu_count() or 1, max(1, len(tasks)))
+    try:
+        with span("export", symbol=result.symbol):
+            if workers == 1:
+                global _result
+                _result = result
+                try:
+                    data_files = _export_data(result, folder, formats)
+                    outputs = [task[0](*task[1:]) for task in tasks]
+                finally:
+                    _result = None
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=init_render_worker,
+                    initargs=(result,),
+                ) as executor:
+                    futures = [executor.submit(*task) for task in tasks]
+                    # the data bundle is written while the workers render
+                    data_files = _export_data(result, folder, formats)
+                    outputs = [future.result() for future in futures]
+
+            files = []
+            if "pdf" in formats:
+                path = folder / "report.pdf"
+                if merge:
+                    with span("export.merge", symbol=result.symbol):
+                        merge_pdfs(outputs[: len(pages)], path)
+                    outputs = outputs[len(pages) :]
+                else:
+                    outputs = outputs[1:]
+                files.append({"path": path, "format": "pdf", "pages": len(pages)})
+            titles = [title for title, _, _ in _charts(result)]
+            for chart, paths in enumerate(outputs):
+                files += [
+                    {
+                        "path": path,
+                        "format": path.suffix[1:],
+                        "chart": chart,
+                        "title": titles[chart],
+                    }
+                    for path in paths
+                ]
+            files += data_files
+    finally:
+        if pages_dir is not None:
+            shutil.rmtree(pages_dir, ignore_errors=True)
+
+    for entry in files:
+        entry["bytes"] = entry["path"].stat().st_size
+        entry["path"] = entry["path"].relative_to(folder).as_posix()
+    manifest = {
+        "symbol": result.symbol,
+        "inputs_hash": result.inputs_hash,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "formats": formats,
+        "workers": workers,
+        "duration": time.perf_counter() - start,
+        "files": files,
+    }
+    path = folder / "manifest.json"
+    path.write_text(json.dumps(manifest, indent=2))
+    print(f"Exporting {result.symbol} ... done, manifest in '{path}'")
+    return path
+
+
+def _export_data(result: AnalysisResult, folder: Path, formats: list[str]) -> list:
+    """Write the data bundle, if requested, and return its manifest entries"""
+    if "data" not in formats:
+        return []
+    with span("export.data", symbol=result.symbol):
+        (folder / "data").mkdir(exist_ok=True)
+        series = folder / "data" / "series.parquet"
+        plotted_series(result).to_parquet(series, index=False)
+        report = folder / "data" / "report.json"
+        report.write_text(json.dumps(report_data(result), indent=2))
+    return [
+        {"path": series, "format": "parquet"},
+        {"path": report, "format": "json"},
+    ]
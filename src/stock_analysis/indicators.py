@@ -0,0 +1,145 @@
+###########################
+# vectorized indicators on price histories
+###########################
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+# windows of the rolling growth, in years
+GROWTH_WINDOWS = {"1y": 1, "3y": 3, "5y": 5}
+# spans of the rainbow EMA, in bars
+RAINBOW_SPANS = list(range(10, 201, 10))
+
+
+def rolling_growth(
+    values: np.ndarray, windows: Sequence[int], times: np.ndarray | None = None
+) -> np.ndarray:
+    """Rolling annual growth from log-linear regressions over sliding windows
+
+    For every bar and window, log(values) of the last `window` bars is regressed
+    on the time. The slopes follow in closed form from cumulative sums of x, x²,
+    y and x·y, so all bars and windows are computed in one pass instead of one
+    fit per window.
+
+    Args:
+        values (np.ndarray): positive values, shape (bars,) or (bars, symbols)
+        windows (Sequence[int]): window lengths in bars
+        times (np.ndarray | None): time of each bar in years, shape (bars,),
+            None assumes 252 equidistant bars per year
+
+    Returns:
+        np.ndarray: compound annual growth in percent, shape
+            (len(windows), *values.shape). NaN where the window is incomplete
+            or contains a non-positive or NaN value.
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[0]
+    if times is None:
+        times = np.arange(n) / 252
+    # relative times keep the sums small
+    x = np.asarray(times, dtype=float) - times[0]
+    x = x.reshape((n,) + (1,) * (values.ndim - 1))
+
+    valid = np.isfinite(values) & (values > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.where(valid, np.log(values), 0.0)
+
+    def prefix_sum(a: np.ndarray) -> np.ndarray:
+        a = np.broadcast_to(a, values.shape)
+        return np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)])
+
+    c_x = prefix_sum(x)
+    c_xx = prefix_sum(x * x)
+    c_y = prefix_sum(y)
+    c_xy = prefix_sum(x * y)
+    c_invalid = prefix_sum(~valid)
+
+    # window [end - w, end) for every window (rows) and bar (columns)
+    w = np.asarray(windows, dtype=np.int64)[:, None]
+    end = np.arange(1, n + 1)[None, :]
+    start = np.maximum(end - w, 0)
+    # broadcast the (windows, bars) arrays over the symbols
+    extra_dims = (1,) * (values.ndim - 1)
+    complete = (end >= w).reshape(len(w), n, *extra_dims)
+    w = w.reshape(len(w), 1, *extra_dims).astype(float)
+
+    def window_sum(c: np.ndarray) -> np.ndarray:
+        return c[end] - c[start]
+
+    s_x = window_sum(c_x)
+    s_y = window_sum(c_y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (w * window_sum(c_xy) - s_x * s_y) / (w * window_sum(c_xx) - s_x * s_x)
+    slope = np.where(complete & (window_sum(c_invalid) == 0), slope, np.nan)
+    return np.expm1(slope) * 100
+
+
+def rolling_growth_frame(
+    series: pd.Series, windows: dict[str, float] = GROWTH_WINDOWS
+) -> pd.DataFrame:
+    """Rolling annual growth of a price history, one column per window
+
+    Args:
+        series (pd.Series): prices with ascending DatetimeIndex
+        windows (dict[str, float]): column names and window lengths in years
+
+    Returns:
+        pd.DataFrame: compound annual growth in percent, with the index of `series`
+    """
+    times = (series.index - series.index[0]) / pd.Timedelta(days=365.25)
+    times = np.asarray(times, dtype=float)
+    bars_per_year = (len(series) - 1) / times[-1] if len(series) > 1 else 1.0
+    bars = [max(2, round(years * bars_per_year)) for years in windows.values()]
+    growth = rolling_growth(series.to_numpy(dtype=float), bars, times)
+    return pd.DataFrame(growth.T, series.index, columns=list(windows))
+
+
+def ema(values: np.ndarray, spans: Sequence[int]) -> np.ndarray:
+    """Exponential moving averages of many spans in one batched filter pass
+
+    Every span is the IIR filter y[t] = a * x[t] + (1 - a) * y[t - 1] with
+    a = 2 / (span + 1) and y[0] = x[0], like `Series.ewm(span, adjust=False)`.
+    Instead of a loop over the bars (or spans), the recurrence is solved as an
+    associative scan on a (spans, bars) array: after the steps 1, 2, 4, ... every
+    y[t] holds the sum of (1 - a)^k * a * x[t - k] over all k, which takes
+    log2(bars) vectorized steps.
+
+    Args:
+        values (np.ndarray): finite values, shape (bars,) or (bars, symbols)
+        spans (Sequence[int]): EMA spans in bars
+
+    Returns:
+        np.ndarray: EMAs, shape (len(spans), *values.shape)
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[0]
+    extra_dims = (1,) * (values.ndim - 1)
+    alpha = (2.0 / (np.asarray(spans, dtype=float) + 1)).reshape(-1, 1, *extra_dims)
+    decay = 1.0 - alpha
+
+    y = alpha * values[None]
+    y[:, 0] = values[0]
+    step = 1
+    decay_step = decay  # decay ** step, underflows to 0 for long steps
+    while step < n:
+        y[:, step:] += decay_step * y[:, :-step]
+        decay_step = decay_step * decay_step
+        step *= 2
+    return y
+
+
+def rainbow_ema(
+    series: pd.Series, spans: Sequence[int] = RAINBOW_SPANS
+) -> pd.DataFrame:
+    """EMAs of a price history for the rainbow chart, one column per span
+
+    Args:
+        series (pd.Series): prices without NaN
+        spans (Sequence[int]): EMA spans in bars
+
+    Returns:
+        pd.DataFrame: EMAs with the index of `series`, columns "EMA<span>"
+    """
+    emas = ema(series.to_numpy(dtype=float), spans)
+    return pd.DataFrame(emas.T, series.index, columns=[f"EMA{span}" for span in spans])
@@ -0,0 +1,197 @@
+###########################
+# comparison with the peer group of comparable companies
+###########################
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .batch import prefetch_stock_data
+from .compute import AnalysisResult, compute_stock_analysis
+from .DataCache import DataCache
+from .DataProvider import DataProvider, LiveProvider
+from .ResultCache import ResultCache
+from .timing import span
+
+# maximum number of peers fetched at the same time
+PEER_WORKERS = 8
+
+# figures of the comparison, see `AnalysisResult.metrics`
+PEER_FIGURES = [
+    "kgv",
+    "kgve",
+    "price_to_fair_value",
+    "price_growth",
+    "revenue_growth",
+    "net_income_growth",
+    "net_margin",
+    "cash_flow_margin",
+]
+
+
+@dataclass
+class PeerComparison:
+    """Key figures of a symbol and of its peers"""
+
+    symbol: str
+    # one row per company, the symbol first, the columns are `PEER_FIGURES`
+    figures: pd.DataFrame
+    # errors of peers which could not be analysed
+    errors: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def peers(self) -> pd.DataFrame:
+        """Figures of the peers only"""
+        return self.figures.drop(index=self.symbol)
+
+    def summary(self) -> pd.DataFrame:
+        """The figures of the symbol next to the distribution of the peer figures
+
+        Returns:
+            pd.DataFrame: one row per figure with the value of the symbol, the
+                peer median and quartiles, and the share of peers with a lower
+                value in percent
+        """
+        peers = self.peers
+        value = self.figures.loc[self.symbol]
+        with np.errstate(invalid="ignore"):
+            below = (peers < value).sum() / peers.notna().sum() * 100
+        return pd.DataFrame(
+            {
+                self.symbol: value,
+                "peer_q25": peers.quantile(0.25),
+                "peer_median": peers.median(),
+                "peer_q75": peers.quantile(0.75),
+                "peers_below": below.where(value.notna()),
+            }
+        )
+
+
+def find_peers(
+    symbol: str,
+    n: int = 10,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+) -> list[str]:
+    """Comparable companies of the same sector, from the finqual CCA
+
+    Args:
+        symbol (str): stock symbol
+        n (int): maximum number of peers
+        refresh (bool): ignore the cached peers and look them up again
+        cache (DataCache | None): cache of the peers, None uses the default cache
+        provider (DataProvider | None): source of the peers, None fetches live data
+
+    Returns:
+        list[str]: symbols of the peers
+    """
+    provider = provider if provider is not None else LiveProvider()
+    if not provider.cached:
+        return provider.peers(symbol, n)
+    cache = cache if cache is not None else DataCache()
+    return cache.fetch(
+        symbol,
+        "peers",
+        str(n),
+        "fundamentals",
+        lambda: provider.peers(symbol, n),
+        refresh=refresh,
+    )
+
+
+def compare_peers(
+    result: AnalysisResult,
+    n: int = 10,
+    workers: int = PEER_WORKERS,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+    result_cache: ResultCache | None = None,
+) -> PeerComparison:
+    """Compare the key figures of an analysis with the ones of its peers
+
+    The peers are analysed without the price indicators (see
+    `compute_stock_analysis`) on a thread pool of at most `workers` threads, with
+    live data their yahoo data is prefetched with batched requests first. All
+    data goes through the same cache as the data of the analysed symbol, so the
+    reports of the peers reuse it.
+
+    Args:
+        result (AnalysisResult): analysis of the symbol
+        n (int): maximum number of peers, see `find_peers`
+        workers (int): maximum number of peers analysed at the same time
+        refresh (bool): ignore cached data of the peers and fetch it again
+        cache (DataCache | None): cache for the stock data, None uses the default cache
+        provider (DataProvider | None): source of the stock data, None fetches
+            live data
+        result_cache (ResultCache | None): stored stages of the peer analyses,
+            see `compute_stock_analysis`
+
+    Returns:
+        PeerComparison: figures of the symbol and its peers, peers which fail
+            are listed in `errors`
+    """
+    cache = cache if cache is not None else DataCache()
+    peers = find_peers(result.symbol, n, refresh, cache, provider)
+    print(f"Comparing {result.symbol} with {len(peers)} peers ...")
+    prefetch_stock_data(peers, cache, refresh, provider)
+
+    rows = {result.symbol: result.metrics()}
+    errors = {}
+    if peers:
+        with ThreadPoolExecutor(max_workers=min(workers, len(peers))) as executor:
+            futures = {
+                executor.submit(
+                    compute_stock_analysis,
+                    peer,
+                    refresh=refresh,
+                    cache=cache,
+                    provider=provider,
+                    result_cache=result_cache,
+                    # the comparison reads no price indicators
+                    indicators=[],
+                ): peer
+                for peer in peers
+            }
+            for future in as_completed(futures):
+                peer = futures[future]
+                try:
+                    rows[peer] = future.result().metrics()
+                except Exception as e:
+                    errors[peer] = repr(e)
+    if errors:
+        print(f"Peers without analysis: {', '.join(errors)}")
+    figures = pd.DataFrame.from_dict(
+        {symbol: rows[symbol] for symbol in [result.symbol, *peers] if symbol in rows},
+        orient="index",
+    ).reindex(columns=PEER_FIGURES)
+    figures.index.name = "symbol"
+    print(f"Comparing {result.symbol} with {len(peers)} peers ... done")
+    return PeerComparison(result.symbol, figures, errors)
+
+
+def add_peer_comparison(
+    result: AnalysisResult,
+    n: int = 10,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+    result_cache: ResultCache | None = None,
+) -> None:
+    """Set `result.peers`, printing instead of raising errors of the peer lookup"""
+    with span("peers", symbol=result.symbol):
+        try:
+            result.peers = compare_peers(
+                result,
+                n,
+                refresh=refresh,
+                cache=cache,
+                provider=provider,
+                result_cache=result_cache,
+            )
+        except Exception as e:
+            print(f"Peer comparison of {result.symbol} failed: {e!r}")
@@ -0,0 +1,172 @@
+###########################
+# screener ranking many symbols by their discount to the fair value
+###########################
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from .batch import prefetch_stock_data
+from .compute import INDICATOR_STAGES, compute_stock_analysis
+from .DataCache import DataCache
+from .DataProvider import DataProvider
+from .FetchScheduler import share_default_scheduler
+from .PriceStore import PriceStore
+
+SCREEN_FORMATS = [".csv", ".parquet"]
+
+# leading columns of the screen, the other metrics of the analysis follow
+SCREEN_COLUMNS = [
+    "price",
+    "fair_value",
+    "discount",
+    "price_to_fair_value",
+    "kgv",
+    "kgve",
+    "price_growth",
+    "revenue_growth",
+    "net_income_growth",
+    "cash_flow_growth",
+]
+
+
+def screen_stocks(
+    symbols: list[str],
+    query: str | None = None,
+    workers: int | None = None,
+    refresh: bool = False,
+    cache: DataCache | None = None,
+    provider: DataProvider | None = None,
+    price_store: PriceStore | None = None,
+) -> pd.DataFrame:
+    """Compute the key figures of many symbols and rank them by fair value discount
+
+    Only the computations of the analysis run, nothing is drawn, and of the
+    price indicators only the ones the query reads (see `screen_indicators`).
+    The symbols are computed on a process pool, with live data the yahoo data
+    is prefetched into the cache with batched requests first.
+
+    Args:
+        symbols (list[str]): stock symbols
+        query (str | None): filter passed to `DataFrame.query`, e.g.
+            "price < 0.8 * fair_value and revenue_growth > 10"
+        workers (int | None): number of worker processes, None uses all cores
+        refresh (bool): ignore cached stock data and fetch everything again
+        cache (DataCache | None): cache for the stock data, None uses the default cache
+        provider (DataProvider | None): source of the stock data, None fetches
+            live data
+        price_store (PriceStore | None): store of the closes, updated with the
+            missing or outdated closes first. The workers then read the price
+            histories from its memory map instead of the cache.
+
+    Returns:
+        pd.DataFrame: one row per symbol, sorted by the discount to the (KGV) fair
+            value in percent, the most undervalued first. The columns are the
+            `AnalysisResult.metrics` with the growth of the last phases in
+            percent, plus "error" for symbols which failed (their metrics are NaN).
+            The "rolling_growth_<window>" columns are only computed if the query
+            reads them.
+    """
+    cache = cache if cache is not None else DataCache()
+    symbols = list(dict.fromkeys(symbols))  # drop duplicates, keep order
+    prefetch_stock_data(symbols, cache, refresh, provider)
+    if price_store is not None:
+        price_store.update(symbols, cache, provider, refresh)
+
+    indicators = screen_indicators(query)
+    rows: dict[str, dict] = {}
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=share_default_scheduler,
+        initargs=(workers,),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _screen_symbol,
+                symbol,
+                refresh,
+                cache,
+                provider,
+                price_store,
+                indicators,
+            ): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                rows[symbol] = future.result()
+            except Exception as e:  # e.g. a crashed worker process
+                rows[symbol] = {"error": repr(e)}
+
+    screen = pd.DataFrame.from_dict(
+        {symbol: rows[symbol] for symbol in symbols}, orient="index"
+    )
+    screen.index.name = "symbol"
+    screen = screen.reindex(
+        columns=SCREEN_COLUMNS
+        + [c for c in screen.columns if c not in SCREEN_COLUMNS + ["error"]]
+        + ["error"]
+    )
+    screen["error"] = screen["error"].astype(object)
+    screen = screen.sort_values("discount", ascending=False, kind="stable")
+    if query:
+        screen = screen.query(query)
+    return screen
+
+
+def screen_indicators(query: str | None) -> list[str]:
+    """Indicator stages whose metrics the query reads, e.g. "rolling_growth" for
+    "rolling_growth_1y > 10". The ranking itself only needs the fair value."""
+    return [stage for stage in INDICATOR_STAGES if query and stage in query]
+
+
+def _screen_symbol(
+    symbol: str,
+    refresh: bool,
+    cache: DataCache,
+    provider: DataProvider | None,
+    price_store: PriceStore | None,
+    indicators: list[str],
+) -> dict:
+    """Worker: metrics of one symbol, or its error"""
+    try:
+        result = compute_stock_analysis(
+            symbol,
+            refresh=refresh,
+            cache=cache,
+            provider=provider,
+            price_store=price_store,
+            indicators=indicators,
+        )
+    except Exception as e:
+        return {"error": repr(e)}
+    metrics = result.metrics()
+    metrics["discount"] = (1 - metrics["price_to_fair_value"]) * 100
+    return metrics
+
+
+def export_screen(screen: pd.DataFrame, path: str | Path) -> Path:
+    """Save a screen as csv or parquet file, depending on the file suffix
+
+    Args:
+        screen (pd.DataFrame): screen of `screen_stocks`
+        path (str | Path): ".csv" or ".parquet" file
+
+    Returns:
+        Path: path of the saved file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix not in SCREEN_FORMATS:
+        raise ValueError(
+            f"Unsupported screen format '{path.suffix}', use .csv or .parquet"
+        )
+    if path.suffix == ".csv":
+        screen.to_csv(path)
+    else:
+        screen.to_parquet(path)
+    print(f"Saved screen to '{path}'")
+    return path
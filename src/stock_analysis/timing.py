@@ -0,0 +1,158 @@
+###########################
+# timing spans and profiling hooks
+###########################
+"""Timing spans of the fetch, compute and render stages
+
+The stages are wrapped in `span`s, which cost nothing unless a hook is
+registered with `add_timing_hook` or `timing_hook`. The command line writes
+the spans of every symbol as "<symbol>.jsonl" with `--timings DIR` and
+profiles every analysis with `--profile DIR`, see `profiled`.
+"""
+
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+@dataclass
+class Span:
+    """Timing of one named stage of an analysis"""
+
+    name: str  # dotted stage name, e.g. "fetch.history" or "render.pdf"
+    symbol: str | None
+    start: float  # unix time
+    duration: float  # seconds
+    parent: str | None = None  # name of the enclosing span in the same thread
+
+
+TimingHook = Callable[[Span], None]
+
+_hooks: list[TimingHook] = []
+_hooks_lock = threading.Lock()
+# (name, symbol) of the innermost open span, every thread starts without one
+_current: ContextVar[tuple[str | None, str | None]] = ContextVar(
+    "timing_span", default=(None, None)
+)
+
+
+def add_timing_hook(hook: TimingHook) -> None:
+    """Register a callback which is called with every finished span"""
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_timing_hook(hook: TimingHook) -> None:
+    """Unregister a callback added by `add_timing_hook`"""
+    with _hooks_lock:
+        _hooks.remove(hook)
+
+
+@contextmanager
+def timing_hook(hook: TimingHook) -> Iterator[TimingHook]:
+    """Register a timing hook for the duration of the with block"""
+    add_timing_hook(hook)
+    try:
+        yield hook
+    finally:
+        remove_timing_hook(hook)
+
+
+@contextmanager
+def span(name: str, symbol: str | None = None) -> Iterator[None]:
+    """Time the enclosed block and pass the span to all timing hooks
+
+    Without registered hooks nothing is measured. Spans opened inside the block
+    (in the same thread) inherit the symbol and record this span as parent.
+
+    Args:
+        name (str): dotted stage name
+        symbol (str | None): stock symbol, None inherits it from the enclosing span
+    """
+    if not _hooks:
+        yield
+        return
+
+    parent, parent_symbol = _current.get()
+    if symbol is None:
+        symbol = parent_symbol
+    token = _current.set((name, symbol))
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - t0
+        _current.reset(token)
+        with _hooks_lock:
+            hooks = list(_hooks)
+        finished = Span(name, symbol, start, duration, parent)
+        for hook in hooks:
+            hook(finished)
+
+
+class TimingRecorder:
+    """Timing hook which collects all spans, e.g. to write them as JSON lines"""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def totals(self) -> dict[str, float]:
+        """Summed duration in seconds per span name"""
+        totals: dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def write_jsonl(self, path: str | Path) -> Path:
+        """Write the spans in start order to a JSON lines file, one span per line
+
+        Returns:
+            Path: path of the written file
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        with open(path, "w") as f:
+            for span in spans:
+                f.write(json.dumps(asdict(span)) + "\n")
+        return path
+
+
+@contextmanager
+def profiled(path: str | Path | None) -> Iterator[cProfile.Profile | None]:
+    """Run the with block under cProfile and dump the stats to `path`
+
+    The stats can be inspected with `python -m pstats <path>` or snakeviz. Only
+    the calling thread is profiled, the concurrent fetches of `StockData` show
+    up in the timing spans instead.
+
+    Args:
+        path (str | Path | None): file for the profile stats, None disables profiling
+    """
+    if path is None:
+        yield None
+        return
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        print(f"Saved profile to '{path}'")
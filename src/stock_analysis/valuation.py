@@ -0,0 +1,256 @@
+###########################
+# valuation models, fair values from historical price multiples
+###########################
+"""Fair values of a stock from the price multiples it had in the past
+
+The fair value at a report date is the mean multiple of the three years before
+it times the value per share of that report date, e.g. the mean KGV times the
+eps. Between the report dates the fair values are interpolated to a smooth
+curve, the report draws it with a band of ±20% for every registered model.
+KGV (earnings), KCV (operating cash flow) and KUV (revenue) are built in, more
+models are added with `register_valuation_model`:
+
+    register_valuation_model("KBV", lambda f: f["total_assets"] / f["shares"])
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# A valuation model maps the aligned fundamentals (`StockData.fundamentals`) to
+# a value per share at each report date. Its multiple is the price divided by
+# that value, e.g. the KGV for the earnings per share.
+ValuationModel = Callable[[pd.DataFrame], pd.Series]
+
+# registered models by the name of their multiple, in chart order
+VALUATION_MODELS: dict[str, ValuationModel] = {}
+
+# length of the window of the mean multiple in front of each report date
+AVERAGING_TIME = pd.Timedelta(days=365 * 3)
+# multiples start this long before the first report date of a model
+LEAD_TIME = pd.Timedelta(days=365)
+
+
+def register_valuation_model(name: str, model: ValuationModel | None = None):
+    """Register a valuation model, replacing a model of the same name
+
+    Can be called with the model, or used as decorator:
+
+        @register_valuation_model("KBV")
+        def book_value_per_share(fundamentals: pd.DataFrame) -> pd.Series:
+            ...
+
+    Args:
+        name (str): name of the multiple, e.g. "KGV"
+        model (ValuationModel | None): function of the aligned fundamentals
+            returning the value per share at each report date
+
+    Returns:
+        the model, or a decorator registering the model if it is None
+    """
+
+    def register(model: ValuationModel) -> ValuationModel:
+        VALUATION_MODELS[name] = model
+        return model
+
+    if model is None:
+        return register
+    return register(model)
+
+
+def _per_share(values: pd.Series, shares: pd.Series) -> pd.Series:
+    """Values per share, like the eps only where both are positive"""
+    return (values / shares).where((values > 0) & (shares > 0))
+
+
+@register_valuation_model("KGV")
+def earnings_per_share(fundamentals: pd.DataFrame) -> pd.Series:
+    """Eps of finqual with the corrected yahoo estimates"""
+    return fundamentals["eps"]
+
+
+@register_valuation_model("KCV")
+def cash_flow_per_share(fundamentals: pd.DataFrame) -> pd.Series:
+    """Operating cash flow per share"""
+    return _per_share(fundamentals["operating_cash_flow"], fundamentals["shares"])
+
+
+@register_valuation_model("KUV")
+def revenue_per_share(fundamentals: pd.DataFrame) -> pd.Series:
+    """Total revenue per share"""
+    return _per_share(fundamentals["revenue"], fundamentals["shares"])
+
+
+@dataclass
+class Valuation:
+    """Fair value of a stock by one valuation model"""
+
+    name: str  # name of the multiple, e.g. "KGV"
+    per_share: pd.Series  # value per share at the report dates, ascending dates
+    live_multiple: pd.Series  # price / value per share of the next report date
+    fair_value: pd.Series  # fair value at the report dates, ascending dates
+    fair_value_fine: pd.Series  # interpolated fair value curve
+
+    @property
+    def live_multiple_bounded(self) -> pd.Series:
+        """Live multiple without negative values, as averaged for the fair value"""
+        return self.live_multiple.clip(lower=0)
+
+    def current_fair_value(self, date: pd.Timestamp) -> float:
+        """Fair value curve at `date`, NaN if the curve starts after it"""
+        fair_value = self.fair_value_fine.truncate(after=date)
+        return fair_value.array[-1] if len(fair_value) else np.nan
+
+
+def live_multiples(history: pd.Series, per_share: pd.DataFrame) -> pd.DataFrame:
+    """Price multiples of many valuation models at every bar
+
+    Every bar is divided by the value per share of the first report date at or
+    after it, for which the model has a value. The values of each model are
+    backward filled over the report dates, so one search of the report dates
+    serves all models.
+
+    Args:
+        history (pd.Series): price series with ascending DatetimeIndex
+        per_share (pd.DataFrame): value per share, one column per model, with
+            ascending report dates as index and NaN where a model has no value
+
+    Returns:
+        pd.DataFrame: multiples with the columns of `per_share`, starting one
+            year before the first value of any model. NaN before one year ahead
+            of the first value of a model and after its last value.
+    """
+    values = per_share.to_numpy(dtype=float)
+    finite = np.isfinite(values)
+    has_values = finite.any(axis=0)
+    if not has_values.any():
+        return pd.DataFrame(columns=per_share.columns, dtype=float)
+
+    # first date of each model, minus the lead time
+    starts = per_share.index[finite.argmax(axis=0)] - LEAD_TIME
+    starts = np.where(has_values, starts.to_numpy(), np.datetime64("NaT"))
+    history = history.truncate(before=starts[has_values].min())
+
+    filled = per_share.where(finite).bfill().to_numpy(dtype=float)
+    ireport = per_share.index.normalize().searchsorted(history.index, side="left")
+    inside = ireport < len(per_share)
+    multiples = np.full((len(history), per_share.shape[1]), np.nan)
+    multiples[inside] = history.to_numpy()[inside, None] / filled[ireport[inside]]
+    # NaT compares as False, models without values stay NaN anyway
+    multiples[history.index.to_numpy()[:, None] < starts[None, :]] = np.nan
+    return pd.DataFrame(multiples, history.index, per_share.columns)
+
+
+def windowed_fair_values(
+    multiples: pd.DataFrame,
+    per_share: pd.DataFrame,
+    averaging_time: pd.Timedelta = AVERAGING_TIME,
+) -> pd.DataFrame:
+    """Fair values at the report dates from the mean multiple before them
+
+    The mean multiple over the window [report date - averaging_time, report date]
+    (ignoring NaN) is multiplied with the value per share of the report date.
+    The window means of all report dates and models are computed from cumulative
+    sums in one pass.
+
+    Args:
+        multiples (pd.DataFrame): multiples with ascending DatetimeIndex
+        per_share (pd.DataFrame): value per share with the columns of `multiples`
+        averaging_time (pd.Timedelta): length of the averaging window
+
+    Returns:
+        pd.DataFrame: fair values with the index and columns of `per_share`
+    """
+    values = multiples.to_numpy(dtype=float)
+    finite = ~np.isnan(values)
+    zeros = np.zeros((1, values.shape[1]))
+    cum_sum = np.concatenate([zeros, np.cumsum(np.where(finite, values, 0.0), axis=0)])
+    cum_count = np.concatenate([zeros, np.cumsum(finite, axis=0)])
+
+    istart = multiples.index.searchsorted(per_share.index - averaging_time, side="left")
+    iend = multiples.index.searchsorted(per_share.index, side="right")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_multiple = (cum_sum[iend] - cum_sum[istart]) / (
+            cum_count[iend] - cum_count[istart]
+        )
+    return pd.DataFrame(
+        mean_multiple * per_share[multiples.columns].to_numpy(dtype=float),
+        per_share.index,
+        multiples.columns,
+    )
+
+
+def interpolate_fair_value(fair_value: pd.Series, points: int = 1000) -> pd.Series:
+    """Smooth fair value curve through the fair values at the report dates
+
+    Report dates without a fair value (e.g. older than the price history) are
+    skipped. With less than two fair values there is nothing to interpolate,
+    they are returned as they are.
+    """
+    from scipy.interpolate import pchip_interpolate
+
+    fair_value = fair_value.dropna()
+    if len(fair_value) < 2:
+        return fair_value
+    fairValueDateFine = np.linspace(
+        fair_value.index.values[0].astype("float"),
+        fair_value.index.values[-1].astype("float"),
+        points,
+    )
+    fairValueFine = pchip_interpolate(
+        fair_value.index.values.astype("float"), fair_value.array, fairValueDateFine
+    )
+    return pd.Series(fairValueFine, pd.to_datetime(fairValueDateFine))
+
+
+def compute_valuations(
+    history: pd.Series,
+    fundamentals: pd.DataFrame,
+    models: dict[str, ValuationModel] | None = None,
+    averaging_time: pd.Timedelta = AVERAGING_TIME,
+) -> dict[str, Valuation]:
+    """Fair values of a stock by all valuation models
+
+    Args:
+        history (pd.Series): price series with ascending DatetimeIndex
+        fundamentals (pd.DataFrame): aligned fundamentals, see
+            `StockData.fundamentals`
+        models (dict[str, ValuationModel] | None): models by name, None uses
+            all registered models
+        averaging_time (pd.Timedelta): length of the window of the mean multiple
+
+    Returns:
+        dict[str, Valuation]: valuations by model name, models without any
+            value per share are left out
+    """
+    models = VALUATION_MODELS if models is None else models
+    per_share = pd.DataFrame(
+        {name: model(fundamentals) for name, model in models.items()},
+        fundamentals.index,
+        dtype=float,
+    ).sort_index()
+    # e.g. a division by zero shares
+    per_share = per_share.where(np.isfinite(per_share))
+
+    multiples = live_multiples(history, per_share)
+    fair_values = windowed_fair_values(
+        multiples.clip(lower=0), per_share, averaging_time
+    )
+
+    valuations = {}
+    for name in per_share.columns:
+        reported = per_share[name].notna()
+        if not reported.any():
+            continue
+        values = per_share.loc[reported, name]
+        fair_value = fair_values.loc[reported, name]
+        valuations[name] = Valuation(
+            name=name,
+            per_share=values,
+            live_multiple=multiples[name].truncate(before=values.index[0] - LEAD_TIME),
+            fair_value=fair_value,
+            fair_value_fine=interpolate_fair_value(fair_value),
+        )
+    return valuations
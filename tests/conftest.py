@@ -0,0 +1,21 @@
+# tests/conftest.py
+import pytest
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import SyntheticProvider
+from stock_analysis.StockData import StockData
+
+
+class CachedSyntheticProvider(SyntheticProvider):
+    """Synthetic data which StockData keeps in its cache like live data"""
+
+    cached = True
+
+
+@pytest.fixture
+def synthetic_cache(tmp_path) -> DataCache:
+    """Cache holding synthetic data for the symbols "AAA" and "BBB", so the
+    analyses with the default live provider need no network"""
+    cache = DataCache(tmp_path / "cache")
+    for symbol in ["AAA", "BBB"]:
+        StockData(symbol, cache=cache, provider=CachedSyntheticProvider())
+    return cache
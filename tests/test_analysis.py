@@ -0,0 +1,52 @@
+# tests/test_analysis.py
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis.valuation import live_multiples, windowed_fair_values
+
+
+def _live_kgv_loop(chartHistory, eps):
+    """Reference: the original loop implementation of the live KGV"""
+    oldestValidKGVDate = eps.index[-1] - pd.Timedelta(days=365)
+    liveKGV = pd.Series(np.nan, chartHistory.truncate(before=oldestValidKGVDate).index)
+    for earningsDate in eps.index:
+        earlierDates = liveKGV.truncate(after=earningsDate.date()).index
+        liveKGV[earlierDates] = chartHistory[earlierDates] / eps[earningsDate]
+    return liveKGV
+
+
+def _fair_value_loop(liveKGVBounded, eps, movingAverageTime):
+    """Reference: the original loop implementation of the fair value"""
+    fairValue_value = []
+    for earningsDate in eps.index:
+        averagingStartDate = earningsDate - movingAverageTime
+        meanKGV = liveKGVBounded.truncate(
+            before=averagingStartDate, after=earningsDate
+        ).array.mean()
+        fairValue_value.append(meanKGV * eps[earningsDate])
+    return pd.Series(fairValue_value, eps.index)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_live_kgv_and_fair_value_match_loops(seed):
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp("2025-06-15")
+    history = pd.Series(
+        100 * np.exp(np.cumsum(0.01 * rng.standard_normal(5000))),
+        pd.bdate_range(end=today, periods=5000),
+    )
+    # descending eps dates: two estimates in the future, then reported years
+    eps_dates = pd.DatetimeIndex([f"{year}-09-28" for year in range(2026, 2008, -1)])
+    eps = pd.Series(rng.uniform(-1.0, 10.0, len(eps_dates)), eps_dates)
+
+    live_kgv = live_multiples(history, eps.sort_index().to_frame())[0].rename(None)
+    expected_kgv = _live_kgv_loop(history, eps)
+    pd.testing.assert_series_equal(live_kgv, expected_kgv)
+
+    bounded = live_kgv.clip(lower=0)
+    averaging_time = pd.Timedelta(days=365 * 3)
+    fair_value = windowed_fair_values(
+        bounded.to_frame(), eps.to_frame(), averaging_time
+    )[0].rename(None)
+    expected_fair_value = _fair_value_loop(bounded, eps, averaging_time)
+    pd.testing.assert_series_equal(fair_value, expected_fair_value, rtol=1e-9)
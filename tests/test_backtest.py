@@ -0,0 +1,122 @@
+# tests/test_backtest.py
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compute_stock_analysis
+from stock_analysis.backtest import (
+    PUBLICATION_LAG,
+    backtest_fair_value,
+    fair_value_matrix,
+)
+
+
+def _backtest_loop(close, fair_value, entry, exit, max_hold):
+    """Reference: bar by bar simulation of one symbol and one combination"""
+    ratio = close / fair_value
+    state, last_entry, below_before = False, None, False
+    positions = []
+    for t, r in enumerate(ratio):
+        below = bool(r < 1 + entry)
+        if below and not below_before:
+            state, last_entry = True, t
+        elif r > 1 + exit:
+            state = False
+        below_before = below
+        positions.append(state and t - last_entry < max_hold)
+
+    equity, peak, max_drawdown = 1.0, 1.0, 0.0
+    trades, wins, trade_start = 0, 0, None
+    for t in range(len(close)):
+        if t > 0 and positions[t - 1] and np.isfinite(close[t] / close[t - 1]):
+            equity *= close[t] / close[t - 1]
+        peak = max(peak, equity)
+        max_drawdown = min(max_drawdown, equity / peak - 1)
+        if positions[t] and (t == 0 or not positions[t - 1]):
+            trade_start = equity
+        elif (not positions[t] and t > 0 and positions[t - 1]) or (
+            positions[t] and t == len(close) - 1 and positions[t - 1]
+        ):
+            trades += 1
+            wins += equity > trade_start
+    return {
+        "total_return": (equity - 1) * 100,
+        "max_drawdown": max_drawdown * 100,
+        "trades": trades,
+        "hit_rate": wins / trades if trades else np.nan,
+    }
+
+
+def test_backtest_matches_loop():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2015-01-01", periods=1500)
+    symbols = ["A", "B", "C"]
+    closes = pd.DataFrame(
+        100 * np.exp(np.cumsum(0.02 * rng.standard_normal((1500, 3)), axis=0)),
+        dates,
+        symbols,
+    )
+    fair_values = closes.rolling(250, min_periods=1).mean() * rng.uniform(0.9, 1.1)
+    fair_values.iloc[:100, 1] = np.nan  # no fair value yet
+    closes.iloc[:50, 2] = np.nan  # not listed yet
+
+    result = backtest_fair_value(
+        closes, fair_values, [-0.2, -0.1], [0.0, 0.2], [None, 60]
+    )
+
+    assert len(result) == 2 * 2 * 2 * 3
+    for (entry, exit, max_hold, symbol), row in result.iterrows():
+        expected = _backtest_loop(
+            closes[symbol].to_numpy(),
+            fair_values[symbol].to_numpy(),
+            entry,
+            exit,
+            max_hold,
+        )
+        for name, value in expected.items():
+            np.testing.assert_allclose(row[name], value, rtol=1e-9, atol=1e-9)
+    assert result.query("entry == -0.2 and exit == 0.2")["trades"].sum() > 0
+    assert (result["exposure"].between(0, 1)).all()
+
+
+def test_fair_values_are_used_after_publication(synthetic_cache):
+    result = compute_stock_analysis("AAA", cache=synthetic_cache)
+    lag = pd.Timedelta(days=60)
+    closes, fair_values = fair_value_matrix([result], publication_lag=lag)
+    fair_value = fair_values["AAA"]
+    reported = result.fair_value.dropna()
+    reported = reported[reported.index <= result.net_income.index.max()]
+    for date, value in reported.items():
+        assert not (fair_value[: date + lag - pd.Timedelta(days=1)] == value).any()
+        if date + lag <= closes.index[-1]:
+            assert fair_value.asof(date + lag + pd.Timedelta(days=3)) == value
+    # the eps estimates are never used
+    estimates = result.fair_value.dropna().drop(reported.index)
+    assert len(estimates) and not fair_value.isin(estimates.to_numpy()).any()
+
+
+def test_backtest_skips_crossed_bands():
+    dates = pd.bdate_range("2020-01-01", periods=10)
+    closes = pd.DataFrame({"A": np.linspace(10, 20, 10)}, dates)
+    result = backtest_fair_value(closes, closes, [-0.1, 0.3], [0.2])
+    assert list(result.index.get_level_values("entry")) == [-0.1]
+
+
+@pytest.mark.parametrize("chunk", [1, 2**21])
+def test_backtest_analyses(synthetic_cache, monkeypatch, chunk):
+    monkeypatch.setattr("stock_analysis.backtest.CHUNK_ELEMENTS", chunk)
+    results = [
+        compute_stock_analysis(symbol, cache=synthetic_cache)
+        for symbol in ["AAA", "BBB"]
+    ]
+    closes, fair_values = fair_value_matrix(results)
+    assert list(closes.columns) == ["AAA", "BBB"]
+    # point in time: constant from the publication of a report on
+    fair_value = results[0].fair_value.dropna()
+    published = fair_value.index + PUBLICATION_LAG
+    fair_value = fair_value[published < closes.index[-1] - pd.Timedelta(days=30)]
+    date = fair_value.index[-1] + PUBLICATION_LAG + pd.Timedelta(days=30)
+    assert fair_values["AAA"].asof(date) == fair_value.iloc[-1]
+
+    result = backtest_fair_value(closes, fair_values, [-0.2, -0.1], [0.2])
+    assert result.index.get_level_values("symbol").tolist() == ["AAA", "BBB"] * 2
+    assert result["buy_and_hold"].notna().all()
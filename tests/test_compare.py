@@ -0,0 +1,127 @@
+# tests/test_compare.py
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compare_relative, relative_performance
+from stock_analysis.cli import main
+from stock_analysis.compare import load_closes, period_start
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import RecordedProvider
+from stock_analysis.PriceStore import PriceStore
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+def test_period_start():
+    end = pd.Timestamp("2024-06-14")
+    assert period_start(end, "5y") == pd.Timestamp("2019-06-14")
+    assert period_start(end, "6mo") == pd.Timestamp("2023-12-14")
+    assert period_start(end, "2wk") == pd.Timestamp("2024-05-31")
+    assert period_start(end, "ytd") == pd.Timestamp("2024-01-01")
+    assert period_start(end, "max") is None
+    with pytest.raises(ValueError, match="Invalid period"):
+        period_start(end, "5 years")
+
+
+def test_relative_performance():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2020-01-01", periods=300)
+    closes = pd.DataFrame(
+        100 * np.exp(rng.normal(0, 0.01, (300, 3)).cumsum(axis=0)),
+        dates,
+        ["AAA", "BBB", "CCC"],
+    )
+    # a holiday of one exchange, and a symbol listed later
+    closes.iloc[10, 1] = np.nan
+    closes.iloc[:50, 2] = np.nan
+
+    comparison = relative_performance(closes, correlation_window=20)
+    assert comparison.benchmark == "AAA"
+    relative = comparison.relative
+    assert relative.iloc[0, :2].tolist() == [100, 100]
+    assert relative["CCC"].first_valid_index() == dates[50]
+    assert relative["CCC"].iloc[50] == pytest.approx(100)
+    filled = closes.ffill()
+    for symbol in closes:
+        expected = filled[symbol] / filled[symbol].dropna().iloc[0] * 100
+        pd.testing.assert_series_equal(relative[symbol], expected)
+
+    returns = np.log(filled).diff()
+    expected = returns["BBB"].rolling(20, min_periods=10).corr(returns["AAA"])
+    pd.testing.assert_series_equal(
+        comparison.correlation["BBB"], expected, check_names=False
+    )
+    assert comparison.correlation.columns.tolist() == ["BBB", "CCC"]
+    pd.testing.assert_series_equal(
+        comparison.relative_strength["CCC"],
+        relative["CCC"] / relative["AAA"] * 100,
+        check_names=False,
+    )
+
+    summary = comparison.summary()
+    assert summary["total_return"].is_monotonic_decreasing
+    assert summary.loc["AAA", "correlation"] == pytest.approx(1)
+    assert (summary["max_drawdown"] <= 0).all()
+
+    bare = relative_performance(
+        closes, "BBB", correlation_window=None, relative_strength=False
+    )
+    assert bare.correlation is None and bare.relative_strength is None
+    with pytest.raises(KeyError, match="DDD"):
+        relative_performance(closes, "DDD")
+
+
+def test_load_closes(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    symbols = provider.symbols()
+    cache = DataCache(tmp_path / "cache")
+    closes = load_closes(symbols + ["MISSING"], "2y", cache=cache, provider=provider)
+    assert closes.columns.tolist() == symbols
+    assert closes.index.is_monotonic_increasing
+    assert closes.index[0] >= closes.index[-1] - pd.DateOffset(years=2)
+    for symbol in symbols:
+        history = provider.history(symbol)["close"]
+        pd.testing.assert_series_equal(
+            closes[symbol].dropna(),
+            history[closes.index[0] :],
+            check_names=False,
+            check_freq=False,
+        )
+
+    store = PriceStore(tmp_path / "prices")
+    stored = load_closes(
+        symbols + ["MISSING"], "2y", cache=cache, provider=provider, price_store=store
+    )
+    assert store.symbols == symbols
+    pd.testing.assert_frame_equal(
+        stored.dropna(how="all"), closes, check_freq=False, check_column_type=False
+    )
+
+
+def test_compare_relative_pdf(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    comparison = compare_relative(
+        provider.symbols(),
+        "1y",
+        show_figures=False,
+        save_to_pdf=True,
+        output_dir=tmp_path,
+        cache=DataCache(tmp_path / "cache"),
+        provider=provider,
+    )
+    assert (tmp_path / "relative_comparison.pdf").stat().st_size > 0
+    assert comparison.relative.columns.tolist() == provider.symbols()
+
+
+def test_compare_cli(tmp_path, capsys):
+    args = ["SYN-A", "SYN-B", "--compare", "--period", "1y", "--replay"]
+    assert main(args + [str(RECORDINGS), "-o", str(tmp_path)]) == 0
+    assert (tmp_path / "relative_comparison.pdf").exists()
+    assert "total_return" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main(["SYN-A", "--compare", "--period", "5years"])
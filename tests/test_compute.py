@@ -0,0 +1,41 @@
+# tests/test_compute.py
+import subprocess
+import sys
+
+import numpy as np
+from stock_analysis import AnalysisResult, compute_stock_analysis, make_stock_analysis
+
+
+def test_compute_stock_analysis(synthetic_cache):
+    result = compute_stock_analysis("AAA", cache=synthetic_cache)
+
+    assert isinstance(result, AnalysisResult)
+    assert len(result.price_phases) == 3
+    assert result.revenue_phases and result.cash_flow_phases
+    assert result.fair_value.index.is_monotonic_increasing
+    assert result.live_kgv.index.equals(result.live_kgv_bounded.index)
+
+    metrics = result.metrics()
+    assert metrics["kgv"] == result.kgv
+    assert np.isfinite(metrics["price_to_fair_value"])
+
+
+def test_compute_does_not_import_matplotlib():
+    code = (
+        "import sys\n"
+        "from stock_analysis import compute_stock_analysis\n"
+        "assert 'matplotlib' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_make_stock_analysis_offline(synthetic_cache, tmp_path):
+    filename = make_stock_analysis(
+        "BBB",
+        show_figures=False,
+        save_to_pdf=True,
+        cache=synthetic_cache,
+        output_dir=tmp_path,
+    )
+    assert filename == tmp_path / "BBB.pdf"
+    assert filename.stat().st_size > 0
@@ -0,0 +1,138 @@
+# tests/test_data_cache.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from stock_analysis.DataCache import DataCache
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(
+        {"close": [1.0, 2.0, 3.0]}, pd.date_range("2020-01-01", periods=3)
+    )
+
+
+def test_fetch_uses_cached_frame(tmp_path, frame):
+    cache = DataCache(tmp_path)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return frame
+
+    first = cache.fetch("AAPL", "history", "20y-1d", "prices", fetch)
+    second = cache.fetch("AAPL", "history", "20y-1d", "prices", fetch)
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second, check_freq=False)
+
+
+def test_refresh_and_ttl(tmp_path, frame):
+    cache = DataCache(tmp_path)
+    cache.store("AAPL", "history", "20y-1d", frame)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return frame
+
+    cache.fetch("AAPL", "history", "20y-1d", "prices", fetch, refresh=True)
+    assert len(calls) == 1
+
+    # age the entry beyond the price TTL, but not beyond the fundamentals TTL
+    path = tmp_path / "AAPL" / "history_20y-1d.parquet"
+    two_days_ago = time.time() - 2 * 24 * 3600
+    os.utime(path, (two_days_ago, two_days_ago))
+    assert cache.load("AAPL", "history", "20y-1d", "fundamentals") is not None
+    assert cache.load("AAPL", "history", "20y-1d", "prices") is None
+    assert cache.load("AAPL", "history", "20y-1d") is not None
+
+
+def test_json_entries(tmp_path):
+    cache = DataCache(tmp_path)
+    trend = [{"period": "0y", "earningsEstimate": {"avg": 1.5}}]
+    cache.store("MC.PA", "earnings_trend", "current", trend)
+    assert cache.load("MC.PA", "earnings_trend", "current", "estimates") == trend
+
+
+def test_eviction_removes_least_recently_used(tmp_path, frame):
+    cache = DataCache(tmp_path)
+    cache.store("A", "history", "20y-1d", frame)
+    entry_size = cache.size()
+    cache.max_bytes = 2 * entry_size
+
+    cache.store("B", "history", "20y-1d", frame)
+    # make A the oldest accessed entry
+    path_a = tmp_path / "A" / "history_20y-1d.parquet"
+    os.utime(path_a, (time.time() - 100, path_a.stat().st_mtime))
+    cache.store("C", "history", "20y-1d", frame)
+
+    assert cache.load("A", "history", "20y-1d") is None
+    assert cache.load("B", "history", "20y-1d") is not None
+    assert cache.load("C", "history", "20y-1d") is not None
+
+
+def test_concurrent_stores_of_the_same_entry(tmp_path, frame):
+    # e.g. the service analysing symbols with overlapping peers
+    cache = DataCache(tmp_path)
+
+    def store_and_load(_):
+        for _ in range(30):
+            cache.store("A", "history", "20y-1d", frame)
+            pd.testing.assert_frame_equal(
+                cache.load("A", "history", "20y-1d"), frame, check_freq=False
+            )
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(store_and_load, range(4)))
+    assert [path.name for path in (tmp_path / "A").iterdir()] == [
+        "history_20y-1d.parquet"
+    ]
+
+
+def test_unsafe_names_do_not_collide(tmp_path, frame):
+    cache = DataCache(tmp_path)
+    cache.store("BRK/B", "history", "20y-1d", frame)
+    assert cache.load("BRK_B", "history", "20y-1d") is None
+    cache.store("BRK_B", "history", "20y-1d", frame.iloc[:1])
+    assert len(cache.load("BRK/B", "history", "20y-1d")) == 3
+    # safe names are kept, e.g. of existing caches and recordings
+    assert (tmp_path / "BRK_B" / "history_20y-1d.parquet").exists()
+
+
+def test_load_of_an_evicted_entry_is_a_miss(tmp_path, frame, monkeypatch):
+    cache = DataCache(tmp_path)
+    cache.store("A", "history", "20y-1d", frame)
+    path = tmp_path / "A" / "history_20y-1d.parquet"
+    read_parquet = pd.read_parquet
+
+    def evicted_meanwhile(file, *args, **kwargs):
+        path.unlink()
+        return read_parquet(file, *args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_parquet", evicted_meanwhile)
+    assert cache.load("A", "history", "20y-1d") is None
+
+
+def test_size_is_counted_without_scans(tmp_path, frame, monkeypatch):
+    cache = DataCache(tmp_path)
+    cache.store("A", "history", "20y-1d", frame)
+    scans = []
+    entries = DataCache._entries
+    monkeypatch.setattr(
+        DataCache, "_entries", lambda self: scans.append(1) or entries(self)
+    )
+    for symbol in "BCD":
+        cache.store(symbol, "history", "20y-1d", frame)
+    cache.store("A", "history", "20y-1d", frame)  # replaced, same size
+    assert scans == []
+    entry_size = (tmp_path / "A" / "history_20y-1d.parquet").stat().st_size
+    assert cache._size == 4 * entry_size
+    assert cache._size == cache.size()
+
+    cache.max_bytes = cache._size - 1
+    cache.store("E", "history", "20y-1d", frame)
+    assert scans and cache._size == cache.size() <= cache.max_bytes
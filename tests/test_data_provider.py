@@ -0,0 +1,78 @@
+# tests/test_data_provider.py
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import (
+    DataProvider,
+    RecordedProvider,
+    SyntheticProvider,
+    record_stock_data,
+)
+from stock_analysis.StockData import StockData
+
+
+def test_synthetic_data_is_deterministic():
+    first = SyntheticProvider(end="2025-06-30")
+    second = SyntheticProvider(end="2025-06-30")
+    pdt.assert_frame_equal(first.history("AAA"), second.history("AAA"))
+    assert first.earnings_trend("AAA") == second.earnings_trend("AAA")
+    assert not first.history("AAA").equals(first.history("BBB"))
+    assert not first.history("AAA").equals(SyntheticProvider(seed=1).history("AAA"))
+
+
+def test_synthetic_layout_and_stress_size():
+    provider = SyntheticProvider(end="2025-06-30", fundamental_years=40)
+    statement = provider.statement("AAA", "income_stmt_period", 1990, 2025)
+    assert list(statement["AAA"]) == ["Total Revenue", "Net Income"]
+    years = [int(year) for year in statement.columns[1:]]
+    assert years == sorted(years, reverse=True) and years[-1] >= 1990
+
+    history = provider.history("AAA", years=100)
+    assert len(history) > 100 * 250
+    assert history.index[-1] <= pd.Timestamp("2025-06-30")
+    assert (history["close"] > 0).all()
+    recent = provider.history("AAA", start=pd.Timestamp("2025-01-01"))
+    assert recent.index[0] >= pd.Timestamp("2025-01-01")
+
+
+def test_recorded_replay(tmp_path):
+    synthetic = SyntheticProvider(end="2025-06-30")
+    record_stock_data("AAA", tmp_path / "recordings", synthetic)
+    recorded = RecordedProvider(tmp_path / "recordings")
+
+    assert recorded.symbols() == ["AAA"]
+    pdt.assert_frame_equal(
+        recorded.history("AAA"), synthetic.history("AAA"), check_freq=False
+    )
+    assert recorded.earnings_trend("AAA") == synthetic.earnings_trend("AAA")
+
+    cache = DataCache(tmp_path / "cache")
+    replayed = StockData("AAA", cache=cache, provider=recorded)
+    generated = StockData("AAA", cache=cache, provider=synthetic)
+    pdt.assert_series_equal(replayed.fq_eps, generated.fq_eps)
+    pdt.assert_series_equal(
+        replayed.history_20y, generated.history_20y, check_freq=False
+    )
+    # only live data is cached
+    assert not (tmp_path / "cache").exists()
+
+
+def test_recorded_symbols_with_unsafe_names(tmp_path):
+    synthetic = SyntheticProvider(end="2025-06-30")
+    for symbol in ["BRK/B", "BRK_B"]:
+        record_stock_data(symbol, tmp_path, synthetic)
+    recorded = RecordedProvider(tmp_path)
+    assert recorded.symbols() == ["BRK/B", "BRK_B"]
+    pdt.assert_frame_equal(
+        recorded.history("BRK/B"), synthetic.history("BRK/B"), check_freq=False
+    )
+
+
+def test_incomplete_provider_can_not_be_created():
+    class HistoryOnly(DataProvider):
+        def history(self, symbol, start=None, years=20):
+            return SyntheticProvider().history(symbol, start, years)
+
+    with pytest.raises(TypeError, match="abstract"):
+        HistoryOnly()
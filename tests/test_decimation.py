@@ -0,0 +1,62 @@
+# tests/test_decimation.py
+import numpy as np
+import pandas as pd
+from stock_analysis.decimation import decimate_frame, decimate_series, lttb
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(5000.0)
+    y = np.sin(x / 300)
+    y[1234] = 10.0  # a single spike must survive
+    kept = lttb(x, y, 500)
+
+    assert len(kept) == 500
+    assert kept[0] == 0 and kept[-1] == 4999
+    assert np.all(np.diff(kept) > 0)
+    assert 1234 in kept
+
+
+def test_decimate_series_keeps_extremes_and_gaps():
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2005-01-01", periods=5000)
+    series = pd.Series(100 * np.exp(np.cumsum(0.01 * rng.standard_normal(5000))), index)
+    series.iloc[3000:3100] = np.nan
+
+    decimated = decimate_series(series, 1000)
+
+    assert len(decimated) < 1100
+    assert decimated.index.is_monotonic_increasing
+    assert decimated.max() == series.max()
+    assert decimated.min() == series.min()
+    assert decimated.index[0] == series.index[0]
+    assert decimated.index[-1] == series.index[-1]
+    # the gap is still drawn as a gap, by its first NaN
+    assert decimated.isna().sum() == 1
+    assert np.isnan(decimated.loc[series.index[3000]])
+
+
+def test_short_series_is_unchanged():
+    series = pd.Series([1.0, 2.0, 3.0])
+    assert decimate_series(series, 10) is series
+
+
+def test_lttb_many_lines_like_single_lines():
+    rng = np.random.default_rng(5)
+    x = np.arange(3000.0)
+    y = rng.normal(size=(3000, 4)).cumsum(axis=0)
+    kept = lttb(x, y, 300)
+
+    assert kept.shape == (300, 4)
+    for j in range(4):
+        np.testing.assert_array_equal(kept[:, j], lttb(x, y[:, j], 300))
+
+
+def test_decimate_frame_like_decimate_series():
+    index = pd.bdate_range("2000-01-01", periods=3000)
+    frame = pd.DataFrame(
+        np.random.default_rng(6).normal(size=(3000, 3)).cumsum(axis=0), index
+    )
+    frame.iloc[:100, 2] = np.nan  # decimated on its own
+
+    for column, series in zip(frame, decimate_frame(frame, 400)):
+        assert series.index.equals(decimate_series(frame[column], 400).index)
@@ -0,0 +1,155 @@
+# tests/test_export.py
+import json
+import re
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+import pandas as pd
+import pytest
+from stock_analysis import compute_stock_analysis, export_report, make_stock_analysis
+from stock_analysis.analysis import _charts
+from stock_analysis.cli import main
+from stock_analysis.DataProvider import RecordedProvider
+from stock_analysis.export import (
+    plotted_series,
+    render_chart,
+    render_page,
+    report_pages,
+)
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+@pytest.fixture(scope="module")
+def result():
+    return compute_stock_analysis("SYN-A", provider=RecordedProvider(RECORDINGS))
+
+
+def pdf_pages(path: Path) -> int:
+    return len(re.findall(rb"/Type\s*/Page\b", path.read_bytes()))
+
+
+def test_report_pages_match_the_report(result, tmp_path):
+    pages = report_pages(result)
+    assert sorted(chart for page in pages for chart in page) == list(
+        range(len(_charts(result)))
+    )
+    assert all(1 <= len(page) <= 4 for page in pages)
+    filename = make_stock_analysis(
+        "SYN-A",
+        show_figures=False,
+        save_to_pdf=True,
+        output_dir=tmp_path,
+        provider=RecordedProvider(RECORDINGS),
+    )
+    assert pdf_pages(filename) == len(pages)
+
+
+def test_export_all_formats(result, tmp_path):
+    manifest_path = export_report(result, tmp_path, workers=2, max_points=500)
+    folder = tmp_path / "SYN-A"
+    assert manifest_path == folder / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    assert manifest["symbol"] == "SYN-A"
+    assert manifest["inputs_hash"] == result.inputs_hash
+
+    files = manifest["files"]
+    for entry in files:
+        assert (folder / entry["path"]).stat().st_size == entry["bytes"] > 0
+    by_format = {}
+    for entry in files:
+        by_format.setdefault(entry["format"], []).append(entry)
+    charts = _charts(result)
+    assert len(by_format["png"]) == len(by_format["svg"]) == len(charts)
+    assert [entry["title"] for entry in by_format["png"]] == [c[0] for c in charts]
+    assert (folder / by_format["png"][0]["path"]).read_bytes().startswith(b"\x89PNG")
+    assert b"<svg" in (folder / by_format["svg"][0]["path"]).read_bytes()
+    assert by_format["pdf"][0]["pages"] == pdf_pages(folder / "report.pdf")
+    assert not list(folder.glob(".pages*"))
+
+    series = pd.read_parquet(folder / "data" / "series.parquet")
+    close = series[series["series"] == "close"]
+    assert close["value"].tolist() == result.history.tolist()
+    assert {"ema.EMA50", "valuation.KGV.fair_value_fine"} <= set(series["series"])
+    data = json.loads((folder / "data" / "report.json").read_text())
+    assert data["metrics"]["kgv"] == pytest.approx(result.kgv)
+    assert len(data["growth_phases"]["price"]) == 3
+
+
+def test_export_in_process(result, tmp_path):
+    manifest = json.loads(
+        export_report(result, tmp_path, ["png", "data"], workers=1).read_text()
+    )
+    assert {entry["format"] for entry in manifest["files"]} == {
+        "png",
+        "parquet",
+        "json",
+    }
+    assert manifest["workers"] == 1
+    with pytest.raises(ValueError, match="Unknown export formats"):
+        export_report(result, tmp_path, ["gif"])
+
+
+def test_merged_pdf_pages(result, tmp_path):
+    # pypdf is in requirements_dev.txt, without it the pages are not merged
+    import pypdf
+
+    export_report(result, tmp_path, ["pdf"], workers=2)
+    reader = pypdf.PdfReader(tmp_path / "SYN-A" / "report.pdf")
+    charts = _charts(result)
+    pages = report_pages(result)
+    assert len(reader.pages) == len(pages)
+    # merged in page order, the windows are numbered across the pages
+    for number, (page, charts_of_page) in enumerate(zip(reader.pages, pages), 1):
+        full = charts[charts_of_page[0]][1]
+        window = f"Full View {number}" if full else f"Grid {number}"
+        assert window in page.extract_text()
+    assert not list((tmp_path / "SYN-A").glob(".pages*"))
+
+
+def test_failed_export_leaves_no_pages(result, tmp_path, monkeypatch):
+    from stock_analysis import analysis
+
+    def broken_chart(plot_manager, ax, result):
+        raise RuntimeError("broken chart")
+
+    monkeypatch.setattr(analysis, "_plot_revenue", broken_chart)
+    with pytest.raises(RuntimeError, match="broken chart"):
+        export_report(result, tmp_path, ["pdf"], workers=1)
+    assert not list((tmp_path / "SYN-A").glob(".pages*"))
+
+
+def test_failed_chart_leaves_no_figures(result, tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+    from stock_analysis import analysis
+
+    def broken_chart(plot_manager, ax, result):
+        raise RuntimeError("broken chart")
+
+    plt.close("all")
+    monkeypatch.setattr(analysis, "_plot_revenue", broken_chart)
+    chart = [plot for _, _, plot in _charts(result)].index(broken_chart)
+    page = next(i for i, page in enumerate(report_pages(result)) if chart in page)
+    with pytest.raises(RuntimeError):
+        render_chart(result, chart)
+    with pytest.raises(RuntimeError):
+        render_page(result, page, report_pages(result)[page], tmp_path / "page.pdf")
+    assert plt.get_fignums() == []
+    assert not (tmp_path / "page.pdf").exists()
+
+
+def test_plotted_series(result):
+    series = plotted_series(result)
+    assert series.columns.tolist() == ["series", "date", "value"]
+    revenue = series[series["series"] == "revenue"]
+    assert revenue["value"].tolist() == result.revenue.tolist()
+
+
+def test_export_cli(tmp_path):
+    args = ["SYN-B", "--replay", str(RECORDINGS), "-o", str(tmp_path), "-j", "1"]
+    assert main(args + ["--export", "svg,data"]) == 0
+    assert (tmp_path / "SYN-B" / "manifest.json").exists()
+    with pytest.raises(SystemExit):
+        main(args + ["--export", "pdf,gif"])
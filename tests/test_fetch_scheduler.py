@@ -0,0 +1,297 @@
+# tests/test_fetch_scheduler.py
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pandas as pd
+import pytest
+from stock_analysis.DataProvider import LiveProvider, YahooError, yahoo_data
+from stock_analysis.FetchScheduler import (
+    FETCH_STATS_COLUMNS,
+    FetchScheduler,
+    TokenBucket,
+    is_retryable,
+    retry_after,
+)
+
+
+class StandIn(ThreadingHTTPServer):
+    """Local stand-in of a data source, with latency and injected errors
+
+    Paths:
+    - /ok/<name>: 200
+    - /fail/<status>/<count>/<name>: <status> for the first <count> requests
+      of the path, then 200
+    Every response is delayed by `latency` seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.hits: dict[str, int] = {}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            hits = server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.latency)
+        with server.lock:
+            server.active -= 1
+
+        status = 200
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "fail" and hits <= int(parts[2]):
+            status = int(parts[1])
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(self.path.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StandIn()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(url: str) -> str:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read().decode()
+
+
+def scheduler(**kwargs) -> FetchScheduler:
+    options = dict(rates={}, default_rate=1000, burst=1000, backoff=0.01)
+    options.update(kwargs)
+    return FetchScheduler(**options)
+
+
+def test_retries_throttling_and_server_errors(server):
+    fetcher = scheduler()
+    for status in [429, 500, 503]:
+        path = f"/fail/{status}/2/a"
+        assert fetcher.call("stand-in", lambda: get(server.url(path))) == path
+        assert server.hits[path] == 3
+    stats = fetcher.stats().loc["stand-in"]
+    assert stats["completed"] == 3 and stats["retries"] == 6 and stats["failed"] == 0
+    assert "503" in stats["last_error"]
+    assert fetcher.stats().columns.tolist() == FETCH_STATS_COLUMNS
+
+
+def test_no_retry_of_client_errors(server):
+    fetcher = scheduler()
+    with pytest.raises(HTTPError) as error:
+        fetcher.call("stand-in", lambda: get(server.url("/fail/404/1/a")))
+    assert error.value.code == 404
+    assert server.hits["/fail/404/1/a"] == 1
+    assert fetcher.counters() == {
+        "requests": 1,
+        "retries": 0,
+        "deduplicated": 0,
+        "failed": 1,
+    }
+
+
+def test_gives_up_after_max_retries(server):
+    fetcher = scheduler(max_retries=2)
+    with pytest.raises(HTTPError):
+        fetcher.call("stand-in", lambda: get(server.url("/fail/503/10/a")))
+    assert server.hits["/fail/503/10/a"] == 3
+    assert fetcher.counters()["retries"] == 2
+
+
+def test_backoff_grows_exponentially(server, monkeypatch):
+    delays = []
+
+    class Time:  # the server thread keeps the real time.sleep
+        monotonic = staticmethod(time.monotonic)
+        time = staticmethod(time.time)
+        sleep = staticmethod(delays.append)
+
+    monkeypatch.setattr("stock_analysis.FetchScheduler.time", Time)
+    fetcher = scheduler(backoff=1.0, max_backoff=3.0)
+    fetcher.call("stand-in", lambda: get(server.url("/fail/503/4/a")))
+    assert len(delays) == 4
+    for delay, full in zip(delays, [1.0, 2.0, 3.0, 3.0]):
+        assert full / 2 <= delay <= full
+
+
+def test_deduplicates_in_flight_requests(server):
+    server.latency = 0.2
+    fetcher = scheduler()
+    with ThreadPoolExecutor(5) as executor:
+        results = list(
+            executor.map(
+                lambda _: fetcher.call(
+                    "stand-in", lambda: get(server.url("/ok/a")), key="a"
+                ),
+                range(5),
+            )
+        )
+    assert results == ["/ok/a"] * 5
+    assert server.hits["/ok/a"] == 1
+    assert fetcher.counters()["deduplicated"] == 4
+    # later requests with the same key are sent again
+    fetcher.call("stand-in", lambda: get(server.url("/ok/a")), key="a")
+    assert server.hits["/ok/a"] == 2
+
+
+def test_deduplicated_requests_share_errors(server):
+    server.latency = 0.2
+    fetcher = scheduler()
+
+    def call(_):
+        try:
+            fetcher.call("stand-in", lambda: get(server.url("/fail/404/9/a")), key=1)
+        except HTTPError as e:
+            return e.code
+
+    with ThreadPoolExecutor(3) as executor:
+        assert list(executor.map(call, range(3))) == [404] * 3
+    assert server.hits["/fail/404/9/a"] == 1
+
+
+def test_concurrency_limit(server):
+    server.latency = 0.1
+    fetcher = scheduler(max_concurrency=2)
+    with ThreadPoolExecutor(8) as executor:
+        list(
+            executor.map(
+                lambda i: fetcher.call("stand-in", lambda: get(server.url(f"/ok/{i}"))),
+                range(8),
+            )
+        )
+    assert server.max_active == 2
+
+
+def test_rate_limit_per_host(server):
+    fetcher = scheduler(rates={"slow": 20.0}, burst=1)
+    start = time.perf_counter()
+    for i in range(6):
+        fetcher.call("slow", lambda: get(server.url(f"/ok/{i}")))
+        fetcher.call("fast", lambda: get(server.url(f"/ok/{i}")))
+    elapsed = time.perf_counter() - start
+    # 5 waits of 1/20 s for the slow host, none for the other one
+    assert elapsed >= 0.24
+    stats = fetcher.stats()
+    assert stats.loc["slow", "throttled"] >= 0.2
+    assert stats.loc["fast", "throttled"] == 0
+    assert stats.loc["slow", "throughput"] <= 25
+
+
+def test_shared_rates():
+    fetcher = FetchScheduler(rates={"yahoo": 4.0}, burst=4, max_concurrency=8, share=4)
+    assert fetcher.rates == {"yahoo": 1.0}
+    assert fetcher.burst == 1 and fetcher.max_concurrency == 2
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() > 0
+
+
+def test_retryable_errors(server):
+    class ConnectionError(OSError):  # like requests.exceptions.ConnectionError
+        pass
+
+    assert is_retryable(ConnectionError())
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(ValueError())
+    with pytest.raises(HTTPError) as error:
+        get(server.url("/fail/429/1/a"))
+    assert is_retryable(error.value) and retry_after(error.value) == 0
+
+
+def test_live_provider_uses_scheduler():
+    class FlakyTicker:
+        calls = 0
+
+        @property
+        def earnings_trend(self):
+            FlakyTicker.calls += 1
+            if FlakyTicker.calls == 1:
+                raise TimeoutError("read timed out")
+            return {"AAA": {"trend": [{"period": "0y"}]}}
+
+    fetcher = scheduler()
+    provider = LiveProvider(scheduler=fetcher)
+    provider.ticker = lambda symbol: FlakyTicker()
+    assert provider.earnings_trend("AAA") == [{"period": "0y"}]
+    assert fetcher.counters()["retries"] == 1
+
+
+def test_live_provider_retries_yahoo_error_payloads():
+    dates = [pd.Timestamp("2024-01-02").date(), pd.Timestamp("2024-01-03").date()]
+    history = pd.DataFrame(
+        {"close": [1.0, 2.0]},
+        pd.MultiIndex.from_product([["AAA"], dates], names=["symbol", "date"]),
+    )
+    # yahooquery returns these instead of raising, e.g. when throttled
+    failures = {
+        "earnings_trend": [{"error": "HTTP 404 Not Found.  Please try again"}],
+        "income_statement": [{"AAA": "Too Many Requests"}] * 2,
+        # indexing {"error": ...} by symbol, then a frame without the symbol
+        "history": [KeyError("AAA"), history.iloc[:0]],
+    }
+
+    class ThrottledTicker:
+        def respond(self, method, data):
+            if not failures[method]:
+                return data
+            failure = failures[method].pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+
+        @property
+        def earnings_trend(self):
+            return self.respond(
+                "earnings_trend", {"AAA": {"trend": [{"period": "0y"}]}}
+            )
+
+        def income_statement(self, trailing=True):
+            return self.respond("income_statement", pd.DataFrame({"BasicEPS": [1.0]}))
+
+        def history(self, **kwargs):
+            return self.respond("history", history)
+
+    fetcher = scheduler()
+    provider = LiveProvider(scheduler=fetcher)
+    provider.ticker = lambda symbol: ThrottledTicker()
+    assert provider.earnings_trend("AAA") == [{"period": "0y"}]
+    assert provider.income_statement("AAA")["BasicEPS"].tolist() == [1.0]
+    assert provider.history("AAA")["close"].tolist() == [1.0]
+    assert fetcher.counters()["retries"] == 5
+
+
+def test_yahoo_error_status():
+    assert is_retryable(YahooError("AAA", "HTTP 404 Not Found.  Please try again"))
+    assert is_retryable(YahooError("AAA", "Too Many Requests"))
+    assert not is_retryable(YahooError("AAA", "Quote not found for ticker symbol"))
+    with pytest.raises(YahooError, match="No data found"):
+        yahoo_data({"AAA": "No data found"}, "AAA", "trend")
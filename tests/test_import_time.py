@@ -0,0 +1,50 @@
+# tests/test_import_time.py
+import json
+import subprocess
+import sys
+
+# generous budget, a cold import of the heavy libraries takes well over a second
+IMPORT_BUDGET_SECONDS = 0.5
+HEAVY_MODULES = ["matplotlib", "scipy", "yahooquery", "finqual"]
+
+
+def _import_in_subprocess(statement: str) -> dict:
+    """Time an import in a fresh interpreter and list the heavy modules it loaded"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "duration = time.perf_counter() - start\n"
+        f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'duration': duration, 'loaded': loaded}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_package_and_cli_import_fast():
+    # best of three, the first run may suffer from a cold file system cache
+    runs = [
+        _import_in_subprocess("import stock_analysis, stock_analysis.cli")
+        for _ in range(3)
+    ]
+    assert runs[0]["loaded"] == []
+    assert min(run["duration"] for run in runs) < IMPORT_BUDGET_SECONDS
+
+
+def test_compute_does_not_import_heavy_modules():
+    run = _import_in_subprocess("import stock_analysis.compute")
+    assert run["loaded"] == []
+
+
+def test_cli_help_does_not_import_heavy_modules():
+    run = _import_in_subprocess(
+        "from stock_analysis.cli import main\n"
+        "try:\n"
+        "    main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+    assert run["loaded"] == []
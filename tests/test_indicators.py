@@ -0,0 +1,80 @@
+# tests/test_indicators.py
+import numpy as np
+import pandas as pd
+from stock_analysis.indicators import (
+    ema,
+    rainbow_ema,
+    rolling_growth,
+    rolling_growth_frame,
+)
+
+
+def _prices(rng, shape):
+    return 50 * np.exp(np.cumsum(rng.normal(0.0005, 0.01, shape), axis=0))
+
+
+def test_rolling_growth_matches_regression():
+    rng = np.random.default_rng(0)
+    prices = _prices(rng, (400, 3))
+    times = np.cumsum(rng.uniform(0.5, 1.5, 400)) / 252  # irregular spacing
+    windows = [20, 100]
+    growth = rolling_growth(prices, windows, times)
+
+    assert growth.shape == (2, 400, 3)
+    for i, window in enumerate(windows):
+        assert np.isnan(growth[i, : window - 1]).all()
+        for bar in [window - 1, 250, 399]:
+            for symbol in range(3):
+                span = slice(bar - window + 1, bar + 1)
+                slope = np.polyfit(times[span], np.log(prices[span, symbol]), 1)[0]
+                np.testing.assert_allclose(
+                    growth[i, bar, symbol], np.expm1(slope) * 100, rtol=1e-8
+                )
+
+    # a single symbol gives the same as a column of many
+    np.testing.assert_allclose(
+        rolling_growth(prices[:, 1], windows, times), growth[:, :, 1]
+    )
+
+
+def test_rolling_growth_invalid_values():
+    prices = _prices(np.random.default_rng(1), 300)
+    prices[100] = np.nan
+    prices[200] = -1.0
+    growth = rolling_growth(prices, [10])[0]
+
+    assert np.isnan(growth[100:110]).all() and np.isnan(growth[200:210]).all()
+    assert np.isfinite(growth[110:200]).all() and np.isfinite(growth[210:]).all()
+
+
+def test_rolling_growth_frame_constant_growth():
+    index = pd.bdate_range("2010-01-01", "2020-12-31")
+    years = (index - index[0]) / pd.Timedelta(days=365.25)
+    series = pd.Series(100 * 1.1 ** np.asarray(years), index)
+    frame = rolling_growth_frame(series)
+
+    assert list(frame.columns) == ["1y", "3y", "5y"]
+    assert frame.index.equals(series.index)
+    np.testing.assert_allclose(frame["5y"].dropna(), 10.0)
+    assert frame["5y"].isna().sum() > frame["1y"].isna().sum()
+
+
+def test_ema_matches_pandas():
+    prices = _prices(np.random.default_rng(2), (1000, 2))
+    spans = [10, 55, 200]
+    emas = ema(prices, spans)
+
+    assert emas.shape == (3, 1000, 2)
+    for i, span in enumerate(spans):
+        expected = pd.DataFrame(prices).ewm(span=span, adjust=False).mean()
+        np.testing.assert_allclose(emas[i], expected.to_numpy(), rtol=1e-12)
+
+
+def test_rainbow_ema_frame():
+    series = pd.Series(
+        _prices(np.random.default_rng(3), 300),
+        pd.bdate_range("2020-01-01", periods=300),
+    )
+    frame = rainbow_ema(series, [10, 20])
+    assert list(frame.columns) == ["EMA10", "EMA20"]
+    assert frame.index.equals(series.index)
@@ -0,0 +1,126 @@
+# tests/test_peers.py
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compare_peers, compute_stock_analysis
+from stock_analysis.analysis import _charts, make_stock_analysis
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import RecordedProvider, SyntheticProvider
+from stock_analysis.peers import PEER_FIGURES, find_peers
+from stock_analysis.timing import TimingRecorder, timing_hook
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+@pytest.fixture(scope="module")
+def comparison(tmp_path_factory):
+    provider = RecordedProvider(RECORDINGS)
+    cache = DataCache(tmp_path_factory.mktemp("cache"))
+    result = compute_stock_analysis("SYN-A", cache=cache, provider=provider)
+    return result, compare_peers(result, cache=cache, provider=provider)
+
+
+def test_compare_peers(comparison, tmp_path):
+    result, comparison = comparison
+    assert comparison.symbol == "SYN-A"
+    assert comparison.figures.index.tolist() == ["SYN-A", "SYN-B", "SYN-C", "SYN-D"]
+    assert comparison.figures.columns.tolist() == PEER_FIGURES
+    assert comparison.peers.index.tolist() == ["SYN-B", "SYN-C", "SYN-D"]
+    assert list(comparison.errors) == ["MISSING"]
+    metrics = result.metrics()
+    for figure in PEER_FIGURES:
+        assert comparison.figures.loc["SYN-A", figure] == metrics[figure]
+    # the peers are analysed like the symbol
+    peer = compute_stock_analysis(
+        "SYN-B", cache=DataCache(tmp_path), provider=RecordedProvider(RECORDINGS)
+    )
+    assert comparison.figures.loc["SYN-B", "kgv"] == peer.kgv
+
+
+def test_peer_summary(comparison):
+    _, comparison = comparison
+    summary = comparison.summary()
+    assert summary.index.tolist() == PEER_FIGURES
+    peers = comparison.peers
+    np.testing.assert_allclose(summary["peer_median"], peers.median())
+    kgv = comparison.figures.loc["SYN-A", "kgv"]
+    assert summary.loc["kgv", "peers_below"] == pytest.approx(
+        (peers["kgv"] < kgv).mean() * 100
+    )
+
+
+def test_margins(comparison):
+    result, _ = comparison
+    metrics = result.metrics()
+    last = result.revenue.sort_index().index[-1]
+    assert metrics["net_margin"] == pytest.approx(
+        result.net_income[last] / result.revenue[last] * 100
+    )
+    assert 0 < metrics["cash_flow_margin"] < 100
+
+
+def test_find_peers_cached(tmp_path):
+    class CountingProvider(SyntheticProvider):
+        cached = True
+        calls = 0
+
+        def peers(self, symbol, n=10):
+            CountingProvider.calls += 1
+            return super().peers(symbol, n)
+
+    cache = DataCache(tmp_path)
+    provider = CountingProvider()
+    assert find_peers("XYZ", 3, cache=cache, provider=provider) == [
+        "XYZ.P1",
+        "XYZ.P2",
+        "XYZ.P3",
+    ]
+    assert find_peers("XYZ", 3, cache=cache, provider=provider) == [
+        "XYZ.P1",
+        "XYZ.P2",
+        "XYZ.P3",
+    ]
+    assert CountingProvider.calls == 1
+
+
+def test_report_with_peers(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    result = compute_stock_analysis(
+        "SYN-A", cache=DataCache(tmp_path / "cache"), provider=provider, peers=5
+    )
+    assert result.peers is not None
+    assert _charts(result)[-1][0] == "Peers: SYN-B, SYN-C, SYN-D"
+
+    # symbols without recorded peers get the report without the peer chart
+    result = compute_stock_analysis(
+        "SYN-B", cache=DataCache(tmp_path / "cache"), provider=provider, peers=5
+    )
+    assert result.peers is None
+    assert not _charts(result)[-1][0].startswith("Peers")
+
+    path = make_stock_analysis(
+        "SYN-A",
+        show_figures=False,
+        save_to_pdf=True,
+        cache=DataCache(tmp_path / "cache"),
+        output_dir=tmp_path,
+        provider=provider,
+        peers=5,
+    )
+    assert path.stat().st_size > 0
+
+
+def test_peers_skip_the_price_indicators(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    cache = DataCache(tmp_path)
+    result = compute_stock_analysis("SYN-A", cache=cache, provider=provider)
+    with timing_hook(TimingRecorder()) as recorder:
+        compare_peers(result, cache=cache, provider=provider)
+    names = {span.name for span in recorder.spans}
+    assert "compute.fair_value" in names
+    assert not names & {"compute.rainbow_ema", "compute.rolling_growth"}
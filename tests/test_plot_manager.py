@@ -0,0 +1,60 @@
+# tests/test_plot_manager.py
+import re
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from stock_analysis.PlotManager import PlotManager
+
+
+def _page_count(path) -> int:
+    return len(re.findall(rb"/Type\s*/Page\b", path.read_bytes()))
+
+
+def test_streaming_keeps_only_open_figures(tmp_path):
+    plt.close("all")
+    plot_manager = PlotManager(2, 2, filename=tmp_path / "report")
+
+    max_open = 0
+    for i in range(30):
+        # a full-size figure every 5th plot, interleaved with the grid windows
+        ax = plot_manager.next_axis(f"plot {i}", full=i % 5 == 0)
+        ax.plot([0, 1, 2], [i, i + 1, i], label="line")
+        max_open = max(max_open, len(plt.get_fignums()))
+    plot_manager.finalize(show=False)
+
+    # at most the open grid window plus the latest full-size figure
+    assert max_open <= 2
+    assert plt.get_fignums() == []
+    # 6 full-size figures and 24 grid plots in 6 windows
+    assert _page_count(tmp_path / "report.pdf") == 12
+
+
+def test_finalize_closes_figures(tmp_path):
+    plt.close("all")
+    plot_manager = PlotManager(2, 2)
+    for i in range(5):
+        plot_manager.next_axis(f"plot {i}").plot([0, 1], [0, i])
+    plot_manager.finalize(show=False, filename=tmp_path / "report.pdf")
+
+    assert plt.get_fignums() == []
+    assert _page_count(tmp_path / "report.pdf") == 2
+
+
+def test_plot_lines_decimates_every_column():
+    index = pd.bdate_range("2000-01-01", periods=5000)
+    frame = pd.DataFrame(
+        np.random.default_rng(0).normal(size=(5000, 3)).cumsum(axis=0), index
+    )
+    plot_manager = PlotManager(2, 2, max_points=500)
+    ax = plot_manager.next_axis("lines")
+    lines = plot_manager.plot_lines(ax, frame, label="band")
+
+    segments = lines.get_segments()
+    assert len(segments) == 3
+    assert all(len(segment) < 700 for segment in segments)
+    assert ax.get_legend_handles_labels()[1] == ["band"]
+    plot_manager.finalize(show=False)
@@ -0,0 +1,174 @@
+# tests/test_price_store.py
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compute_stock_analysis, screen_stocks
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import RecordedProvider
+from stock_analysis.PriceStore import MIN_DATE_CAPACITY, PriceStore
+from stock_analysis.StockData import StockData
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+def closes(symbols, start="2020-01-01", periods=100, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=periods)
+    return pd.DataFrame(
+        100 + rng.standard_normal((periods, len(symbols))).cumsum(axis=0),
+        dates,
+        symbols,
+    )
+
+
+def test_write_and_read(tmp_path):
+    store = PriceStore(tmp_path)
+    assert len(store) == 0 and store.values.shape == (0, 0)
+
+    data = closes(["AAA", "BBB", "CCC"])
+    store.write(data)
+    assert store.symbols == ["AAA", "BBB", "CCC"] and "BBB" in store
+    pd.testing.assert_frame_equal(store.frame(), data, check_freq=False)
+    pd.testing.assert_series_equal(
+        store.series("BBB", start="2020-02-01", end="2020-02-29"),
+        data["BBB"]["2020-02-01":"2020-02-29"],
+        check_freq=False,
+    )
+    pd.testing.assert_frame_equal(
+        store.frame(["CCC", "AAA"]), data[["CCC", "AAA"]], check_freq=False
+    )
+    assert store.age("AAA") < pd.Timedelta(minutes=1)
+    assert store.age("MISSING") == pd.Timedelta.max
+    with pytest.raises(KeyError, match="MISSING"):
+        store.frame(["AAA", "MISSING"])
+
+
+def test_reads_are_views(tmp_path):
+    store = PriceStore(tmp_path)
+    store.write(closes(["AAA", "BBB", "CCC"]))
+    assert np.shares_memory(store.frame().to_numpy(), store.values)
+    assert np.shares_memory(store.frame(["BBB", "CCC"]).to_numpy(), store.values)
+    assert np.shares_memory(store.series("AAA").to_numpy(), store.values)
+    assert not store.values.flags.writeable
+
+
+def test_meta_is_read_once_per_change(tmp_path, monkeypatch):
+    PriceStore(tmp_path).write(closes(["AAA", "BBB"]))
+    reader = PriceStore(tmp_path)
+    reads = []
+    read_text = Path.read_text
+    monkeypatch.setattr(
+        Path, "read_text", lambda path: reads.append(path) or read_text(path)
+    )
+    reader.frame(["BBB"], start="2020-02-01")
+    reader.series("AAA")
+    assert len(reader) == 2 and len(reads) == 1
+
+    # a write of another store is seen
+    PriceStore(tmp_path).write(closes(["CCC"], start="2020-06-01", seed=1))
+    reads.clear()
+    assert reader.symbols == ["AAA", "BBB", "CCC"] and len(reads) == 1
+    assert reader.series("CCC").notna().sum() == 100
+
+
+def test_append_in_place(tmp_path):
+    store = PriceStore(tmp_path)
+    data = closes(["AAA", "BBB"], periods=200)
+    store.write(data[:150])
+    generation = store._refresh()["generation"]
+
+    # new days, a new symbol and new closes of a stored symbol
+    store.write(data)
+    new = closes(["CCC"], start="2020-03-02", periods=50, seed=1)
+    store.write(new)
+    updated = data["AAA"] * 2
+    store.write(updated.to_frame())
+
+    assert store._refresh()["generation"] == generation
+    frame = store.frame()
+    assert frame.columns.tolist() == ["AAA", "BBB", "CCC"]
+    pd.testing.assert_series_equal(frame["AAA"], updated, check_freq=False)
+    pd.testing.assert_series_equal(frame["BBB"], data["BBB"], check_freq=False)
+    # symbols are NaN on days without a close
+    pd.testing.assert_series_equal(frame["CCC"].dropna(), new["CCC"], check_freq=False)
+    assert frame["CCC"].isna().sum() == len(data) - len(new)
+
+
+def test_insert_and_grow_copy(tmp_path):
+    store = PriceStore(tmp_path)
+    late = closes(["AAA"], start="2021-01-01")
+    store.write(late)
+    reader = PriceStore(tmp_path)
+    reader.frame()  # maps the first generation
+
+    # older days than the stored ones, and more days than the capacity
+    early = closes(["BBB"], start="2010-01-01", periods=MIN_DATE_CAPACITY, seed=1)
+    store.write(early)
+    assert store._refresh()["generation"] == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "closes.2.bin",
+        "dates.2.bin",
+        "meta.json",
+    ]
+    # a reader maps the new files on its next access
+    frame = reader.frame()
+    assert frame.index.is_monotonic_increasing
+    pd.testing.assert_series_equal(frame["AAA"].dropna(), late["AAA"], check_freq=False)
+    pd.testing.assert_series_equal(
+        frame["BBB"].dropna(), early["BBB"], check_freq=False
+    )
+
+
+def test_float32_and_pickle(tmp_path):
+    store = PriceStore(tmp_path, dtype="float32")
+    data = closes(["AAA", "BBB"])
+    store.write(data)
+    copy = pickle.loads(pickle.dumps(store))
+    assert copy.values.dtype == np.float32
+    np.testing.assert_allclose(copy.frame().to_numpy(), data.to_numpy(), rtol=1e-6)
+    # an existing store keeps its dtype
+    assert PriceStore(tmp_path).values.dtype == np.float32
+
+
+def test_update_and_stock_data(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    symbols = provider.symbols()
+    cache = DataCache(tmp_path / "cache")
+    store = PriceStore(tmp_path / "prices")
+    assert store.update(symbols, cache, provider) == symbols
+    assert store.update(symbols, cache, provider) == []
+    assert store.symbols == symbols
+
+    class NoHistory(RecordedProvider):
+        def history(self, *args, **kwargs):
+            raise AssertionError("the history must come from the store")
+
+    for symbol in symbols:
+        expected = StockData(symbol, cache=cache, provider=provider)
+        stock = StockData(
+            symbol, cache=cache, provider=NoHistory(RECORDINGS), price_store=store
+        )
+        pd.testing.assert_series_equal(
+            stock.history_20y, expected.history_20y, check_freq=False
+        )
+
+    result = compute_stock_analysis(
+        symbols[0], cache=cache, provider=NoHistory(RECORDINGS), price_store=store
+    )
+    assert np.isfinite(result.metrics()["price"])
+
+
+def test_screen_with_price_store(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    symbols = provider.symbols()
+    cache = DataCache(tmp_path / "cache")
+    store = PriceStore(tmp_path / "prices")
+    screen = screen_stocks(
+        symbols, workers=2, cache=cache, provider=provider, price_store=store
+    )
+    expected = screen_stocks(symbols, workers=2, cache=cache, provider=provider)
+    assert store.symbols == symbols
+    pd.testing.assert_frame_equal(screen, expected)
@@ -0,0 +1,138 @@
+# tests/test_result_cache.py
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compute_stock_analysis, make_stock_analysis
+from stock_analysis.cli import main
+from stock_analysis.DataProvider import RecordedProvider
+from stock_analysis.ResultCache import (
+    ResultCache,
+    input_hash,
+    input_hash_path,
+    is_current,
+)
+from stock_analysis.timing import TimingRecorder, timing_hook
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+def test_input_hash():
+    dates = pd.date_range("2024-01-01", periods=5)
+    series = pd.Series(np.arange(5.0), dates, name="close")
+    assert input_hash(series) == input_hash(series.copy())
+    assert input_hash(series) != input_hash(series.rename("open"))
+    assert input_hash(series) != input_hash(series.shift(1, freq="D"))
+    changed = series.copy()
+    changed.iloc[-1] += 0.01
+    assert input_hash(series) != input_hash(changed)
+
+    frame = series.to_frame()
+    assert input_hash(frame) == input_hash(frame.copy())
+    assert input_hash(frame) != input_hash(frame.rename(columns={"close": "x"}))
+    assert input_hash({"a": 1, "b": [1, 2]}) == input_hash({"b": [1, 2], "a": 1})
+    assert input_hash(1, 2) != input_hash(2, 1)
+    assert input_hash(None) != input_hash("None")
+    assert input_hash(lambda x: x + 1) != input_hash(lambda x: x + 2)
+
+
+def test_memoize(tmp_path):
+    cache = ResultCache(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.memoize("AAA", "stage", "k1", compute) == {"value": 1}
+    assert cache.memoize("AAA", "stage", "k1", compute) == {"value": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+    # new inputs replace the stored result of the stage
+    assert cache.memoize("AAA", "stage", "k2", compute) == {"value": 2}
+    assert [path.name for path in (tmp_path / "AAA").iterdir()] == ["stage-k2.pkl"]
+    # other symbols and stages are separate
+    assert cache.memoize("BBB", "stage", "k2", compute) == {"value": 3}
+
+    cache.path("AAA", "stage", "k2").write_bytes(b"truncated")
+    assert cache.memoize("AAA", "stage", "k2", compute) == {"value": 4}
+
+
+def test_stages_are_reused(tmp_path):
+    provider = RecordedProvider(RECORDINGS)
+    plain = compute_stock_analysis("SYN-A", provider=provider)
+
+    cache = ResultCache(tmp_path)
+    first = compute_stock_analysis("SYN-A", provider=provider, result_cache=cache)
+    assert (cache.hits, cache.misses) == (0, 5)
+    second = compute_stock_analysis("SYN-A", provider=provider, result_cache=cache)
+    assert (cache.hits, cache.misses) == (5, 5)
+
+    assert plain.inputs_hash == first.inputs_hash == second.inputs_hash
+    for result in [first, second]:
+        assert result.metrics() == pytest.approx(plain.metrics(), nan_ok=True)
+        assert [phase.growth for phase in result.revenue_phases] == [
+            phase.growth for phase in plain.revenue_phases
+        ]
+        pd.testing.assert_frame_equal(result.rainbow_ema, plain.rainbow_ema)
+        pd.testing.assert_series_equal(
+            result.valuations["KGV"].fair_value_fine,
+            plain.valuations["KGV"].fair_value_fine,
+        )
+
+
+def test_new_price_bar_keeps_fundamental_stages(tmp_path, monkeypatch):
+    provider = RecordedProvider(RECORDINGS)
+    cache = ResultCache(tmp_path)
+    before = compute_stock_analysis("SYN-A", provider=provider, result_cache=cache)
+
+    history = provider.history
+
+    def with_new_bar(symbol, **kwargs):
+        bars = history(symbol, **kwargs)
+        new = bars.iloc[[-1]].copy()
+        new.index = new.index + pd.Timedelta(days=1)
+        return pd.concat([bars, new * 1.01])
+
+    monkeypatch.setattr(provider, "history", with_new_bar)
+    after = compute_stock_analysis("SYN-A", provider=provider, result_cache=cache)
+    assert after.inputs_hash != before.inputs_hash
+    # only the growth phases of the fundamentals are unchanged
+    assert cache.hits == 1 and cache.misses == 5 + 4
+
+
+def test_unchanged_report_is_not_rendered(tmp_path, capsys):
+    provider = RecordedProvider(RECORDINGS)
+    options = dict(
+        show_figures=False, save_to_pdf=True, output_dir=tmp_path, provider=provider
+    )
+    filename = make_stock_analysis("SYN-B", **options)
+    key = input_hash_path(filename).read_text().strip()
+    assert is_current(filename, key)
+    rendered = filename.stat().st_mtime_ns
+
+    with timing_hook(TimingRecorder()) as recorder:
+        assert make_stock_analysis("SYN-B", **options) == filename
+    assert "up to date" in capsys.readouterr().out
+    assert "render" not in recorder.totals()
+    assert filename.stat().st_mtime_ns == rendered
+
+    # other render options, a refresh or a missing pdf render again
+    for kwargs in [{"max_points": 500}, {"refresh": True}]:
+        with timing_hook(TimingRecorder()) as recorder:
+            make_stock_analysis("SYN-B", **options, **kwargs)
+        assert "render" in recorder.totals()
+    filename.unlink()
+    make_stock_analysis("SYN-B", **options)
+    assert filename.exists() and input_hash_path(filename).read_text().strip() == key
+
+
+def test_result_cache_cli(tmp_path):
+    args = ["SYN-C", "--replay", str(RECORDINGS), "-o", str(tmp_path / "pdf")]
+    args += ["-j", "1", "--result-cache", str(tmp_path / "results")]
+    assert main(args) == 0
+    assert len(list((tmp_path / "results" / "SYN-C").glob("*.pkl"))) == 5
+    assert (tmp_path / "pdf" / "SYN-C.pdf.inputs").exists()
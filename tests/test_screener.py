@@ -0,0 +1,91 @@
+# tests/test_screener.py
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import export_screen, screen_stocks
+from stock_analysis.cli import main
+from stock_analysis.DataProvider import RecordedProvider
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+@pytest.fixture(scope="module")
+def screen():
+    symbols = RecordedProvider(RECORDINGS).symbols() + ["MISSING"]
+    return screen_stocks(symbols, workers=2, provider=RecordedProvider(RECORDINGS))
+
+
+def test_screen_ranks_by_discount(screen):
+    assert screen.index.name == "symbol"
+    assert len(screen) == len(RecordedProvider(RECORDINGS).symbols()) + 1
+    ok = screen[screen["error"].isna()]
+    assert ok["discount"].is_monotonic_decreasing
+    np.testing.assert_allclose(
+        ok["discount"], (1 - ok["price"] / ok["fair_value"]) * 100
+    )
+    for column in ["kgv", "kgve", "revenue_growth", "fair_value_KCV"]:
+        assert ok[column].notna().all()
+    # the failed symbol is listed last, without metrics
+    assert screen.index[-1] == "MISSING"
+    assert "FileNotFoundError" in screen.loc["MISSING", "error"]
+    assert np.isnan(screen.loc["MISSING", "price"])
+
+
+def test_screen_query(screen):
+    query = "price < 0.8 * fair_value and revenue_growth > 10"
+    symbols = RecordedProvider(RECORDINGS).symbols()
+    filtered = screen_stocks(
+        symbols, query=query, workers=1, provider=RecordedProvider(RECORDINGS)
+    )
+    expected = screen[
+        (screen["price"] < 0.8 * screen["fair_value"]) & (screen["revenue_growth"] > 10)
+    ]
+    assert list(filtered.index) == list(expected.index)
+
+
+def test_screen_computes_only_queried_indicators(screen):
+    assert not any(column.startswith("rolling_growth") for column in screen.columns)
+    symbols = RecordedProvider(RECORDINGS).symbols()
+    filtered = screen_stocks(
+        symbols,
+        query="rolling_growth_1y > -1000",
+        workers=1,
+        provider=RecordedProvider(RECORDINGS),
+    )
+    assert list(filtered.index) == list(screen.index[:-1])
+    assert filtered["rolling_growth_1y"].notna().all()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_export_screen(screen, tmp_path, suffix):
+    path = export_screen(screen, tmp_path / f"screen{suffix}")
+    if suffix == ".csv":
+        loaded = pd.read_csv(path, index_col="symbol")
+    else:
+        loaded = pd.read_parquet(path)
+    assert list(loaded.index) == list(screen.index)
+    np.testing.assert_allclose(loaded["discount"], screen["discount"])
+
+    with pytest.raises(ValueError):
+        export_screen(screen, tmp_path / "screen.xlsx")
+
+
+def test_screen_cli_skips_matplotlib(tmp_path):
+    output = tmp_path / "screen.csv"
+    code = (
+        "import sys\n"
+        "from stock_analysis.cli import main\n"
+        f"main(['--synthetic', '--screen', {str(output)!r}, '-j', '1', 'AAA', 'BBB'])\n"
+        "assert 'matplotlib' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+    assert len(pd.read_csv(output, index_col="symbol")) == 2
+
+
+def test_query_requires_screen():
+    with pytest.raises(SystemExit):
+        main(["--query", "kgv < 10", "AAA"])
@@ -0,0 +1,138 @@
+# tests/test_service.py
+import json
+import threading
+import time
+import urllib.request
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError
+
+import pandas as pd
+import pytest
+from stock_analysis.AnalysisService import AnalysisService, LRUCache, make_server
+from stock_analysis.cli import main
+from stock_analysis.DataProvider import RecordedProvider
+from stock_analysis.peers import PeerComparison
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+@pytest.fixture(scope="module")
+def service():
+    with AnalysisService(
+        provider=RecordedProvider(RECORDINGS), render_workers=1
+    ) as service:
+        yield service
+
+
+@pytest.fixture(scope="module")
+def server(service):
+    server = make_server(service, port=0, verbose=False)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path: str) -> tuple[str, bytes]:
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.headers["Content-Type"], response.read()
+
+
+def test_lru_cache(monkeypatch):
+    cache = LRUCache(2, max_age=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is the least recently used one now
+    cache.put("c", 3)
+    assert cache.get("b") is None and len(cache) == 2
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+
+
+def test_concurrent_requests_are_coalesced(service):
+    before = service.stats()
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: service.analysis("SYN-D"), range(4)))
+    assert all(result is results[0] for result in results)
+    stats = service.stats()
+    assert stats["analyses"] - before["analyses"] == 1
+    assert (
+        stats["coalesced"]
+        + stats["analysis_hits"]
+        - before["coalesced"]
+        - before["analysis_hits"]
+        == 3
+    )
+
+
+def test_json_metrics(server, service):
+    content_type, body = get(server, "/analysis/SYN-A")
+    assert content_type == "application/json"
+    data = json.loads(body)
+    assert data["symbol"] == "SYN-A"
+    assert data["metrics"]["kgv"] == pytest.approx(service.analysis("SYN-A").kgv)
+    assert data["charts"][0] == "Logarithmic Chart with Growth Phases"
+
+    # hot symbols are served from memory
+    hits = service.stats()["analysis_hits"]
+    start = time.perf_counter()
+    get(server, "/analysis/SYN-A")
+    assert time.perf_counter() - start < 0.5
+    assert service.stats()["analysis_hits"] == hits + 1
+
+
+def test_png_and_pdf(server, service):
+    content_type, png = get(server, "/analysis/SYN-B/charts/0.png")
+    assert content_type == "image/png" and png.startswith(b"\x89PNG")
+    content_type, pdf = get(server, "/analysis/SYN-B/report.pdf")
+    assert content_type == "application/pdf" and pdf.startswith(b"%PDF")
+
+    renders = service.stats()["renders"]
+    assert get(server, "/analysis/SYN-B/report.pdf")[1] == pdf
+    assert service.stats()["renders"] == renders
+
+
+def test_errors(server):
+    for path, status in [
+        ("/unknown", 404),
+        ("/analysis/SYN-B/charts/99.png", 404),
+        ("/analysis/MISSING", 502),
+    ]:
+        with pytest.raises(HTTPError) as error:
+            get(server, path)
+        assert error.value.code == status
+        assert "error" in json.loads(error.value.read())
+
+    _, body = get(server, "/stats")
+    assert json.loads(body)["errors"] >= 3
+
+
+def test_serve_cli_address():
+    with pytest.raises(SystemExit):
+        main(["--serve", "localhost:http"])
+
+
+def test_render_key_includes_the_peers(service):
+    result = service.analysis("SYN-C")
+    figures = pd.DataFrame({"kgv": [result.kgv, 20.0]}, ["SYN-C", "SYN-A"])
+    with_peers = replace(result, peers=PeerComparison("SYN-C", figures))
+    changed = replace(result, peers=PeerComparison("SYN-C", figures * 2))
+    keys = {service._render_hash(r) for r in [result, with_peers, changed]}
+    assert len(keys) == 3
+
+
+def test_crashed_render_process_is_replaced(service):
+    broken = service._renderer
+    for process in list(broken._processes.values()):
+        process.kill()
+        process.join()
+    assert service.png("SYN-C", 1).startswith(b"\x89PNG")
+    assert service._renderer is not broken
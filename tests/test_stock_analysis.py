@@ -1,6 +1,18 @@
 # tests/test_stock_analysis.py
+from pathlib import Path
+
 import pytest
-from stock_analysis import make_stock_analysis
+from stock_analysis import make_stock_analyses, make_stock_analysis
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import RecordedProvider, record_stock_data
+
+# recorded data, replayed without network access. The SYN-* symbols are
+# synthetic data in the layout of the live sources, created with
+#   stock-analysis --synthetic --record tests/recordings SYN-A SYN-B SYN-C SYN-D
+# recordings of the live data, with the real response shapes, are added with
+#   stock-analysis --record tests/recordings AAPL
+RECORDINGS = Path(__file__).parent / "recordings"
+RECORDED_SYMBOLS = RecordedProvider(RECORDINGS).symbols()
 
 # Example list of stock symbols to test
 STOCK_SYMBOLS = [
@@ -25,6 +37,75 @@ STOCK_SYMBOLS = [
 ]
 
 
+@pytest.mark.parametrize("symbol", RECORDED_SYMBOLS)
+def test_make_stock_analysis_recorded(symbol, tmp_path):
+    filename = make_stock_analysis(
+        symbol,
+        show_figures=False,
+        save_to_pdf=True,
+        cache=DataCache(tmp_path / "cache"),
+        output_dir=tmp_path,
+        provider=RecordedProvider(RECORDINGS),
+    )
+    assert filename.stat().st_size > 0
+    # recorded data is replayed, not cached
+    assert not (tmp_path / "cache").exists()
+
+
+def test_failed_rendering_leaves_no_figures_or_pdf(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+    from stock_analysis import analysis
+
+    def broken_chart(plot_manager, ax, result):
+        raise RuntimeError("broken chart")
+
+    plt.close("all")
+    # a chart in the middle of the report, after the first pages were streamed
+    monkeypatch.setattr(analysis, "_plot_revenue", broken_chart)
+    with pytest.raises(RuntimeError, match="broken chart"):
+        make_stock_analysis(
+            "SYN-A",
+            show_figures=False,
+            save_to_pdf=True,
+            output_dir=tmp_path,
+            provider=RecordedProvider(RECORDINGS),
+        )
+    assert plt.get_fignums() == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_make_stock_analyses_recorded(tmp_path):
+    summaries = make_stock_analyses(
+        RECORDED_SYMBOLS,
+        workers=2,
+        cache=DataCache(tmp_path / "cache"),
+        output_dir=tmp_path,
+        provider=RecordedProvider(RECORDINGS),
+    )
+    assert [summary.status for summary in summaries] == ["ok"] * len(RECORDED_SYMBOLS)
+
+
+@pytest.mark.network
+@pytest.mark.parametrize("symbol", ["AAPL", "KO"])
+def test_record_and_replay_live_data(symbol, tmp_path):
+    """The real finqual and yahoo payloads survive recording and replay, e.g.
+    the extra columns of the yahoo income statement. Keep such a recording in
+    tests/recordings to test the real shapes offline."""
+    record_stock_data(symbol, tmp_path / "recordings")
+    provider = RecordedProvider(tmp_path / "recordings")
+    income_statement = provider.income_statement(symbol)
+    assert {"asOfDate", "periodType", "BasicEPS"} <= set(income_statement.columns)
+    filename = make_stock_analysis(
+        symbol,
+        show_figures=False,
+        save_to_pdf=True,
+        output_dir=tmp_path,
+        provider=provider,
+    )
+    assert filename.stat().st_size > 0
+
+
+@pytest.mark.network
 @pytest.mark.parametrize("symbol", STOCK_SYMBOLS)
 def test_make_stock_analysis(symbol, tmp_path):
     """
@@ -0,0 +1,183 @@
+# tests/test_stock_data.py
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis.DataCache import DataCache
+from stock_analysis.DataProvider import LiveProvider
+from stock_analysis.FetchScheduler import FetchScheduler
+from stock_analysis.StockData import (
+    HISTORY_WINDOW,
+    StockData,
+    StockDataFetchError,
+    history_update_start,
+)
+
+
+class FakeTicker:
+    """Stand-in for the yahooquery Ticker, serving a fixed close series"""
+
+    def __init__(self, symbol: str, close: pd.Series):
+        self.symbol = symbol
+        self.close = close
+        self.requests = []
+
+    def history(self, period=None, start=None, interval="1d", adj_timezone=False):
+        self.requests.append(start)
+        close = self.close
+        if start is not None:
+            close = close[close.index >= pd.Timestamp(start)]
+        # like yahoo, the last row is the live price
+        close = pd.concat([close, pd.Series([np.nan], [pd.Timestamp.now()])])
+        index = pd.MultiIndex.from_arrays(
+            [[self.symbol] * len(close), close.index], names=["symbol", "date"]
+        )
+        return pd.DataFrame({"close": close.values}, index)
+
+
+@pytest.fixture
+def close():
+    index = pd.bdate_range("2020-01-01", periods=300)
+    return pd.Series(np.linspace(10, 40, len(index)), index)
+
+
+def _stock_data(symbol, close, cache):
+    """StockData without fetching anything on construction"""
+    stock = StockData.__new__(StockData)
+    stock.symbol = symbol
+    stock.cache = cache
+    stock.refresh = False
+    stock.provider = LiveProvider()
+    stock.provider._tickers[symbol] = FakeTicker(symbol, close)
+    return stock
+
+
+def _requests(stock):
+    """History requests of the fake ticker, None for full fetches"""
+    return stock.provider.ticker(stock.symbol).requests
+
+
+def _expire(cache, symbol):
+    path = cache.directory / symbol / f"history_{HISTORY_WINDOW}.parquet"
+    two_days_ago = time.time() - 2 * 24 * 3600
+    os.utime(path, (two_days_ago, two_days_ago))
+
+
+def test_history_is_updated_incrementally(tmp_path, close):
+    cache = DataCache(tmp_path)
+    first = _stock_data("AAPL", close.iloc[:250], cache)
+    first._update_history()
+    assert _requests(first) == [None]
+
+    _expire(cache, "AAPL")
+    second = _stock_data("AAPL", close, cache)
+    history = second._update_history()
+
+    assert len(_requests(second)) == 1
+    assert _requests(second)[0] is not None
+    np.testing.assert_allclose(history["close"].values, close.values)
+    assert history.index.equals(close.index)
+
+
+def test_changed_overlap_triggers_full_refetch(tmp_path, close):
+    cache = DataCache(tmp_path)
+    _stock_data("AAPL", close.iloc[:250], cache)._update_history()
+
+    # a 2:1 split adjusts all past closes
+    _expire(cache, "AAPL")
+    split = _stock_data("AAPL", close / 2, cache)
+    history = split._update_history()
+
+    assert _requests(split)[-1] is None
+    np.testing.assert_allclose(history["close"].values, close.values / 2)
+
+
+def test_failed_update_triggers_full_refetch(tmp_path, close):
+    cache = DataCache(tmp_path)
+    _stock_data("AAPL", close.iloc[:250], cache)._update_history()
+
+    _expire(cache, "AAPL")
+    stock = _stock_data("AAPL", close, cache)
+    stock.provider._scheduler = FetchScheduler(max_retries=0)
+    ticker = stock.provider.ticker("AAPL")
+    full_history = ticker.history
+
+    def history(start=None, **kwargs):
+        if start is not None:
+            # yahooquery drops a symbol whose request failed from the frame
+            return full_history(start=start, **kwargs).iloc[:0]
+        return full_history(**kwargs)
+
+    ticker.history = history
+    history = stock._update_history()
+    np.testing.assert_allclose(history["close"].values, close.values)
+
+
+def test_fresh_history_is_not_fetched(tmp_path, close):
+    cache = DataCache(tmp_path)
+    _stock_data("AAPL", close, cache)._update_history()
+    cached = _stock_data("AAPL", close, cache)
+    cached._update_history()
+    assert _requests(cached) == []
+
+
+def test_fetch_errors_are_collected_per_source(tmp_path, close, monkeypatch):
+    def failing_statement(self, method_name, start_year, end_year):
+        raise ConnectionError(f"{method_name} unavailable")
+
+    monkeypatch.setattr(StockData, "_fetch_fq_statement", failing_statement)
+    stock = _stock_data("AAPL", close, DataCache(tmp_path))
+
+    with pytest.raises(StockDataFetchError) as excinfo:
+        stock._fetch_all_data()
+
+    errors = excinfo.value.errors
+    assert set(errors) == {
+        "balance_sheet",
+        "income_stmt",
+        "cash_flow",
+        "income_statement",  # not provided by the fake ticker
+        "earnings_trend",
+    }
+    assert isinstance(errors["income_stmt"], ConnectionError)
+
+
+def test_prefetch_updates_outdated_histories_separately(tmp_path, close, monkeypatch):
+    import yahooquery
+    from stock_analysis.batch import prefetch_history
+
+    requests = []
+
+    class FakeBatchTicker:
+        def __init__(self, symbols):
+            self.symbols = symbols
+
+        def history(self, start=None, **kwargs):
+            requests.append((sorted(self.symbols), start))
+            return pd.concat(
+                [
+                    FakeTicker(symbol, close).history(start=start)
+                    for symbol in self.symbols
+                ]
+            )
+
+    monkeypatch.setattr(yahooquery, "Ticker", FakeBatchTicker)
+    cache = DataCache(tmp_path)
+    # two recently updated histories and one a few months old
+    for symbol, bars in [("AAA", 290), ("BBB", 295), ("CCC", 200)]:
+        cache.store(
+            symbol, "history", HISTORY_WINDOW, close.iloc[:bars].to_frame("close")
+        )
+        _expire(cache, symbol)
+
+    prefetch_history(["AAA", "BBB", "CCC"], cache)
+
+    def start(bars):
+        return history_update_start(close.iloc[:bars]).strftime("%Y-%m-%d")
+
+    assert sorted(requests) == [(["AAA", "BBB"], start(290)), (["CCC"], start(200))]
+    for symbol in ["AAA", "BBB", "CCC"]:
+        history = cache.load(symbol, "history", HISTORY_WINDOW)
+        np.testing.assert_allclose(history["close"].values, close.values)
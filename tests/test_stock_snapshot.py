@@ -0,0 +1,68 @@
+# tests/test_stock_snapshot.py
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compute_stock_analysis
+from stock_analysis.DataProvider import RecordedProvider
+from stock_analysis.StockData import StockData
+from stock_analysis.StockSnapshot import StockSnapshot
+
+RECORDINGS = Path(__file__).parent / "recordings"
+
+
+@pytest.fixture(scope="module")
+def stock():
+    return StockData("SYN-A", provider=RecordedProvider(RECORDINGS))
+
+
+def test_snapshot_matches_stock_data(stock):
+    snapshot = stock.snapshot()
+    pd.testing.assert_series_equal(
+        snapshot.history_20y, stock.history_20y.dropna(), check_freq=False
+    )
+    pd.testing.assert_series_equal(
+        snapshot.history_5y, stock.history_5y.dropna(), check_freq=False
+    )
+    pd.testing.assert_frame_equal(snapshot.fundamentals, stock.fundamentals)
+    pd.testing.assert_series_equal(snapshot.eps, stock.fq_eps, check_freq=False)
+    for name, statement, column in [
+        ("revenue", stock.fq_income_df, "Total Revenue"),
+        ("shares", stock.fq_balance_df, "Shares Outstanding"),
+        ("operating_cash_flow", stock.fq_cashflow_df, "Operating Cash Flow"),
+    ]:
+        pd.testing.assert_series_equal(
+            getattr(snapshot, name),
+            statement[column].astype(float).dropna(),
+            check_names=False,
+            check_freq=False,
+        )
+    assert snapshot.current_year_estimate == stock.yh_current_year_estimates
+
+
+def test_snapshot_is_compact(stock):
+    snapshot = stock.snapshot()
+    assert not hasattr(snapshot, "__dict__")
+    assert snapshot.closes.flags.c_contiguous
+    assert all(row.flags.c_contiguous for row in snapshot.values)
+    # views of the arrays, no copies
+    assert np.shares_memory(snapshot.history_5y.to_numpy(), snapshot.closes)
+    assert np.shares_memory(snapshot.fundamentals.to_numpy(), snapshot.values)
+    assert np.shares_memory(stock.history_5y.to_numpy(), stock.history_20y.to_numpy())
+
+    data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    assert len(data) < snapshot.nbytes + 4096
+    restored = pickle.loads(data)
+    assert isinstance(restored, StockSnapshot)
+    pd.testing.assert_series_equal(restored.history_5y, snapshot.history_5y)
+    pd.testing.assert_frame_equal(restored.fundamentals, snapshot.fundamentals)
+
+
+def test_compute_from_snapshot(stock):
+    snapshot = pickle.loads(pickle.dumps(stock.snapshot()))
+    result = compute_stock_analysis(snapshot)
+    expected = compute_stock_analysis(stock)
+    assert result.inputs_hash == expected.inputs_hash
+    assert result.metrics() == pytest.approx(expected.metrics(), nan_ok=True)
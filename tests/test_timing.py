@@ -0,0 +1,95 @@
+# tests/test_timing.py
+import json
+import pstats
+import threading
+from pathlib import Path
+
+from stock_analysis import AnalysisSummary, make_stock_analysis, timing_report
+from stock_analysis.cli import main
+from stock_analysis.timing import TimingRecorder, profiled, span, timing_hook
+
+
+def _other_thread():
+    with span("other"):
+        pass
+
+
+def test_span_nesting_and_hooks():
+    with timing_hook(TimingRecorder()) as recorder:
+        with span("outer", symbol="AAA"):
+            with span("outer.inner"):
+                pass
+            # other threads start without an enclosing span
+            thread = threading.Thread(target=_other_thread)
+            thread.start()
+            thread.join()
+    with span("unrecorded"):
+        pass
+
+    spans = {span.name: span for span in recorder.spans}
+    assert set(spans) == {"outer", "outer.inner", "other"}
+    assert spans["other"].parent is None and spans["other"].symbol is None
+    assert spans["outer.inner"].symbol == "AAA"
+    assert spans["outer.inner"].parent == "outer"
+    assert spans["outer"].parent is None
+    assert spans["outer"].duration >= spans["outer.inner"].duration
+
+
+def test_make_stock_analysis_timings_and_profile(synthetic_cache, tmp_path):
+    with timing_hook(TimingRecorder()) as recorder:
+        make_stock_analysis(
+            "AAA",
+            show_figures=False,
+            save_to_pdf=True,
+            cache=synthetic_cache,
+            output_dir=tmp_path,
+            timings_dir=tmp_path / "timings",
+            profile_dir=tmp_path / "profiles",
+        )
+
+    names = set(recorder.totals())
+    for name in [
+        "analysis",
+        "fetch",
+        "fetch.history",
+        "fetch.balance_sheet",
+        "compute",
+        "compute.fair_value",
+        "render",
+        "render.price_phases",
+        "render.layout",
+        "render.pdf",
+    ]:
+        assert name in names
+    assert {span.symbol for span in recorder.spans} == {"AAA"}
+
+    lines = (tmp_path / "timings" / "AAA.jsonl").read_text().splitlines()
+    assert len(lines) == len(recorder.spans)
+    assert json.loads(lines[0])["name"] == "analysis"
+
+    stats = pstats.Stats(str(tmp_path / "profiles" / "AAA.prof"))
+    assert stats.total_calls > 0
+
+
+def test_timing_report():
+    summaries = [
+        AnalysisSummary("AAA", "ok", 2.0, timings={"fetch": 1.0, "render": 0.5}),
+        AnalysisSummary("BBB", "ok", 2.0, timings={"fetch": 3.0}),
+        AnalysisSummary("CCC", "failed", 0.0, error="boom"),
+    ]
+    report = timing_report(summaries)
+
+    assert list(report.index) == ["fetch", "render"]
+    assert report.loc["fetch", "symbols"] == 2
+    assert report.loc["fetch", "total"] == 4.0
+    assert report.loc["fetch", "max"] == 3.0
+    assert report.loc["fetch", "share"] == 1.0
+    assert timing_report([]).empty
+
+
+def test_cli_timing_report_of_failed_symbols(tmp_path):
+    recordings = Path(__file__).parent / "recordings"
+    timings = tmp_path / "new" / "timings"
+    args = ["--replay", str(recordings), "--no-pdf", "-j", "1", "--timings"]
+    assert main(args + [str(timings), "MISSING"]) == 1
+    assert (timings / "timing_report.csv").exists()
@@ -0,0 +1,90 @@
+# tests/test_valuation.py
+import numpy as np
+import pandas as pd
+import pytest
+from stock_analysis import compute_stock_analysis
+from stock_analysis.valuation import (
+    VALUATION_MODELS,
+    compute_valuations,
+    live_multiples,
+    register_valuation_model,
+    windowed_fair_values,
+)
+
+
+def _history_and_per_share(seed):
+    rng = np.random.default_rng(seed)
+    history = pd.Series(
+        100 * np.exp(np.cumsum(0.01 * rng.standard_normal(4000))),
+        pd.bdate_range(end="2025-06-15", periods=4000),
+    )
+    dates = pd.DatetimeIndex([f"{year}-09-28" for year in range(2008, 2027)])
+    per_share = pd.DataFrame(
+        rng.uniform(0.5, 10.0, (len(dates), 3)), dates, columns=["A", "B", "C"]
+    )
+    # gaps and a model starting late
+    per_share.iloc[[3, 7, 8], 1] = np.nan
+    per_share.iloc[:6, 2] = np.nan
+    return history, per_share
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_models_are_computed_like_one_at_a_time(seed):
+    history, per_share = _history_and_per_share(seed)
+    averaging_time = pd.Timedelta(days=365 * 3)
+    multiples = live_multiples(history, per_share)
+    fair_values = windowed_fair_values(multiples, per_share, averaging_time)
+
+    for name in per_share.columns:
+        single = per_share[[name]].dropna()
+        expected = live_multiples(history, single)[name]
+        pd.testing.assert_series_equal(
+            multiples[name].truncate(before=expected.index[0]), expected
+        )
+        expected_fair_value = windowed_fair_values(
+            live_multiples(history, single), single, averaging_time
+        )[name]
+        pd.testing.assert_series_equal(
+            fair_values[name].dropna(), expected_fair_value.dropna(), rtol=1e-9
+        )
+    # the late model has no multiple a year before its first value
+    assert multiples["C"].first_valid_index() >= per_share.index[6] - pd.Timedelta(
+        days=365
+    )
+
+
+def test_compute_valuations_with_custom_model():
+    history, per_share = _history_and_per_share(2)
+    fundamentals = per_share.rename(columns={"A": "eps", "B": "book_value"})
+    fundamentals["shares"] = 2.0
+
+    models = {
+        "KGV": lambda f: f["eps"],
+        "KBV": lambda f: f["book_value"] / f["shares"],
+        "empty": lambda f: pd.Series(np.nan, f.index),
+    }
+    valuations = compute_valuations(history, fundamentals, models)
+
+    assert list(valuations) == ["KGV", "KBV"]
+    kbv = valuations["KBV"]
+    assert kbv.per_share.index.equals(fundamentals["book_value"].dropna().index)
+    assert kbv.fair_value.index.is_monotonic_increasing
+    assert (kbv.live_multiple_bounded.dropna() >= 0).all()
+    assert np.isfinite(kbv.current_fair_value(history.index[-1]))
+
+
+def test_registered_models_in_analysis(synthetic_cache, monkeypatch):
+    monkeypatch.setattr(
+        "stock_analysis.valuation.VALUATION_MODELS", dict(VALUATION_MODELS)
+    )
+    register_valuation_model("KBV", lambda f: f["total_assets"] / f["shares"])
+
+    result = compute_stock_analysis("AAA", cache=synthetic_cache)
+
+    assert list(result.valuations) == ["KGV", "KCV", "KUV", "KBV"]
+    kgv = result.valuations["KGV"]
+    pd.testing.assert_series_equal(result.fair_value, kgv.fair_value)
+    pd.testing.assert_series_equal(result.live_kgv, kgv.live_multiple)
+    metrics = result.metrics()
+    for name in result.valuations:
+        assert np.isfinite(metrics[f"price_to_fair_value_{name}"])